@@ -0,0 +1,159 @@
+"""
+Agrupación (clustering) de estaciones por nivel de zoom del mapa.
+
+Para cada nivel de zoom 0..ZOOM_MAX_CLUSTERS se divide el mundo, en
+coordenadas web mercator, en celdas de TAMANO_CLUSTER_PX píxeles de pantalla.
+Las estaciones de una misma celda se representan con un único cluster situado
+en su centroide. Como el número de celdas de zoom z+1 es el doble por eje que
+el de z, la celda padre de (x, y) es (x // 2, y // 2): la jerarquía se
+construye una vez agregando cada nivel a partir del siguiente.
+
+Una consulta solo recorre las celdas del rectángulo visible, así que devuelve
+como mucho del orden de (ancho / 60) x (alto / 60) elementos por pantalla,
+sea cual sea el tamaño del almacén. Por encima de ZOOM_MAX_CLUSTERS se
+devuelven las estaciones individuales usando el índice espacial.
+
+La jerarquía se reconstruye tras cada carga o borrado, a partir de los puntos
+del índice espacial (`backend.almacen.indice_espacial`).
+"""
+
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from backend.almacen.indice_espacial import (
+    IndiceEspacial, mercator_x, mercator_y, muestra_repartida, obtener_indice
+)
+from backend.almacen.version import suscribir_cambios
+
+# Lado de la celda de agrupación, en píxeles de pantalla
+TAMANO_CLUSTER_PX = 60
+
+# Último nivel de zoom con clusters; por encima se devuelven estaciones sueltas
+ZOOM_MAX_CLUSTERS = 12
+
+class ClustersPorZoom:
+    """
+    Jerarquía de clusters precalculada para los niveles 0..zoom_max.
+
+    Cada nivel es un dict (x, y) -> [cantidad, suma_lat, suma_lon, cod_estacion],
+    donde cod_estacion solo es válido cuando cantidad == 1.
+    """
+
+    def __init__(self, indice: IndiceEspacial, zoom_max: int = ZOOM_MAX_CLUSTERS,
+                 tamano_px: int = TAMANO_CLUSTER_PX):
+        self.indice = indice
+        self.zoom_max = zoom_max
+        self.tamano_px = tamano_px
+        self.niveles: List[Dict[Tuple[int, int], list]] = [None] * (zoom_max + 1)
+
+        inferior = {}
+        for cod_estacion, _, lat, lon in indice.puntos:
+            celda = self._celda(lat, lon, zoom_max)
+            grupo = inferior.get(celda)
+            if grupo is None:
+                inferior[celda] = [1, lat, lon, cod_estacion]
+            else:
+                grupo[0] += 1
+                grupo[1] += lat
+                grupo[2] += lon
+        self.niveles[zoom_max] = inferior
+
+        for zoom in range(zoom_max - 1, -1, -1):
+            nivel = {}
+            for (x, y), (cantidad, suma_lat, suma_lon, cod_estacion) in self.niveles[zoom + 1].items():
+                padre = (x >> 1, y >> 1)
+                grupo = nivel.get(padre)
+                if grupo is None:
+                    nivel[padre] = [cantidad, suma_lat, suma_lon, cod_estacion]
+                else:
+                    grupo[0] += cantidad
+                    grupo[1] += suma_lat
+                    grupo[2] += suma_lon
+            self.niveles[zoom] = nivel
+
+    def _escala(self, zoom: int) -> float:
+        """Celdas por unidad de coordenada mercator normalizada en ese zoom."""
+        return 256 * 2 ** zoom / self.tamano_px
+
+    def _celda(self, lat: float, lon: float, zoom: int) -> Tuple[int, int]:
+        escala = self._escala(zoom)
+        return math.floor(mercator_x(lon) * escala), math.floor(mercator_y(lat) * escala)
+
+    def consultar(self, zoom: int, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                  limite: Optional[int] = None) -> Tuple[List[Tuple[float, float, int, Optional[int]]], int]:
+        """
+        Devuelve los clusters y estaciones sueltas del rectángulo en ese zoom.
+
+        Si hay más de `limite` elementos se devuelve una muestra repartida por
+        todo el rectángulo (`muestra_repartida` sobre los elementos ordenados
+        por celda), no los primeros que se encuentran.
+
+        Returns:
+            tuple: (elementos, total). Cada elemento es (latitud, longitud,
+                cantidad, cod_estacion), con cod_estacion solo cuando
+                cantidad == 1; total es el número de elementos del rectángulo
+                antes de aplicar el límite.
+        """
+        if zoom > self.zoom_max:
+            puntos = self.indice.puntos_en_rectangulo(min_lat, min_lon, max_lat, max_lon)
+            total = len(puntos)
+            if limite is not None:
+                puntos = muestra_repartida(puntos, limite)
+            return [(lat, lon, 1, cod_estacion) for cod_estacion, lat, lon in puntos], total
+
+        nivel = self.niveles[zoom]
+        x_min, y_min = self._celda(max_lat, min_lon, zoom)
+        x_max, y_max = self._celda(min_lat, max_lon, zoom)
+
+        # Se recorre lo que sea menor: las celdas del rectángulo o las ocupadas.
+        # El primer recorrido ya sale ordenado por celda; el segundo se ordena
+        # solo si hay que tomar una muestra.
+        if (x_max - x_min + 1) * (y_max - y_min + 1) <= len(nivel):
+            celdas = [
+                ((x, y), nivel[(x, y)])
+                for x in range(x_min, x_max + 1)
+                for y in range(y_min, y_max + 1)
+                if (x, y) in nivel
+            ]
+        else:
+            celdas = [
+                ((x, y), grupo) for (x, y), grupo in nivel.items()
+                if x_min <= x <= x_max and y_min <= y <= y_max
+            ]
+            if limite is not None and len(celdas) > limite:
+                celdas.sort(key=lambda celda: celda[0])
+
+        total = len(celdas)
+        if limite is not None:
+            celdas = muestra_repartida(celdas, limite)
+        resultado = [
+            (suma_lat / cantidad, suma_lon / cantidad, cantidad, cod_estacion if cantidad == 1 else None)
+            for _, (cantidad, suma_lat, suma_lon, cod_estacion) in celdas
+        ]
+        return resultado, total
+
+
+_lock = threading.Lock()
+_clusters = None
+
+def obtener_clusters() -> ClustersPorZoom:
+    """
+    Devuelve la jerarquía de clusters del índice espacial actual,
+    reconstruyéndola si el índice ha cambiado (tras una carga o borrado).
+    """
+    global _clusters
+    indice = obtener_indice()
+    with _lock:
+        if _clusters is None or _clusters.indice is not indice:
+            _clusters = ClustersPorZoom(indice)
+        return _clusters
+
+def _reconstruir_tras_cambio(version: str):
+    """Suscriptor de cambios: recalcula los clusters en cuanto termina una carga o borrado."""
+    try:
+        obtener_clusters()
+    except Exception as e:
+        print(f"Error al recalcular los clusters: {e}")
+
+suscribir_cambios(_reconstruir_tras_cambio)
@@ -0,0 +1,628 @@
+"""
+Consultas de lectura usadas por la API de búsqueda.
+
+Cada función es síncrona: toma una conexión del pool, ejecuta la consulta y
+devuelve las filas tal cual las entrega psycopg2. Los endpoints asíncronos no
+las llaman directamente sino a través de `ejecutar_bd`, que las ejecuta en un
+hilo del executor acotado para no bloquear el bucle de eventos de uvicorn.
+"""
+
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from backend.almacen.database import obtener_conexion
+from backend.almacen.normalizacion import normalizar_clave
+from backend.almacen.sentencias import ejecutar_preparada
+
+# Campo de EstacionResponse -> expresión SQL que lo produce. Las coordenadas se
+# convierten a float8 en la propia consulta para no arrastrar Decimal.
+COLUMNAS_ESTACION = {
+    "cod_estacion": "e.cod_estacion",
+    "nombre": "e.nombre",
+    "tipo": "e.tipo",
+    "direccion": "e.direccion",
+    "codigo_postal": "e.codigo_postal",
+    "longitud": "e.longitud::float8",
+    "latitud": "e.latitud::float8",
+    "descripcion": "e.descripcion",
+    "horario": "e.horario",
+    "contacto": "e.contacto",
+    "url": "e.url",
+    "localidad": "l.nombre",
+    "provincia": "p.nombre",
+}
+
+CAMPOS_ESTACION = tuple(COLUMNAS_ESTACION)
+
+# Clave de ordenación, que también es la clave del cursor de paginación. Los
+# nombres de provincia y localidad son las copias de Estacion para que el
+# ORDER BY y la comparación del cursor usen idx_estacion_orden.
+COLUMNAS_ORDEN = "e.provincia_nombre, e.localidad_nombre, e.nombre, e.cod_estacion"
+
+def patron_normalizado(texto: str, prefijo: bool = False) -> str:
+    """
+    Patrón LIKE para comparar con una columna nombre_normalizado.
+
+    El término se normaliza igual que al insertar y se escapan los comodines
+    de LIKE, de modo que '%' o '_' escritos por el usuario se buscan tal cual.
+
+    Args:
+        prefijo: Si es True el patrón es 'termino%' (usa el índice B-tree
+            text_pattern_ops); si no, '%termino%' (índice trigrama)
+    """
+    termino = normalizar_clave(texto)
+    termino = termino.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{termino}%" if prefijo else f"%{termino}%"
+
+def _filtros_estaciones(localidad, codigo_postal, provincia, tipo, nombre=None, prefijo=False):
+    """
+    Construye las condiciones WHERE comunes a la búsqueda y al recuento.
+
+    Los filtros de texto se comparan con las columnas nombre_normalizado
+    (minúsculas y sin acentos): la normalización se aplica al término en
+    Python con `normalizar_clave`, no a cada fila en SQL.
+    """
+    condiciones = ""
+    params = []
+    
+    if localidad:
+        condiciones += " AND l.nombre_normalizado LIKE %s"
+        params.append(patron_normalizado(localidad, prefijo))
+    
+    if codigo_postal:
+        condiciones += " AND e.codigo_postal = %s"
+        params.append(codigo_postal)
+    
+    if provincia:
+        condiciones += " AND p.nombre_normalizado LIKE %s"
+        params.append(patron_normalizado(provincia, prefijo))
+    
+    if tipo:
+        condiciones += " AND e.tipo = %s"
+        params.append(tipo)
+
+    if nombre:
+        condiciones += " AND e.nombre_normalizado LIKE %s"
+        params.append(patron_normalizado(nombre, prefijo))
+
+    return condiciones, params
+
+def _etiqueta_filtros(consulta, localidad, codigo_postal, provincia, tipo, nombre, *extras):
+    """Descripción de una forma de consulta para las métricas, p. ej. 'buscar_estaciones(provincia,tipo|cursor|limite)'."""
+    filtros = ("localidad", "codigo_postal", "provincia", "tipo", "nombre")
+    usados = [filtro for filtro, valor in zip(filtros, (localidad, codigo_postal, provincia, tipo, nombre)) if valor]
+    return f"{consulta}({','.join(usados)}{'|' if extras else ''}{'|'.join(extras)})"
+
+def _consulta_busqueda(localidad, codigo_postal, provincia, tipo, limite, despues_de, campos, nombre, prefijo):
+    """SQL y parámetros de `buscar_estaciones` (también los usa `iterar_estaciones`)."""
+    condiciones, params = _filtros_estaciones(localidad, codigo_postal, provincia, tipo, nombre, prefijo)
+
+    seleccion = ", ".join(COLUMNAS_ESTACION[campo] for campo in campos)
+    query = f"""
+        SELECT {seleccion}, {COLUMNAS_ORDEN}
+        FROM Estacion e
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE 1=1
+    """ + condiciones
+
+    if despues_de:
+        query += f" AND ({COLUMNAS_ORDEN}) > (%s, %s, %s, %s)"
+        params.extend(despues_de)
+    
+    query += f" ORDER BY {COLUMNAS_ORDEN}"
+
+    if limite is not None:
+        query += " LIMIT %s"
+        params.append(limite)
+
+    return query, params
+
+def buscar_estaciones(localidad: Optional[str] = None, codigo_postal: Optional[str] = None,
+                      provincia: Optional[str] = None, tipo: Optional[str] = None,
+                      limite: Optional[int] = None, despues_de: Optional[Tuple] = None,
+                      campos: Sequence[str] = CAMPOS_ESTACION, nombre: Optional[str] = None,
+                      prefijo: bool = False) -> List[Tuple]:
+    """
+    Busca estaciones aplicando los filtros indicados, con paginación por clave.
+
+    El orden es (provincia, localidad, nombre, cod_estacion). `despues_de` es la
+    clave de ordenación de la última fila de la página anterior: la consulta
+    continúa justo detrás de ella, así que cualquier página cuesta lo mismo
+    que la primera.
+
+    La consulta se ejecuta como sentencia preparada: hay una por cada
+    combinación de filtros, cursor, límite y campos (ver
+    `backend.almacen.sentencias`).
+
+    Args:
+        limite: Número máximo de filas a devolver (None = sin límite)
+        despues_de: Tupla (provincia, localidad, nombre, cod_estacion) o None
+        campos: Campos de COLUMNAS_ESTACION a seleccionar, en ese orden
+        nombre: Filtro por nombre de la estación
+        prefijo: Si es True los filtros de texto buscan nombres que empiezan
+            por el término; si no, que lo contienen
+
+    Returns:
+        Filas con los valores de `campos` seguidos de los cuatro valores de la
+        clave de ordenación (provincia, localidad, nombre, cod_estacion).
+    """
+    query, params = _consulta_busqueda(localidad, codigo_postal, provincia, tipo, limite, despues_de,
+                                       campos, nombre, prefijo)
+
+    extras = [marca for marca, usada in (("cursor", despues_de), ("limite", limite is not None)) if usada]
+    if tuple(campos) != CAMPOS_ESTACION:
+        extras.append(",".join(campos))
+    etiqueta = _etiqueta_filtros("buscar_estaciones", localidad, codigo_postal, provincia, tipo, nombre, *extras)
+
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            return ejecutar_preparada(cur, etiqueta, query, params)
+
+def contar_estaciones(localidad: Optional[str] = None, codigo_postal: Optional[str] = None,
+                      provincia: Optional[str] = None, tipo: Optional[str] = None,
+                      nombre: Optional[str] = None, prefijo: bool = False) -> int:
+    """
+    Cuenta las estaciones que cumplen los mismos filtros que
+    `buscar_estaciones`, también con una sentencia preparada por combinación.
+    """
+    condiciones, params = _filtros_estaciones(localidad, codigo_postal, provincia, tipo, nombre, prefijo)
+    query = """
+        SELECT COUNT(*)
+        FROM Estacion e
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE 1=1
+    """ + condiciones
+    etiqueta = _etiqueta_filtros("contar_estaciones", localidad, codigo_postal, provincia, tipo, nombre)
+
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            return ejecutar_preparada(cur, etiqueta, query, params)[0][0]
+
+# Filas por lote que iterar_estaciones pide al cursor del servidor
+FILAS_POR_LOTE = 1000
+
+def iterar_estaciones(localidad: Optional[str] = None, codigo_postal: Optional[str] = None,
+                      provincia: Optional[str] = None, tipo: Optional[str] = None,
+                      despues_de: Optional[Tuple] = None, campos: Sequence[str] = CAMPOS_ESTACION,
+                      nombre: Optional[str] = None, prefijo: bool = False,
+                      lote: int = FILAS_POR_LOTE) -> Iterator[List[Tuple]]:
+    """
+    Recorre todas las estaciones de una búsqueda por lotes, sin cargarlas a la vez.
+
+    Usa un cursor con nombre (`DECLARE ... CURSOR`): PostgreSQL mantiene el
+    resultado en el servidor y cada lote es un `FETCH` de `lote` filas, así
+    que la memoria del proceso no depende del número de estaciones. La
+    conexión queda ocupada hasta que se agota o se cierra el generador.
+
+    Args:
+        Los filtros, `despues_de` y `campos` de `buscar_estaciones`
+        lote: Filas por lote
+
+    Yields:
+        Listas de como mucho `lote` filas, con el mismo formato y orden que
+        `buscar_estaciones`
+    """
+    query, params = _consulta_busqueda(localidad, codigo_postal, provincia, tipo, None, despues_de,
+                                       campos, nombre, prefijo)
+    with obtener_conexion() as conn:
+        with conn.cursor(name="itv_flujo_estaciones") as cur:
+            cur.execute(query, params)
+            while True:
+                filas = cur.fetchmany(lote)
+                if not filas:
+                    return
+                yield filas
+
+def buscar_texto(texto: str, limite: int, campos: Sequence[str] = CAMPOS_ESTACION,
+                 tipo: Optional[str] = None) -> List[Tuple]:
+    """
+    Búsqueda de texto completo sobre Estacion.busqueda, ordenada por relevancia.
+
+    El texto admite la sintaxis de websearch_to_tsquery (comillas para frases,
+    "or", "-" para excluir) y se analiza con las mismas configuraciones que el
+    tsvector (spanish y catalan), combinando ambas consultas con OR.
+
+    Returns:
+        Filas con los valores de `campos` seguidos de la relevancia (ts_rank_cd).
+        Lista vacía si el texto solo contiene palabras vacías.
+    """
+    seleccion = ", ".join(COLUMNAS_ESTACION[campo] for campo in campos)
+    query = f"""
+        SELECT {seleccion}, ts_rank_cd(e.busqueda, c.consulta) AS relevancia
+        FROM (SELECT websearch_to_tsquery('spanish', %s) || websearch_to_tsquery('catalan', %s)) AS c(consulta)
+        JOIN Estacion e ON e.busqueda @@ c.consulta
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+    """
+    params = [texto, texto]
+
+    if tipo:
+        query += " WHERE e.tipo = %s"
+        params.append(tipo)
+
+    query += " ORDER BY relevancia DESC, e.cod_estacion LIMIT %s"
+    params.append(limite)
+
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            return cur.fetchall()
+
+def filas_instantanea() -> List[Tuple]:
+    """
+    Todas las estaciones con todos los campos de COLUMNAS_ESTACION seguidos de
+    los nombres normalizados de localidad, provincia y estación, en el orden de
+    `buscar_estaciones`. Es la carga de `backend.almacen.instantanea`.
+    """
+    seleccion = ", ".join(COLUMNAS_ESTACION[campo] for campo in CAMPOS_ESTACION)
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT {seleccion}, l.nombre_normalizado, p.nombre_normalizado, e.nombre_normalizado
+                FROM Estacion e
+                JOIN Localidad l ON e.codigo_localidad = l.codigo
+                JOIN Provincia p ON l.codigo_provincia = p.codigo
+                ORDER BY {COLUMNAS_ORDEN}
+            """)
+            return cur.fetchall()
+
+def listar_provincias() -> List[Tuple]:
+    """Devuelve las filas (codigo, nombre) de todas las provincias ordenadas por nombre."""
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT codigo, nombre FROM Provincia ORDER BY nombre")
+            return cur.fetchall()
+
+def listar_localidades(provincia: str) -> List[Tuple]:
+    """
+    Devuelve las filas (codigo, nombre, provincia) de las localidades de una
+    provincia. El nombre se compara sin mayúsculas ni acentos.
+    """
+    query = """
+        SELECT l.codigo, l.nombre, p.nombre as provincia_nombre
+        FROM Localidad l
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE p.nombre_normalizado = %s
+        ORDER BY l.nombre
+    """
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, (normalizar_clave(provincia),))
+            return cur.fetchall()
+
+def resumen_almacen() -> List[Tuple]:
+    """
+    Recuentos del almacén en una sola consulta.
+
+    Returns:
+        Filas (tabla, tipo, total): una por cada tipo de estación presente
+        (tipo None para las estaciones sin tipo) y una para 'provincia' y
+        otra para 'localidad' con tipo None.
+    """
+    query = """
+        SELECT 'estacion', tipo::text, COUNT(*) FROM Estacion GROUP BY tipo
+        UNION ALL
+        SELECT 'provincia', NULL, COUNT(*) FROM Provincia
+        UNION ALL
+        SELECT 'localidad', NULL, COUNT(*) FROM Localidad
+    """
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query)
+            return cur.fetchall()
+
+def coordenadas_estaciones() -> List[Tuple]:
+    """Filas (cod_estacion, tipo, latitud, longitud) de las estaciones con coordenadas."""
+    query = """
+        SELECT cod_estacion, tipo::text, latitud::float8, longitud::float8
+        FROM Estacion
+        WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+    """
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query)
+            return cur.fetchall()
+
+def estaciones_por_codigo(codigos: Sequence[int], campos: Sequence[str] = CAMPOS_ESTACION) -> List[Tuple]:
+    """
+    Devuelve las estaciones con los códigos indicados (en cualquier orden).
+
+    Returns:
+        Filas con cod_estacion seguido de los valores de `campos`.
+    """
+    seleccion = ", ".join(COLUMNAS_ESTACION[campo] for campo in campos)
+    query = f"""
+        SELECT e.cod_estacion, {seleccion}
+        FROM Estacion e
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE e.cod_estacion = ANY(%s)
+    """
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, (list(codigos),))
+            return cur.fetchall()
+
+def nombres_para_sugerencias(campo: str) -> List[Tuple]:
+    """
+    Nombres de localidades o provincias con su número de estaciones.
+
+    Args:
+        campo: 'localidad' o 'provincia'
+
+    Returns:
+        Filas (nombre, nombre_normalizado, provincia, estaciones). provincia
+        solo se rellena para las localidades.
+    """
+    if campo == "localidad":
+        query = """
+            SELECT l.nombre, l.nombre_normalizado, p.nombre, COUNT(e.cod_estacion)
+            FROM Localidad l
+            JOIN Provincia p ON l.codigo_provincia = p.codigo
+            LEFT JOIN Estacion e ON e.codigo_localidad = l.codigo
+            GROUP BY l.codigo, p.nombre
+        """
+    elif campo == "provincia":
+        query = """
+            SELECT p.nombre, p.nombre_normalizado, NULL, COUNT(e.cod_estacion)
+            FROM Provincia p
+            LEFT JOIN Localidad l ON l.codigo_provincia = p.codigo
+            LEFT JOIN Estacion e ON e.codigo_localidad = l.codigo
+            GROUP BY p.codigo
+        """
+    else:
+        raise ValueError(f"Campo de sugerencias desconocido: {campo}")
+
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query)
+            return cur.fetchall()
+
+# Campo de texto -> columna que identifica sus candidatos en la búsqueda aproximada
+COLUMNAS_SIMILITUD = {
+    "localidad": "l.codigo",
+    "provincia": "p.codigo",
+    "nombre": "e.cod_estacion",
+}
+
+def nombres_para_similitud(campo: str) -> List[Tuple]:
+    """
+    Nombres de localidades, provincias o estaciones para el índice de trigramas.
+
+    Args:
+        campo: 'localidad', 'provincia' o 'nombre' (de la estación)
+
+    Returns:
+        Filas (codigo, nombre, nombre_normalizado).
+    """
+    tablas = {
+        "localidad": ("Localidad", "codigo"),
+        "provincia": ("Provincia", "codigo"),
+        "nombre": ("Estacion", "cod_estacion"),
+    }
+    if campo not in tablas:
+        raise ValueError(f"Campo de similitud desconocido: {campo}")
+    tabla, clave = tablas[campo]
+
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT {clave}, nombre, nombre_normalizado FROM {tabla}")
+            return cur.fetchall()
+
+def _cruces_similares(similares):
+    """
+    JOINs con los candidatos de una búsqueda aproximada.
+
+    Returns:
+        tuple: (SQL de los JOIN, expresiones de similitud de cada campo, parámetros)
+    """
+    cruces = ""
+    puntuacion = []
+    params = []
+    for i, (campo, candidatos) in enumerate(similares.items()):
+        cruces += (f" JOIN unnest(%s::int[], %s::float8[]) AS s{i}(codigo, similitud)"
+                   f" ON s{i}.codigo = {COLUMNAS_SIMILITUD[campo]}")
+        params.append([codigo for codigo, _ in candidatos])
+        params.append([similitud for _, similitud in candidatos])
+        puntuacion.append(f"s{i}.similitud")
+    return cruces, puntuacion, params
+
+def buscar_estaciones_similares(similares: Dict[str, Sequence[Tuple[int, float]]],
+                                codigo_postal: Optional[str] = None, tipo: Optional[str] = None,
+                                limite: Optional[int] = None,
+                                campos: Sequence[str] = CAMPOS_ESTACION) -> List[Tuple]:
+    """
+    Estaciones de las localidades, provincias o nombres candidatos de una
+    búsqueda aproximada, de más a menos parecidas.
+
+    Cada lista de candidatos se cruza con su columna (COLUMNAS_SIMILITUD) como
+    una tabla unnest(codigos, similitudes), de modo que la consulta solo
+    recorre por clave primaria las filas candidatas.
+
+    Args:
+        similares: Campo -> lista de (codigo, similitud) de sus candidatos.
+            La estación debe estar entre los candidatos de todos los campos
+        codigo_postal, tipo: Filtros exactos como en `buscar_estaciones`
+
+    Returns:
+        Filas con los valores de `campos` seguidos de la similitud media.
+    """
+    seleccion = ", ".join(COLUMNAS_ESTACION[campo] for campo in campos)
+    cruces, puntuacion, params = _cruces_similares(similares)
+
+    condiciones, params_filtros = _filtros_estaciones(None, codigo_postal, None, tipo)
+    params.extend(params_filtros)
+
+    query = f"""
+        SELECT {seleccion}, ({" + ".join(puntuacion)}) / {len(puntuacion)} AS similitud
+        FROM Estacion e
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        {cruces}
+        WHERE 1=1
+    """ + condiciones + f" ORDER BY similitud DESC, {COLUMNAS_ORDEN}"
+
+    if limite is not None:
+        query += " LIMIT %s"
+        params.append(limite)
+
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            return cur.fetchall()
+
+def contar_facetas(localidad: Optional[str] = None, codigo_postal: Optional[str] = None,
+                   provincia: Optional[str] = None, tipo: Optional[str] = None,
+                   nombre: Optional[str] = None, prefijo: bool = False,
+                   similares: Optional[Dict[str, Sequence[Tuple[int, float]]]] = None) -> List[Tuple]:
+    """
+    Recuentos por provincia, localidad y tipo de las estaciones que cumplen
+    los filtros, en una sola pasada con GROUPING SETS.
+
+    Args:
+        localidad, codigo_postal, provincia, tipo, nombre, prefijo: Los
+            filtros de `buscar_estaciones`
+        similares: Candidatos de una búsqueda aproximada, como en
+            `buscar_estaciones_similares`. Si se indica sustituye a los
+            filtros de texto
+
+    Returns:
+        Filas (dimension, provincia, localidad, tipo, cantidad), donde
+        dimension es 'provincia', 'localidad', 'tipo' o 'total' e indica qué
+        columnas de la fila tienen valor.
+    """
+    if similares:
+        cruces, _, params = _cruces_similares(similares)
+        condiciones, params_filtros = _filtros_estaciones(None, codigo_postal, None, tipo)
+        params.extend(params_filtros)
+    else:
+        cruces = ""
+        condiciones, params = _filtros_estaciones(localidad, codigo_postal, provincia, tipo, nombre, prefijo)
+
+    # GROUPING() pone a 1 el bit de cada columna que no agrupa el conjunto:
+    # (provincia, localidad, tipo) -> 011 provincia, 001 localidad, 110 tipo, 111 total
+    query = f"""
+        SELECT CASE GROUPING(p.nombre, l.nombre, e.tipo)
+                   WHEN 3 THEN 'provincia'
+                   WHEN 1 THEN 'localidad'
+                   WHEN 6 THEN 'tipo'
+                   ELSE 'total'
+               END,
+               p.nombre, l.nombre, e.tipo::text, COUNT(*)
+        FROM Estacion e
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        {cruces}
+        WHERE 1=1
+    """ + condiciones + """
+        GROUP BY GROUPING SETS ((p.nombre), (p.nombre, l.nombre), (e.tipo), ())
+    """
+
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            return cur.fetchall()
+
+# Filtro de una búsqueda del lote -> (columna de la fila, columna comparada, tipo SQL del array)
+FILTROS_LOTE = (
+    ("localidad", "l.nombre_normalizado", "text"),
+    ("codigo_postal", "e.codigo_postal", "text"),
+    ("provincia", "p.nombre_normalizado", "text"),
+    ("tipo", "e.tipo", "tipo_estacion"),
+    ("nombre", "e.nombre_normalizado", "text"),
+)
+
+# Filtros del lote que se comparan como texto normalizado
+FILTROS_TEXTO_LOTE = {"localidad", "provincia", "nombre"}
+
+def agrupar_busquedas_lote(busquedas: Sequence[Tuple], coincidencia: str) -> Dict[Tuple[bool, ...], List[Tuple]]:
+    """
+    Agrupa las búsquedas de un lote por los filtros que usan.
+
+    Returns:
+        Forma (un bool por filtro de FILTROS_LOTE) -> tuplas (indice, valores...)
+        con los textos ya normalizados o convertidos en patrón LIKE y None en
+        los filtros no usados.
+
+    Raises:
+        ValueError: Si alguna búsqueda no tiene ningún filtro
+    """
+    grupos: Dict[Tuple[bool, ...], List[Tuple]] = {}
+    for busqueda in busquedas:
+        indice, *filtros = busqueda
+        valores = []
+        for (nombre_filtro, _, _), valor in zip(FILTROS_LOTE, filtros):
+            if valor and nombre_filtro in FILTROS_TEXTO_LOTE:
+                valor = (normalizar_clave(valor) if coincidencia == "exacta"
+                         else patron_normalizado(valor, coincidencia == "prefijo"))
+            valores.append(valor or None)
+        forma = tuple(valor is not None for valor in valores)
+        if not any(forma):
+            raise ValueError(f"La búsqueda {indice} no tiene ningún filtro")
+        grupos.setdefault(forma, []).append((indice, *valores))
+    return grupos
+
+def buscar_estaciones_lote(busquedas: Sequence[Tuple], coincidencia: str = "exacta",
+                           limite_por_busqueda: int = 100,
+                           campos: Sequence[str] = CAMPOS_ESTACION) -> List[Tuple]:
+    """
+    Resuelve muchas búsquedas a la vez cruzando la lista de filtros, pasada
+    como unnest() de arrays, con las estaciones.
+
+    Las búsquedas se agrupan por los filtros que usan (p. ej. todas las que
+    solo traen código postal) y cada grupo es una única consulta con
+    condiciones de igualdad sobre columnas indexadas; condiciones del tipo
+    "(filtro IS NULL OR columna = filtro)" impedirían usar los índices.
+
+    Args:
+        busquedas: Tuplas (indice, localidad, codigo_postal, provincia, tipo,
+            nombre) con None en los filtros no usados; al menos uno debe tener valor
+        coincidencia: 'exacta', 'prefijo' o 'subcadena' para los filtros de texto
+        limite_por_busqueda: Estaciones devueltas como máximo por búsqueda
+
+    Returns:
+        Filas (indice, valores de `campos`..., total de la búsqueda), ordenadas
+        por indice y después como en `buscar_estaciones`.
+    """
+    grupos = agrupar_busquedas_lote(busquedas, coincidencia)
+
+    seleccion = ", ".join(f"{COLUMNAS_ESTACION[campo]} AS c{i}" for i, campo in enumerate(campos))
+    columnas = ", ".join(f"t.c{i}" for i in range(len(campos)))
+    operador = "=" if coincidencia == "exacta" else "LIKE"
+
+    filas = []
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            for forma, grupo in grupos.items():
+                usados = [filtro for filtro, usado in zip(FILTROS_LOTE, forma) if usado]
+                arrays = ", ".join(f"%s::{tipo_sql}[]" for _, _, tipo_sql in usados)
+                alias = ", ".join(nombre_filtro for nombre_filtro, _, _ in usados)
+                condiciones = " AND ".join(
+                    f"{columna} {operador if nombre_filtro in FILTROS_TEXTO_LOTE else '='} f.{nombre_filtro}"
+                    for nombre_filtro, columna, _ in usados
+                )
+                params = [[fila[0] for fila in grupo]]
+                for posicion, usado in enumerate(forma, start=1):
+                    if usado:
+                        params.append([fila[posicion] for fila in grupo])
+                params.append(limite_por_busqueda)
+
+                cur.execute(f"""
+                    SELECT t.indice, {columnas}, t.total
+                    FROM (
+                        SELECT f.indice, {seleccion},
+                               COUNT(*) OVER (PARTITION BY f.indice) AS total,
+                               ROW_NUMBER() OVER (PARTITION BY f.indice ORDER BY {COLUMNAS_ORDEN}) AS fila
+                        FROM unnest(%s::int[], {arrays}) AS f(indice, {alias})
+                        JOIN Estacion e ON TRUE
+                        JOIN Localidad l ON e.codigo_localidad = l.codigo
+                        JOIN Provincia p ON l.codigo_provincia = p.codigo
+                        WHERE {condiciones}
+                    ) t
+                    WHERE t.fila <= %s
+                    ORDER BY t.indice, t.fila
+                """, params)
+                filas.extend(cur.fetchall())
+
+    filas.sort(key=lambda fila: fila[0])
+    return filas
@@ -0,0 +1,439 @@
+"""
+Consultas de lectura sobre la instantánea SQLite del almacén.
+
+Mismas funciones, argumentos y filas de salida que `backend.almacen.consultas`,
+pero leyendo el fichero de `backend.almacen.instantanea_sqlite` en lugar de
+PostgreSQL. Se usan a través de `backend.almacen.lectura` cuando el servidor
+arranca con `servir = true` en la sección [sqlite] de config.ini.
+
+Diferencias con las consultas de PostgreSQL:
+- El orden de (provincia, localidad, nombre, cod_estacion) se guarda ya
+  calculado en `Estacion.orden` al exportar, con la collation de PostgreSQL,
+  y el cursor de paginación continúa por esa columna. Un cursor de una
+  estación que ya no existe devuelve una página vacía.
+- Los arrays de parámetros (unnest, ANY) se pasan como JSON y se recorren con
+  json_each.
+- /api/buscar/texto usa la tabla FTS5 `Estacion_texto`: sin lematización, así
+  que cada término se busca como prefijo y las palabras vacías más comunes se
+  descartan fuera de las frases. La relevancia es bm25, no ts_rank_cd, y no es comparable.
+"""
+
+import json
+import re
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from backend.almacen.consultas import FILTROS_LOTE, FILTROS_TEXTO_LOTE, agrupar_busquedas_lote, patron_normalizado
+from backend.almacen.instantanea_sqlite import abrir_conexion_sqlite, conexion_sqlite
+from backend.almacen.normalizacion import normalizar_clave
+
+# Campo de EstacionResponse -> expresión SQL que lo produce
+COLUMNAS_ESTACION = {
+    "cod_estacion": "e.cod_estacion",
+    "nombre": "e.nombre",
+    "tipo": "e.tipo",
+    "direccion": "e.direccion",
+    "codigo_postal": "e.codigo_postal",
+    "longitud": "e.longitud",
+    "latitud": "e.latitud",
+    "descripcion": "e.descripcion",
+    "horario": "e.horario",
+    "contacto": "e.contacto",
+    "url": "e.url",
+    "localidad": "l.nombre",
+    "provincia": "p.nombre",
+}
+
+CAMPOS_ESTACION = tuple(COLUMNAS_ESTACION)
+
+# Clave del cursor de paginación que se devuelve tras los campos pedidos
+COLUMNAS_ORDEN = "p.nombre, l.nombre, e.nombre, e.cod_estacion"
+
+FROM_ESTACIONES = """
+    FROM Estacion e
+    JOIN Localidad l ON e.codigo_localidad = l.codigo
+    JOIN Provincia p ON l.codigo_provincia = p.codigo
+"""
+
+# Columnas de Estacion_texto y su peso en bm25, como los pesos A-D del tsvector
+PESOS_TEXTO = (4.0, 2.0, 2.0, 1.0, 0.5, 0.5)
+
+# Palabras vacías que el tsvector de PostgreSQL descarta y que en FTS5
+# obligarían a que aparecieran en la estación
+PALABRAS_VACIAS = {
+    "a", "al", "con", "d", "de", "del", "el", "els", "en", "i", "l", "la", "las",
+    "les", "los", "o", "para", "per", "por", "un", "una", "y",
+}
+
+def _consultar(query: str, params: Sequence = ()) -> List[Tuple]:
+    return conexion_sqlite().execute(query, params).fetchall()
+
+def _filtros_estaciones(localidad, codigo_postal, provincia, tipo, nombre=None, prefijo=False):
+    """Condiciones WHERE comunes a la búsqueda y al recuento, como en PostgreSQL."""
+    condiciones = ""
+    params = []
+
+    if localidad:
+        condiciones += " AND l.nombre_normalizado LIKE ? ESCAPE '\\'"
+        params.append(patron_normalizado(localidad, prefijo))
+
+    if codigo_postal:
+        condiciones += " AND e.codigo_postal = ?"
+        params.append(codigo_postal)
+
+    if provincia:
+        condiciones += " AND p.nombre_normalizado LIKE ? ESCAPE '\\'"
+        params.append(patron_normalizado(provincia, prefijo))
+
+    if tipo:
+        condiciones += " AND e.tipo = ?"
+        params.append(tipo)
+
+    if nombre:
+        condiciones += " AND e.nombre_normalizado LIKE ? ESCAPE '\\'"
+        params.append(patron_normalizado(nombre, prefijo))
+
+    return condiciones, params
+
+def buscar_estaciones(localidad: Optional[str] = None, codigo_postal: Optional[str] = None,
+                      provincia: Optional[str] = None, tipo: Optional[str] = None,
+                      limite: Optional[int] = None, despues_de: Optional[Tuple] = None,
+                      campos: Sequence[str] = CAMPOS_ESTACION, nombre: Optional[str] = None,
+                      prefijo: bool = False) -> List[Tuple]:
+    """Igual que `consultas.buscar_estaciones`."""
+    return _consultar(*_consulta_busqueda(localidad, codigo_postal, provincia, tipo, limite, despues_de,
+                                          campos, nombre, prefijo))
+
+def _consulta_busqueda(localidad, codigo_postal, provincia, tipo, limite, despues_de, campos, nombre, prefijo):
+    """SQL y parámetros de `buscar_estaciones` (también los usa `iterar_estaciones`)."""
+    condiciones, params = _filtros_estaciones(localidad, codigo_postal, provincia, tipo, nombre, prefijo)
+
+    seleccion = ", ".join(COLUMNAS_ESTACION[campo] for campo in campos)
+    query = f"SELECT {seleccion}, {COLUMNAS_ORDEN} {FROM_ESTACIONES} WHERE 1=1" + condiciones
+
+    if despues_de:
+        query += " AND e.orden > (SELECT orden FROM Estacion WHERE cod_estacion = ?)"
+        params.append(despues_de[-1])
+
+    query += " ORDER BY e.orden"
+
+    if limite is not None:
+        query += " LIMIT ?"
+        params.append(limite)
+
+    return query, params
+
+def contar_estaciones(localidad: Optional[str] = None, codigo_postal: Optional[str] = None,
+                      provincia: Optional[str] = None, tipo: Optional[str] = None,
+                      nombre: Optional[str] = None, prefijo: bool = False) -> int:
+    """Igual que `consultas.contar_estaciones`."""
+    condiciones, params = _filtros_estaciones(localidad, codigo_postal, provincia, tipo, nombre, prefijo)
+    return _consultar(f"SELECT COUNT(*) {FROM_ESTACIONES} WHERE 1=1" + condiciones, params)[0][0]
+
+FILAS_POR_LOTE = 1000
+
+def iterar_estaciones(localidad: Optional[str] = None, codigo_postal: Optional[str] = None,
+                      provincia: Optional[str] = None, tipo: Optional[str] = None,
+                      despues_de: Optional[Tuple] = None, campos: Sequence[str] = CAMPOS_ESTACION,
+                      nombre: Optional[str] = None, prefijo: bool = False,
+                      lote: int = FILAS_POR_LOTE) -> Iterator[List[Tuple]]:
+    """
+    Igual que `consultas.iterar_estaciones`. SQLite también entrega las filas
+    a medida que las lee; la conexión es propia del recorrido porque el
+    generador puede avanzar en distintos hilos del executor.
+    """
+    query, params = _consulta_busqueda(localidad, codigo_postal, provincia, tipo, None, despues_de,
+                                       campos, nombre, prefijo)
+    conn = abrir_conexion_sqlite(entre_hilos=True)
+    try:
+        cur = conn.execute(query, params)
+        while True:
+            filas = cur.fetchmany(lote)
+            if not filas:
+                return
+            yield filas
+    finally:
+        conn.close()
+
+def consulta_fts(texto: str, descartar_vacias: bool = True) -> Optional[str]:
+    """
+    Traduce la sintaxis de websearch_to_tsquery a una consulta FTS5.
+
+    Las comillas delimitan frases, "or" une los términos vecinos con OR y un
+    "-" delante excluye el término. Cada término suelto se busca como prefijo
+    y, fuera de las frases, se descartan las palabras vacías salvo que no
+    quede otra cosa (como hace PostgreSQL al combinar spanish y catalan).
+
+    Returns:
+        La consulta, o None si no queda ningún término que buscar
+    """
+    positivos, negativos = [], []
+    unir_con_or = False
+    for negado, frase, palabra in re.findall(r'(-?)(?:"([^"]*)"|(\S+))', texto):
+        if not frase and palabra.lower() == "or":
+            unir_con_or = bool(positivos)
+            continue
+        terminos = re.findall(r"\w+", normalizar_clave(frase or palabra))
+        if descartar_vacias and not frase:
+            terminos = [termino for termino in terminos if termino not in PALABRAS_VACIAS]
+        if not terminos:
+            continue
+        expresion = f'"{" ".join(terminos)}"' + ("" if frase else "*")
+        if negado:
+            negativos.append(expresion)
+        elif unir_con_or:
+            positivos[-1] = f"{positivos[-1]} OR {expresion}"
+            unir_con_or = False
+        else:
+            positivos.append(expresion)
+
+    if not positivos:
+        return consulta_fts(texto, False) if descartar_vacias else None
+    consulta = " AND ".join(f"({grupo})" for grupo in positivos)
+    for expresion in negativos:
+        consulta += f" NOT {expresion}"
+    return consulta
+
+def buscar_texto(texto: str, limite: int, campos: Sequence[str] = CAMPOS_ESTACION,
+                 tipo: Optional[str] = None) -> List[Tuple]:
+    """
+    Búsqueda de texto completo sobre Estacion_texto (FTS5), ordenada por
+    relevancia bm25. Mismas filas que `consultas.buscar_texto`.
+    """
+    consulta = consulta_fts(texto)
+    if consulta is None:
+        return []
+
+    seleccion = ", ".join(COLUMNAS_ESTACION[campo] for campo in campos)
+    pesos = ", ".join(str(peso) for peso in PESOS_TEXTO)
+    query = f"""
+        SELECT {seleccion}, -bm25(Estacion_texto, {pesos}) AS relevancia
+        FROM Estacion_texto t
+        JOIN Estacion e ON e.cod_estacion = t.rowid
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE Estacion_texto MATCH ?
+    """
+    params = [consulta]
+
+    if tipo:
+        query += " AND e.tipo = ?"
+        params.append(tipo)
+
+    query += " ORDER BY relevancia DESC, e.cod_estacion LIMIT ?"
+    params.append(limite)
+
+    return _consultar(query, params)
+
+def filas_instantanea() -> List[Tuple]:
+    """Igual que `consultas.filas_instantanea`."""
+    seleccion = ", ".join(COLUMNAS_ESTACION[campo] for campo in CAMPOS_ESTACION)
+    return _consultar(f"""
+        SELECT {seleccion}, l.nombre_normalizado, p.nombre_normalizado, e.nombre_normalizado
+        {FROM_ESTACIONES}
+        ORDER BY e.orden
+    """)
+
+def listar_provincias() -> List[Tuple]:
+    """Igual que `consultas.listar_provincias`."""
+    return _consultar("SELECT codigo, nombre FROM Provincia ORDER BY orden")
+
+def listar_localidades(provincia: str) -> List[Tuple]:
+    """Igual que `consultas.listar_localidades`."""
+    return _consultar("""
+        SELECT l.codigo, l.nombre, p.nombre
+        FROM Localidad l
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE p.nombre_normalizado = ?
+        ORDER BY l.orden
+    """, (normalizar_clave(provincia),))
+
+def resumen_almacen() -> List[Tuple]:
+    """Igual que `consultas.resumen_almacen`."""
+    return _consultar("""
+        SELECT 'estacion', tipo, COUNT(*) FROM Estacion GROUP BY tipo
+        UNION ALL
+        SELECT 'provincia', NULL, COUNT(*) FROM Provincia
+        UNION ALL
+        SELECT 'localidad', NULL, COUNT(*) FROM Localidad
+    """)
+
+def coordenadas_estaciones() -> List[Tuple]:
+    """Igual que `consultas.coordenadas_estaciones`."""
+    return _consultar("""
+        SELECT cod_estacion, tipo, latitud, longitud
+        FROM Estacion
+        WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+    """)
+
+def estaciones_por_codigo(codigos: Sequence[int], campos: Sequence[str] = CAMPOS_ESTACION) -> List[Tuple]:
+    """Igual que `consultas.estaciones_por_codigo`."""
+    seleccion = ", ".join(COLUMNAS_ESTACION[campo] for campo in campos)
+    return _consultar(f"""
+        SELECT e.cod_estacion, {seleccion}
+        {FROM_ESTACIONES}
+        WHERE e.cod_estacion IN (SELECT value FROM json_each(?))
+    """, (json.dumps(list(codigos)),))
+
+def nombres_para_sugerencias(campo: str) -> List[Tuple]:
+    """Igual que `consultas.nombres_para_sugerencias`."""
+    if campo == "localidad":
+        query = """
+            SELECT l.nombre, l.nombre_normalizado, p.nombre, COUNT(e.cod_estacion)
+            FROM Localidad l
+            JOIN Provincia p ON l.codigo_provincia = p.codigo
+            LEFT JOIN Estacion e ON e.codigo_localidad = l.codigo
+            GROUP BY l.codigo
+        """
+    elif campo == "provincia":
+        query = """
+            SELECT p.nombre, p.nombre_normalizado, NULL, COUNT(e.cod_estacion)
+            FROM Provincia p
+            LEFT JOIN Localidad l ON l.codigo_provincia = p.codigo
+            LEFT JOIN Estacion e ON e.codigo_localidad = l.codigo
+            GROUP BY p.codigo
+        """
+    else:
+        raise ValueError(f"Campo de sugerencias desconocido: {campo}")
+    return _consultar(query)
+
+# Campo de texto -> columna que identifica sus candidatos en la búsqueda aproximada
+COLUMNAS_SIMILITUD = {
+    "localidad": "l.codigo",
+    "provincia": "p.codigo",
+    "nombre": "e.cod_estacion",
+}
+
+def nombres_para_similitud(campo: str) -> List[Tuple]:
+    """Igual que `consultas.nombres_para_similitud`."""
+    tablas = {
+        "localidad": ("Localidad", "codigo"),
+        "provincia": ("Provincia", "codigo"),
+        "nombre": ("Estacion", "cod_estacion"),
+    }
+    if campo not in tablas:
+        raise ValueError(f"Campo de similitud desconocido: {campo}")
+    tabla, clave = tablas[campo]
+    return _consultar(f"SELECT {clave}, nombre, nombre_normalizado FROM {tabla}")
+
+def _cruces_similares(similares):
+    """
+    JOINs con los candidatos de una búsqueda aproximada, pasados como un
+    array JSON de pares [codigo, similitud] por campo.
+
+    Returns:
+        tuple: (SQL de los JOIN, expresiones de similitud de cada campo, parámetros)
+    """
+    cruces = ""
+    puntuacion = []
+    params = []
+    for i, (campo, candidatos) in enumerate(similares.items()):
+        cruces += (f" JOIN (SELECT json_extract(value, '$[0]') AS codigo, json_extract(value, '$[1]') AS similitud"
+                   f" FROM json_each(?)) AS s{i} ON s{i}.codigo = {COLUMNAS_SIMILITUD[campo]}")
+        params.append(json.dumps([[codigo, similitud] for codigo, similitud in candidatos]))
+        puntuacion.append(f"s{i}.similitud")
+    return cruces, puntuacion, params
+
+def buscar_estaciones_similares(similares: Dict[str, Sequence[Tuple[int, float]]],
+                                codigo_postal: Optional[str] = None, tipo: Optional[str] = None,
+                                limite: Optional[int] = None,
+                                campos: Sequence[str] = CAMPOS_ESTACION) -> List[Tuple]:
+    """Igual que `consultas.buscar_estaciones_similares`."""
+    seleccion = ", ".join(COLUMNAS_ESTACION[campo] for campo in campos)
+    cruces, puntuacion, params = _cruces_similares(similares)
+
+    condiciones, params_filtros = _filtros_estaciones(None, codigo_postal, None, tipo)
+    params.extend(params_filtros)
+
+    query = f"""
+        SELECT {seleccion}, ({" + ".join(puntuacion)}) / {len(puntuacion)}.0 AS similitud
+        {FROM_ESTACIONES}
+        {cruces}
+        WHERE 1=1
+    """ + condiciones + " ORDER BY similitud DESC, e.orden"
+
+    if limite is not None:
+        query += " LIMIT ?"
+        params.append(limite)
+
+    return _consultar(query, params)
+
+def contar_facetas(localidad: Optional[str] = None, codigo_postal: Optional[str] = None,
+                   provincia: Optional[str] = None, tipo: Optional[str] = None,
+                   nombre: Optional[str] = None, prefijo: bool = False,
+                   similares: Optional[Dict[str, Sequence[Tuple[int, float]]]] = None) -> List[Tuple]:
+    """
+    Igual que `consultas.contar_facetas`. SQLite no tiene GROUPING SETS: las
+    estaciones filtradas se materializan una vez y se agrupan cuatro veces.
+    """
+    if similares:
+        cruces, _, params = _cruces_similares(similares)
+        condiciones, params_filtros = _filtros_estaciones(None, codigo_postal, None, tipo)
+        params.extend(params_filtros)
+    else:
+        cruces = ""
+        condiciones, params = _filtros_estaciones(localidad, codigo_postal, provincia, tipo, nombre, prefijo)
+
+    query = f"""
+        WITH f AS MATERIALIZED (
+            SELECT p.nombre AS provincia, l.nombre AS localidad, e.tipo AS tipo
+            {FROM_ESTACIONES}
+            {cruces}
+            WHERE 1=1 {condiciones}
+        )
+        SELECT 'provincia', provincia, NULL, NULL, COUNT(*) FROM f GROUP BY provincia
+        UNION ALL
+        SELECT 'localidad', provincia, localidad, NULL, COUNT(*) FROM f GROUP BY provincia, localidad
+        UNION ALL
+        SELECT 'tipo', NULL, NULL, tipo, COUNT(*) FROM f GROUP BY tipo
+        UNION ALL
+        SELECT 'total', NULL, NULL, NULL, COUNT(*) FROM f
+    """
+    return _consultar(query, params)
+
+def buscar_estaciones_lote(busquedas: Sequence[Tuple], coincidencia: str = "exacta",
+                           limite_por_busqueda: int = 100,
+                           campos: Sequence[str] = CAMPOS_ESTACION) -> List[Tuple]:
+    """
+    Igual que `consultas.buscar_estaciones_lote`. Los filtros de cada grupo
+    se pasan como un array JSON de filas [indice, valores...].
+    """
+    grupos = agrupar_busquedas_lote(busquedas, coincidencia)
+
+    seleccion = ", ".join(f"{COLUMNAS_ESTACION[campo]} AS c{i}" for i, campo in enumerate(campos))
+    columnas = ", ".join(f"t.c{i}" for i in range(len(campos)))
+    operador = "=" if coincidencia == "exacta" else "LIKE"
+
+    filas = []
+    for forma, grupo in grupos.items():
+        usados = [(posicion, filtro) for posicion, (filtro, usado) in enumerate(zip(FILTROS_LOTE, forma), start=1)
+                  if usado]
+        condiciones = " AND ".join(
+            f"{columna} = f.{nombre_filtro}" if nombre_filtro not in FILTROS_TEXTO_LOTE or operador == "="
+            else f"{columna} LIKE f.{nombre_filtro} ESCAPE '\\'"
+            for _, (nombre_filtro, columna, _) in usados
+        )
+        # Cada búsqueda es una fila JSON [indice, valores de los filtros usados...]
+        filtros = json.dumps([[fila[0]] + [fila[posicion] for posicion, _ in usados] for fila in grupo])
+        extraidos = ", ".join(
+            f"json_extract(value, '$[{i}]') AS {nombre_filtro}"
+            for i, (_, (nombre_filtro, _, _)) in enumerate(usados, start=1)
+        )
+
+        filas.extend(_consultar(f"""
+            SELECT t.indice, {columnas}, t.total
+            FROM (
+                SELECT f.indice, {seleccion},
+                       COUNT(*) OVER (PARTITION BY f.indice) AS total,
+                       ROW_NUMBER() OVER (PARTITION BY f.indice ORDER BY e.orden) AS fila
+                FROM (SELECT json_extract(value, '$[0]') AS indice, {extraidos} FROM json_each(?)) AS f
+                JOIN Estacion e
+                JOIN Localidad l ON e.codigo_localidad = l.codigo
+                JOIN Provincia p ON l.codigo_provincia = p.codigo
+                WHERE {condiciones}
+            ) t
+            WHERE t.fila <= ?
+            ORDER BY t.indice, t.fila
+        """, (filtros, limite_por_busqueda)))
+
+    filas.sort(key=lambda fila: fila[0])
+    return filas
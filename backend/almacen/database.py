@@ -1,21 +1,66 @@
 import psycopg2
+import psycopg2.errors
+import psycopg2.extras
+import asyncio
 import configparser 
+import contextvars
+import functools
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
-def cargar_configuracion():
-    config = configparser.ConfigParser()
-    ruta_config = os.path.join(os.path.dirname(__file__), '..', '..', 'config.ini')
-    
-    if not os.path.exists(ruta_config):
-        raise FileNotFoundError(f"No se encontró el archivo de configuración en: {os.path.abspath(ruta_config)}")
+from backend.almacen.normalizacion import normalizar_clave
+
+_config = None
+_config_lock = threading.Lock()
+
+def _leer_config():
+    """Lee y parsea config.ini una sola vez por proceso."""
+    global _config
+    with _config_lock:
+        if _config is None:
+            config = configparser.ConfigParser()
+            ruta_config = os.path.join(os.path.dirname(__file__), '..', '..', 'config.ini')
+
+            if not os.path.exists(ruta_config):
+                raise FileNotFoundError(f"No se encontró el archivo de configuración en: {os.path.abspath(ruta_config)}")
 
-    config.read(ruta_config)
+            config.read(ruta_config)
+            _config = config
+        return _config
+
+def cargar_configuracion():
+    config = _leer_config()
     
     if 'postgresql' in config:
         return config['postgresql']
     else:
         raise Exception('No se encontró la sección [postgresql] en el archivo config.ini')
 
+def cargar_seccion(nombre):
+    """
+    Devuelve una sección opcional de config.ini como diccionario.
+
+    Si la sección no existe se devuelve un diccionario vacío, de forma que
+    cada módulo aplique sus propios valores por defecto.
+    """
+    config = _leer_config()
+    if nombre in config:
+        return dict(config[nombre])
+    return {}
+
+def opcion_booleana(seccion, clave, defecto=False) -> bool:
+    """
+    Lee una opción sí/no de una sección opcional de config.ini. Acepta
+    true/false, 1/0, yes/no, on/off y si/no.
+    """
+    valor = cargar_seccion(seccion).get(clave)
+    if valor is None:
+        return defecto
+    return valor.strip().lower() in ('1', 'true', 'yes', 'on', 'si', 'sí')
+
 def conectar():
     try:
         db_config = cargar_configuracion()
@@ -26,62 +71,682 @@ def conectar():
         print(f"Error al conectar con la base de datos: {e}")
         return None
 
-def crear_esquema():
-    conn = conectar()
-    if not conn:
-        return
 
-    CREATE_SCHEMA_SQL = """
-    -- Crear tipo ENUM para el campo 'tipo' en la tabla Estacion
-    DO $$
-    BEGIN
-        IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'tipo_estacion') THEN
-            CREATE TYPE tipo_estacion AS ENUM ('Estación_fija', 'Estación_móvil', 'Otros');
-        END IF;
-    END$$;
-
-    -- 1. Tabla Provincia (sin dependencias)
-    CREATE TABLE IF NOT EXISTS Provincia (
-        codigo SERIAL PRIMARY KEY,
-        nombre VARCHAR(100) NOT NULL UNIQUE
-    );
+class BaseDatosSaturadaError(Exception):
+    """
+    La base de datos no puede atender la petición ahora mismo. Los endpoints
+    responden 503 para que el cliente reintente más tarde.
+    """
 
-    -- 2. Tabla Localidad (depende de Provincia)
-    CREATE TABLE IF NOT EXISTS Localidad (
-        codigo SERIAL PRIMARY KEY,
-        nombre VARCHAR(150) NOT NULL,
-        codigo_provincia INTEGER NOT NULL,
-        CONSTRAINT fk_provincia
-            FOREIGN KEY(codigo_provincia)
-            REFERENCES Provincia(codigo)
-            ON DELETE CASCADE
-    );
 
-    -- 3. Tabla Estacion (depende de Localidad y del tipo ENUM)
-    CREATE TABLE IF NOT EXISTS Estacion (
-        cod_estacion SERIAL PRIMARY KEY,
-        nombre VARCHAR(255) NOT NULL,
-        tipo tipo_estacion,
-        direccion VARCHAR(255),
-        codigo_postal VARCHAR(10),
-        longitud DECIMAL(9, 6),
-        latitud DECIMAL(9, 6),
-        descripcion TEXT,
-        horario VARCHAR(255),
-        contacto VARCHAR(255),
-        url VARCHAR(255),
-        codigo_localidad INTEGER NOT NULL,
-        CONSTRAINT fk_localidad
-            FOREIGN KEY(codigo_localidad)
-            REFERENCES Localidad(codigo)
-            ON DELETE CASCADE
+class PoolAgotadoError(BaseDatosSaturadaError):
+    """No se ha podido obtener una conexión libre dentro del tiempo de espera."""
+
+
+class TiempoConsultaAgotadoError(BaseDatosSaturadaError):
+    """Una sentencia superó el statement_timeout fijado para la petición."""
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones PostgreSQL compartido por todo el proceso.
+
+    Mantiene entre `minimo` y `maximo` conexiones abiertas. Al adquirir una
+    conexión se comprueba su estado (ping si lleva tiempo inactiva) y se
+    recicla si ha superado su vida máxima. Al liberarla se deshace cualquier
+    transacción pendiente para que el siguiente usuario la reciba limpia.
+
+    Args:
+        parametros: Parámetros de conexión para psycopg2.connect
+        minimo: Conexiones que se abren al crear el pool
+        maximo: Límite de conexiones abiertas simultáneamente
+        timeout_espera: Segundos máximos esperando una conexión libre
+        vida_maxima: Segundos tras los que una conexión se cierra y se reabre
+        ping_tras_inactividad: Segundos de inactividad a partir de los cuales
+            se hace `SELECT 1` antes de entregar la conexión
+    """
+
+    def __init__(self, parametros, minimo=1, maximo=10, timeout_espera=5.0,
+                 vida_maxima=1800.0, ping_tras_inactividad=30.0):
+        if minimo < 0 or maximo < 1 or minimo > maximo:
+            raise ValueError(f"Tamaño de pool inválido: minimo={minimo}, maximo={maximo}")
+
+        self.parametros = dict(parametros)
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout_espera = timeout_espera
+        self.vida_maxima = vida_maxima
+        self.ping_tras_inactividad = ping_tras_inactividad
+
+        self._condicion = threading.Condition()
+        self._libres = []        # [(conn, creada_en, liberada_en)]
+        self._en_uso = {}        # id(conn) -> creada_en
+        self._reservadas = 0     # huecos tomados pero aún no entregados
+        self._cerrado = False
+
+        self._stats = {
+            'creadas': 0,
+            'recicladas': 0,
+            'descartadas': 0,
+            'esperas': 0,
+            'timeouts': 0,
+            'tiempo_espera_total': 0.0,
+            'tiempo_espera_max': 0.0,
+        }
+
+        for _ in range(minimo):
+            conn = self._abrir()
+            ahora = time.monotonic()
+            self._libres.append((conn, ahora, ahora))
+
+    def _abrir(self):
+        conn = psycopg2.connect(**self.parametros)
+        with self._condicion:
+            self._stats['creadas'] += 1
+        return conn
+
+    def _cerrar_silencioso(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _es_valida(self, conn, creada_en, liberada_en):
+        """Comprueba si una conexión libre puede entregarse."""
+        ahora = time.monotonic()
+        if conn.closed:
+            return False
+        if ahora - creada_en > self.vida_maxima:
+            with self._condicion:
+                self._stats['recicladas'] += 1
+            return False
+        if ahora - liberada_en > self.ping_tras_inactividad:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def adquirir(self):
+        """
+        Obtiene una conexión del pool, esperando como máximo `timeout_espera`.
+
+        Raises:
+            PoolAgotadoError: Si no se libera ninguna conexión a tiempo
+            psycopg2.Error: Si falla la apertura de una conexión nueva
+        """
+        inicio = time.monotonic()
+        limite = inicio + self.timeout_espera
+        ha_esperado = False
+
+        with self._condicion:
+            while True:
+                if self._cerrado:
+                    raise PoolAgotadoError("El pool de conexiones está cerrado")
+
+                if self._libres:
+                    conn, creada_en, liberada_en = self._libres.pop()
+                    self._reservadas += 1
+                    break
+
+                if len(self._en_uso) + self._reservadas < self.maximo:
+                    self._reservadas += 1
+                    conn = None
+                    break
+
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    espera = time.monotonic() - inicio
+                    self._stats['timeouts'] += 1
+                    self._stats['tiempo_espera_total'] += espera
+                    self._stats['tiempo_espera_max'] = max(self._stats['tiempo_espera_max'], espera)
+                    raise PoolAgotadoError(
+                        f"No hay conexiones libres tras {self.timeout_espera}s de espera "
+                        f"({self.maximo} en uso)"
+                    )
+                if not ha_esperado:
+                    ha_esperado = True
+                    self._stats['esperas'] += 1
+                self._condicion.wait(restante)
+
+            if ha_esperado:
+                espera = time.monotonic() - inicio
+                self._stats['tiempo_espera_total'] += espera
+                self._stats['tiempo_espera_max'] = max(self._stats['tiempo_espera_max'], espera)
+
+        # La comprobación y la apertura hacen red: se ejecutan fuera del lock,
+        # con el hueco ya reservado para no superar el máximo.
+        try:
+            if conn is not None and not self._es_valida(conn, creada_en, liberada_en):
+                self._cerrar_silencioso(conn)
+                with self._condicion:
+                    self._stats['descartadas'] += 1
+                conn = None
+
+            if conn is None:
+                conn = self._abrir()
+                creada_en = time.monotonic()
+        except Exception:
+            with self._condicion:
+                self._reservadas -= 1
+                self._condicion.notify()
+            raise
+
+        with self._condicion:
+            self._reservadas -= 1
+            self._en_uso[id(conn)] = creada_en
+        return conn
+
+    def liberar(self, conn, descartar=False):
+        """
+        Devuelve una conexión al pool.
+
+        Args:
+            conn: Conexión obtenida con `adquirir()`
+            descartar: Si es True la conexión se cierra en lugar de reutilizarse
+        """
+        if not descartar and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                descartar = True
+
+        with self._condicion:
+            creada_en = self._en_uso.pop(id(conn), time.monotonic())
+            if descartar or conn.closed or self._cerrado:
+                self._stats['descartadas'] += 1
+                cerrar = True
+            else:
+                self._libres.append((conn, creada_en, time.monotonic()))
+                cerrar = False
+            self._condicion.notify()
+
+        if cerrar:
+            self._cerrar_silencioso(conn)
+
+    def cerrar(self):
+        """Cierra todas las conexiones libres y rechaza nuevas adquisiciones."""
+        with self._condicion:
+            self._cerrado = True
+            libres, self._libres = self._libres, []
+            self._condicion.notify_all()
+        for conn, _, _ in libres:
+            self._cerrar_silencioso(conn)
+
+    def estadisticas(self):
+        """Devuelve un resumen del estado del pool."""
+        with self._condicion:
+            esperas = self._stats['esperas']
+            return {
+                'minimo': self.minimo,
+                'maximo': self.maximo,
+                'en_uso': len(self._en_uso),
+                'libres': len(self._libres),
+                'esperas': esperas,
+                'timeouts': self._stats['timeouts'],
+                'tiempo_espera_total_ms': round(self._stats['tiempo_espera_total'] * 1000, 3),
+                'tiempo_espera_medio_ms': round(self._stats['tiempo_espera_total'] * 1000 / esperas, 3) if esperas else 0.0,
+                'tiempo_espera_max_ms': round(self._stats['tiempo_espera_max'] * 1000, 3),
+                'creadas': self._stats['creadas'],
+                'recicladas': self._stats['recicladas'],
+                'descartadas': self._stats['descartadas'],
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def obtener_pool():
+    """
+    Devuelve el pool global del proceso, creándolo en el primer uso.
+
+    El tamaño y los tiempos se leen de la sección opcional [pool] de config.ini:
+    minimo, maximo, timeout_espera, vida_maxima, ping_tras_inactividad.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            opciones = cargar_seccion('pool')
+            _pool = PoolConexiones(
+                cargar_configuracion(),
+                minimo=int(opciones.get('minimo', 1)),
+                maximo=int(opciones.get('maximo', 10)),
+                timeout_espera=float(opciones.get('timeout_espera', 5.0)),
+                vida_maxima=float(opciones.get('vida_maxima', 1800.0)),
+                ping_tras_inactividad=float(opciones.get('ping_tras_inactividad', 30.0)),
+            )
+        return _pool
+
+# Milisegundos de statement_timeout de la petición en curso (None: sin límite).
+# Lo fija el control de admisión de la API para cada grupo de endpoints.
+_limite_sentencias = contextvars.ContextVar("limite_sentencias", default=None)
+
+def fijar_limite_sentencias(milisegundos):
+    """
+    Fija el statement_timeout de las conexiones que pida la tarea actual.
+
+    El valor vive en un ContextVar: afecta solo a la petición que lo fija y
+    `ejecutar_bd` lo traslada al hilo que ejecuta la consulta.
+    """
+    _limite_sentencias.set(milisegundos)
+
+@contextmanager
+def obtener_conexion():
+    """
+    Context manager que presta una conexión del pool global.
+
+    La conexión se devuelve al pool al salir del bloque; cualquier transacción
+    sin confirmar se deshace. Si la conexión se rompe durante su uso se descarta.
+
+    Si la petición tiene un límite de duración (`fijar_limite_sentencias`) se
+    aplica con `SET LOCAL statement_timeout`, que dura hasta el primer commit
+    o rollback, y una sentencia cancelada por el límite se convierte en
+    `TiempoConsultaAgotadoError`; la conexión sigue siendo válida.
+
+    Example:
+        >>> with obtener_conexion() as conn:
+        ...     with conn.cursor() as cur:
+        ...         cur.execute("SELECT 1")
+    """
+    pool = obtener_pool()
+    conn = pool.adquirir()
+    descartar = False
+    limite = _limite_sentencias.get()
+    try:
+        if limite:
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL statement_timeout = %s", (int(limite),))
+        yield conn
+    except psycopg2.errors.QueryCanceled as e:
+        raise TiempoConsultaAgotadoError(
+            f"La consulta superó el tiempo máximo de {limite} ms"
+        ) from e
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        descartar = True
+        raise
+    finally:
+        pool.liberar(conn, descartar=descartar)
+
+def estadisticas_pool():
+    """Estadísticas del pool global, o None si aún no se ha creado."""
+    if _pool is None:
+        return None
+    return _pool.estadisticas()
+
+_executor = None
+
+def _obtener_executor():
+    """Executor de hilos para consultas, con tantos hilos como conexiones tiene el pool."""
+    global _executor
+    with _pool_lock:
+        if _executor is None:
+            maximo = int(cargar_seccion('pool').get('maximo', 10))
+            _executor = ThreadPoolExecutor(max_workers=maximo, thread_name_prefix="bd")
+        return _executor
+
+async def ejecutar_bd(funcion, *args, **kwargs):
+    """
+    Ejecuta una función bloqueante de acceso a datos sin bloquear el bucle de eventos.
+
+    La función se ejecuta en un executor acotado al tamaño máximo del pool, de modo
+    que nunca hay más hilos esperando conexión que conexiones disponibles y las
+    peticiones que excedan ese número esperan en la cola del executor. La
+    función se ejecuta con una copia del contexto de la tarea, para que vea
+    el límite de duración de la petición.
+
+    Example:
+        >>> filas = await ejecutar_bd(consultas.listar_provincias)
+    """
+    loop = asyncio.get_running_loop()
+    contexto = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _obtener_executor(), functools.partial(contexto.run, funcion, *args, **kwargs)
+    )
+
+_FIN = object()
+
+async def iterar_bd(funcion, *args, **kwargs):
+    """
+    Recorre un generador bloqueante de acceso a datos sin bloquear el bucle de eventos.
+
+    Cada paso del generador (`next`) se ejecuta en el executor de
+    `ejecutar_bd`, con la misma copia del contexto de la tarea, así que un
+    hilo solo está ocupado mientras se lee un lote y no mientras el cliente
+    lo descarga. Si el recorrido se abandona (cliente desconectado, error
+    al enviar) el generador se cierra en el executor, cuando termine el paso
+    que estuviera en curso, para que libere su conexión.
+
+    Example:
+        >>> async for filas in iterar_bd(consultas.iterar_estaciones, provincia="Valencia"):
+        ...     enviar(filas)
+    """
+    executor = _obtener_executor()
+    contexto = contextvars.copy_context()
+    generador = contexto.run(funcion, *args, **kwargs)
+    paso = None
+    try:
+        while True:
+            paso = executor.submit(contexto.run, next, generador, _FIN)
+            elemento = await asyncio.wrap_future(paso)
+            if elemento is _FIN:
+                return
+            yield elemento
+    finally:
+        def cerrar(_=None):
+            try:
+                executor.submit(contexto.run, generador.close)
+            except RuntimeError:
+                # El executor ya se ha cerrado al apagar el servidor
+                generador.close()
+
+        if paso is not None and not paso.done():
+            paso.add_done_callback(cerrar)
+        else:
+            cerrar()
+
+def cerrar_pool():
+    """Cierra el pool global y su executor (se usa al apagar el servidor)."""
+    global _pool, _executor
+    with _pool_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+        if _pool is not None:
+            _pool.cerrar()
+            _pool = None
+
+CREATE_SCHEMA_SQL = """
+-- Crear tipo ENUM para el campo 'tipo' en la tabla Estacion
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'tipo_estacion') THEN
+        CREATE TYPE tipo_estacion AS ENUM ('Estación_fija', 'Estación_móvil', 'Otros');
+    END IF;
+END$$;
+
+-- 1. Tabla Provincia (sin dependencias)
+CREATE TABLE IF NOT EXISTS Provincia (
+    codigo SERIAL PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL UNIQUE,
+    nombre_normalizado VARCHAR(100)
+);
+
+-- 2. Tabla Localidad (depende de Provincia)
+CREATE TABLE IF NOT EXISTS Localidad (
+    codigo SERIAL PRIMARY KEY,
+    nombre VARCHAR(150) NOT NULL,
+    nombre_normalizado VARCHAR(150),
+    codigo_provincia INTEGER NOT NULL,
+    CONSTRAINT fk_provincia
+        FOREIGN KEY(codigo_provincia)
+        REFERENCES Provincia(codigo)
+        ON DELETE CASCADE
+);
+
+-- 3. Tabla Estacion (depende de Localidad y del tipo ENUM)
+CREATE TABLE IF NOT EXISTS Estacion (
+    cod_estacion SERIAL PRIMARY KEY,
+    nombre VARCHAR(255) NOT NULL,
+    nombre_normalizado VARCHAR(255),
+    tipo tipo_estacion,
+    direccion VARCHAR(255),
+    codigo_postal VARCHAR(10),
+    longitud DECIMAL(9, 6),
+    latitud DECIMAL(9, 6),
+    descripcion TEXT,
+    horario VARCHAR(255),
+    contacto VARCHAR(255),
+    url VARCHAR(255),
+    codigo_localidad INTEGER NOT NULL,
+    busqueda tsvector,
+    provincia_nombre VARCHAR(100),
+    localidad_nombre VARCHAR(150),
+    CONSTRAINT fk_localidad
+        FOREIGN KEY(codigo_localidad)
+        REFERENCES Localidad(codigo)
+        ON DELETE CASCADE
+);
+
+-- Esquemas anteriores: columnas de búsqueda normalizadas (minúsculas y sin
+-- acentos). Se rellenan desde Python al insertar y con rellenar_normalizados().
+ALTER TABLE Provincia ADD COLUMN IF NOT EXISTS nombre_normalizado VARCHAR(100);
+ALTER TABLE Localidad ADD COLUMN IF NOT EXISTS nombre_normalizado VARCHAR(150);
+ALTER TABLE Estacion ADD COLUMN IF NOT EXISTS nombre_normalizado VARCHAR(255);
+
+-- Clave de ordenación de buscar_estaciones (provincia, localidad, nombre,
+-- cod_estacion) en la propia Estacion, para que ORDER BY y el cursor de
+-- paginación se resuelvan con un solo índice en vez de ordenar el join
+-- completo en cada página. La mantienen los triggers al insertar o cambiar de
+-- localidad la estación y al renombrar una localidad o provincia; las filas
+-- anteriores se rellenan con rellenar_orden().
+ALTER TABLE Estacion ADD COLUMN IF NOT EXISTS provincia_nombre VARCHAR(100);
+ALTER TABLE Estacion ADD COLUMN IF NOT EXISTS localidad_nombre VARCHAR(150);
+
+CREATE OR REPLACE FUNCTION actualizar_orden_estacion() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    SELECT l.nombre, p.nombre INTO NEW.localidad_nombre, NEW.provincia_nombre
+    FROM Localidad l JOIN Provincia p ON l.codigo_provincia = p.codigo
+    WHERE l.codigo = NEW.codigo_localidad;
+    RETURN NEW;
+END$$;
+
+DROP TRIGGER IF EXISTS trg_estacion_orden ON Estacion;
+CREATE TRIGGER trg_estacion_orden
+    BEFORE INSERT OR UPDATE OF codigo_localidad ON Estacion
+    FOR EACH ROW EXECUTE FUNCTION actualizar_orden_estacion();
+
+CREATE OR REPLACE FUNCTION propagar_nombre_localidad() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE Estacion e
+    SET localidad_nombre = NEW.nombre, provincia_nombre = p.nombre
+    FROM Provincia p
+    WHERE e.codigo_localidad = NEW.codigo AND p.codigo = NEW.codigo_provincia;
+    RETURN NULL;
+END$$;
+
+DROP TRIGGER IF EXISTS trg_localidad_orden ON Localidad;
+CREATE TRIGGER trg_localidad_orden
+    AFTER UPDATE OF nombre, codigo_provincia ON Localidad
+    FOR EACH ROW EXECUTE FUNCTION propagar_nombre_localidad();
+
+CREATE OR REPLACE FUNCTION propagar_nombre_provincia() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE Estacion e
+    SET provincia_nombre = NEW.nombre
+    FROM Localidad l
+    WHERE e.codigo_localidad = l.codigo AND l.codigo_provincia = NEW.codigo;
+    RETURN NULL;
+END$$;
+
+DROP TRIGGER IF EXISTS trg_provincia_orden ON Provincia;
+CREATE TRIGGER trg_provincia_orden
+    AFTER UPDATE OF nombre ON Provincia
+    FOR EACH ROW EXECUTE FUNCTION propagar_nombre_provincia();
+
+-- Búsqueda de texto completo (/api/buscar/texto). Estacion.busqueda guarda el
+-- tsvector de nombre, localidad, provincia, dirección, descripción y horario,
+-- analizado con las configuraciones spanish y catalan (PostgreSQL no trae una
+-- gallega; el stemmer español cubre bien el vocabulario de los horarios y
+-- direcciones gallegos). Lo mantiene un trigger al insertar o modificar la
+-- estación, también cuando trg_localidad_orden o trg_provincia_orden le copian
+-- un nombre nuevo, y las filas anteriores se rellenan con rellenar_busqueda().
+ALTER TABLE Estacion ADD COLUMN IF NOT EXISTS busqueda tsvector;
+
+CREATE OR REPLACE FUNCTION vector_es_ca(texto TEXT) RETURNS tsvector
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT to_tsvector('spanish', coalesce(texto, '')) || to_tsvector('catalan', coalesce(texto, ''))
+$$;
+
+-- Pesos: A nombre, B localidad y provincia, C dirección, D descripción y horario
+CREATE OR REPLACE FUNCTION vector_busqueda_estacion(
+    nombre TEXT, localidad TEXT, provincia TEXT, direccion TEXT, descripcion TEXT, horario TEXT
+) RETURNS tsvector
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT setweight(vector_es_ca(nombre), 'A')
+        || setweight(vector_es_ca(concat_ws(' ', localidad, provincia)), 'B')
+        || setweight(vector_es_ca(direccion), 'C')
+        || setweight(vector_es_ca(concat_ws(' ', descripcion, horario)), 'D')
+$$;
+
+CREATE OR REPLACE FUNCTION actualizar_busqueda_estacion() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    nombre_localidad TEXT;
+    nombre_provincia TEXT;
+BEGIN
+    SELECT l.nombre, p.nombre INTO nombre_localidad, nombre_provincia
+    FROM Localidad l JOIN Provincia p ON l.codigo_provincia = p.codigo
+    WHERE l.codigo = NEW.codigo_localidad;
+
+    NEW.busqueda := vector_busqueda_estacion(
+        NEW.nombre, nombre_localidad, nombre_provincia, NEW.direccion, NEW.descripcion, NEW.horario
     );
+    RETURN NEW;
+END$$;
+
+DROP TRIGGER IF EXISTS trg_estacion_busqueda ON Estacion;
+CREATE TRIGGER trg_estacion_busqueda
+    BEFORE INSERT OR UPDATE OF nombre, direccion, descripcion, horario, codigo_localidad,
+                               localidad_nombre, provincia_nombre ON Estacion
+    FOR EACH ROW EXECUTE FUNCTION actualizar_busqueda_estacion();
+
+-- 4. Índices ajustados a los accesos de la búsqueda y de la carga.
+-- Claves foráneas: joins Estacion→Localidad→Provincia y borrados en cascada
+CREATE INDEX IF NOT EXISTS idx_estacion_codigo_localidad ON Estacion (codigo_localidad);
+CREATE INDEX IF NOT EXISTS idx_localidad_codigo_provincia ON Localidad (codigo_provincia);
+
+-- Validate.es_duplicado: WHERE nombre = %s
+CREATE INDEX IF NOT EXISTS idx_estacion_nombre ON Estacion (nombre);
+
+-- get_or_create_localidad: WHERE nombre = %s AND codigo_provincia = %s
+CREATE INDEX IF NOT EXISTS idx_localidad_nombre_provincia ON Localidad (nombre, codigo_provincia);
+
+-- buscar_estaciones: e.codigo_postal = %s y e.tipo = %s (con el join por localidad)
+CREATE INDEX IF NOT EXISTS idx_estacion_codigo_postal ON Estacion (codigo_postal);
+CREATE INDEX IF NOT EXISTS idx_estacion_tipo_localidad ON Estacion (tipo, codigo_localidad);
+
+-- Búsquedas por nombre normalizado: igualdad y prefijo (LIKE 'abc%').
+-- text_pattern_ops permite usar el B-tree con LIKE sea cual sea la collation.
+CREATE INDEX IF NOT EXISTS idx_provincia_nombre_normalizado ON Provincia (nombre_normalizado text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_localidad_nombre_normalizado ON Localidad (nombre_normalizado text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_estacion_nombre_normalizado ON Estacion (nombre_normalizado text_pattern_ops);
+
+-- buscar_estaciones: ORDER BY clave de ordenación y cursor
+-- (provincia_nombre, localidad_nombre, nombre, cod_estacion) > (...)
+CREATE INDEX IF NOT EXISTS idx_estacion_orden ON Estacion (provincia_nombre, localidad_nombre, nombre, cod_estacion);
+
+-- buscar_texto: e.busqueda @@ tsquery
+CREATE INDEX IF NOT EXISTS idx_estacion_busqueda ON Estacion USING gin (busqueda);
+
+-- Sustituidos por los índices sobre nombre_normalizado
+DROP INDEX IF EXISTS idx_provincia_nombre_lower;
+DROP INDEX IF EXISTS idx_localidad_nombre_trgm;
+DROP INDEX IF EXISTS idx_provincia_nombre_trgm;
+
+-- buscar_estaciones: nombre_normalizado LIKE '%...%' solo puede usar índices trigrama.
+-- pg_trgm viene en postgresql-contrib; si no está disponible se omiten.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS idx_localidad_normalizado_trgm ON Localidad USING gin (nombre_normalizado gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_provincia_normalizado_trgm ON Provincia USING gin (nombre_normalizado gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_estacion_normalizado_trgm ON Estacion USING gin (nombre_normalizado gin_trgm_ops);
+    ELSE
+        RAISE NOTICE 'pg_trgm no disponible: se omiten los índices trigrama';
+    END IF;
+END$$;
+"""
+
+TABLAS_NORMALIZADAS = (
+    ("Provincia", "codigo"),
+    ("Localidad", "codigo"),
+    ("Estacion", "cod_estacion"),
+)
+
+def rellenar_normalizados(cur):
     """
+    Calcula `nombre_normalizado` de las filas que aún no lo tienen (las
+    insertadas antes de existir la columna).
+
+    La normalización se hace en Python con la misma función que usan los
+    extractores, porque PostgreSQL no sabe quitar acentos sin la extensión
+    unaccent.
+
+    Returns:
+        Número de filas actualizadas
+    """
+    actualizadas = 0
+    for tabla, clave in TABLAS_NORMALIZADAS:
+        cur.execute(f"SELECT {clave}, nombre FROM {tabla} WHERE nombre_normalizado IS NULL")
+        filas = [(codigo, normalizar_clave(nombre)) for codigo, nombre in cur.fetchall()]
+        if filas:
+            psycopg2.extras.execute_values(
+                cur,
+                f"""UPDATE {tabla} AS t SET nombre_normalizado = v.normalizado
+                    FROM (VALUES %s) AS v(codigo, normalizado) WHERE t.{clave} = v.codigo""",
+                filas, page_size=1000
+            )
+            actualizadas += len(filas)
+    return actualizadas
+
+def rellenar_busqueda(cur):
+    """
+    Calcula `Estacion.busqueda` de las estaciones que aún no lo tienen (las
+    insertadas antes de existir la columna y su trigger).
+
+    Returns:
+        Número de estaciones actualizadas
+    """
+    cur.execute("""
+        UPDATE Estacion e
+        SET busqueda = vector_busqueda_estacion(e.nombre, l.nombre, p.nombre, e.direccion, e.descripcion, e.horario)
+        FROM Localidad l JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE e.codigo_localidad = l.codigo AND e.busqueda IS NULL
+    """)
+    return cur.rowcount
+
+def rellenar_orden(cur):
+    """
+    Copia los nombres de localidad y provincia en las estaciones que aún no
+    los tienen (las insertadas antes de existir las columnas y su trigger).
+
+    Returns:
+        Número de estaciones actualizadas
+    """
+    cur.execute("""
+        UPDATE Estacion e
+        SET localidad_nombre = l.nombre, provincia_nombre = p.nombre
+        FROM Localidad l JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE e.codigo_localidad = l.codigo AND e.provincia_nombre IS NULL
+    """)
+    return cur.rowcount
+
+def crear_esquema():
+    conn = conectar()
+    if not conn:
+        return
+
     try:
         with conn:
             with conn.cursor() as cur:
                 print("Creando esquema de la base de datos...")
                 cur.execute(CREATE_SCHEMA_SQL)
+                actualizadas = rellenar_normalizados(cur)
+                if actualizadas:
+                    print(f"Nombres normalizados calculados para {actualizadas} filas existentes")
+                actualizadas = rellenar_busqueda(cur)
+                if actualizadas:
+                    print(f"Índice de texto completo calculado para {actualizadas} estaciones existentes")
+                actualizadas = rellenar_orden(cur)
+                if actualizadas:
+                    print(f"Clave de ordenación calculada para {actualizadas} estaciones existentes")
         print("¡Esquema creado o ya existente!")
     except psycopg2.Error as e:
         print(f"Error al crear el esquema: {e}")
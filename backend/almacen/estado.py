@@ -0,0 +1,69 @@
+"""
+Estado del almacén (recuentos) mantenido en memoria.
+
+`GET /api/estado` no cuenta filas en cada petición: devuelve un resumen
+calculado una sola vez por versión de los datos (`backend.almacen.version`).
+El resumen se recalcula con una única consulta agrupada
+(`consultas.resumen_almacen`) justo después de cada carga o borrado, así que
+servir el estado cuesta O(1) independientemente del tamaño del almacén.
+"""
+
+import threading
+
+from backend.almacen.lectura import consultas
+from backend.almacen.version import suscribir_cambios, version_datos
+
+# Clave de estaciones_por_tipo para las estaciones sin tipo
+SIN_TIPO = "Sin tipo"
+
+# Tabla de resumen_almacen -> campo de EstadoAlmacenResponse
+CAMPOS_TOTAL = {
+    'provincia': 'total_provincias',
+    'localidad': 'total_localidades',
+}
+
+_lock = threading.Lock()
+_estado = None
+_version_estado = None
+
+def _calcular_estado() -> dict:
+    """Ejecuta la consulta agrupada y construye el resumen."""
+    estado = {
+        'total_estaciones': 0,
+        'total_provincias': 0,
+        'total_localidades': 0,
+        'estaciones_por_tipo': {},
+    }
+    for tabla, tipo, total in consultas.resumen_almacen():
+        if tabla == 'estacion':
+            estado['total_estaciones'] += total
+            estado['estaciones_por_tipo'][tipo or SIN_TIPO] = total
+        else:
+            estado[CAMPOS_TOTAL[tabla]] = total
+    return estado
+
+def estado_almacen() -> dict:
+    """
+    Devuelve el resumen del almacén para la versión actual de los datos.
+
+    Solo consulta la base de datos la primera vez y tras un cambio de versión;
+    el resto de llamadas devuelven una copia del resumen en memoria.
+    """
+    global _estado, _version_estado
+    with _lock:
+        version = version_datos()
+        if _estado is None or _version_estado != version:
+            # La versión se lee antes de consultar: si cambia durante la
+            # consulta el resumen queda marcado como antiguo y se repite
+            _estado = _calcular_estado()
+            _version_estado = version
+        return {**_estado, 'estaciones_por_tipo': dict(_estado['estaciones_por_tipo'])}
+
+def _actualizar_tras_cambio(version: str):
+    """Suscriptor de cambios: recalcula el resumen en cuanto termina una carga o borrado."""
+    try:
+        estado_almacen()
+    except Exception as e:
+        print(f"Error al actualizar el estado del almacén: {e}")
+
+suscribir_cambios(_actualizar_tras_cambio)
@@ -0,0 +1,275 @@
+"""
+Índice espacial en memoria para buscar las estaciones más cercanas a un punto.
+
+Las coordenadas de todas las estaciones se reparten en una rejilla de celdas
+de `TAMANO_CELDA` grados. Una búsqueda recorre anillos de celdas alrededor del
+punto, del más cercano al más lejano, y se detiene en cuanto ningún anillo
+pendiente puede contener una estación más cerca que la n-ésima encontrada.
+Con la densidad de estaciones de España basta con visitar unas pocas celdas.
+
+El índice guarda solo (cod_estacion, tipo, latitud, longitud); los datos
+completos de las estaciones devueltas se piden después a la base de datos por
+clave primaria. Se construye al arrancar el servidor y se reconstruye tras
+cada carga o borrado (ver `backend.almacen.version`).
+"""
+
+import heapq
+import math
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from backend.almacen.lectura import consultas
+from backend.almacen.version import suscribir_cambios, version_datos
+
+RADIO_TIERRA_KM = 6371.0088
+
+# Lado de cada celda de la rejilla, en grados (~11 km de latitud)
+TAMANO_CELDA = 0.1
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia de círculo máximo entre dos puntos en grados decimales, en km."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+# Límite de latitud de la proyección web mercator usada por los mapas
+LAT_MAX_MERCATOR = 85.05112878
+
+def mercator_x(lon: float) -> float:
+    """Coordenada x web mercator normalizada a [0, 1] (oeste -> este)."""
+    return (lon + 180.0) / 360.0
+
+def mercator_y(lat: float) -> float:
+    """Coordenada y web mercator normalizada a [0, 1] (norte -> sur)."""
+    phi = math.radians(max(-LAT_MAX_MERCATOR, min(LAT_MAX_MERCATOR, lat)))
+    return (1.0 - math.log(math.tan(phi) + 1 / math.cos(phi)) / math.pi) / 2.0
+
+def ajustar_a_teselas(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                      zoom: int) -> Tuple[float, float, float, float]:
+    """
+    Amplía un rectángulo hasta los bordes de las teselas web mercator (las de
+    OpenStreetMap/Leaflet) que lo cubren en el nivel de zoom indicado.
+
+    Dos vistas del mapa que caen en las mismas teselas producen el mismo
+    rectángulo, lo que permite reutilizar resultados al desplazar el mapa.
+    """
+    n = 2 ** zoom
+
+    def tesela(coordenada):
+        return min(n - 1, max(0, math.floor(coordenada * n)))
+
+    def lat_borde(y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+    # En web mercator la y crece hacia el sur
+    return (
+        lat_borde(tesela(mercator_y(min_lat)) + 1),
+        tesela(mercator_x(min_lon)) / n * 360.0 - 180.0,
+        lat_borde(tesela(mercator_y(max_lat))),
+        (tesela(mercator_x(max_lon)) + 1) / n * 360.0 - 180.0,
+    )
+
+def muestra_repartida(elementos: list, limite: int) -> list:
+    """
+    Devuelve uno de cada k elementos (k = ceil(len / limite)), como mucho
+    `limite`. En una lista ordenada por celdas, como la de `en_rectangulo`,
+    la muestra queda repartida por todo el rectángulo.
+    """
+    total = len(elementos)
+    if total <= limite:
+        return elementos
+    return elementos[::-(-total // limite)][:limite]
+
+class IndiceEspacial:
+    """
+    Rejilla de celdas con las coordenadas de las estaciones.
+
+    Args:
+        puntos: Secuencia de (cod_estacion, tipo, latitud, longitud)
+        tamano_celda: Lado de la celda en grados
+    """
+
+    def __init__(self, puntos: Sequence[Tuple], tamano_celda: float = TAMANO_CELDA):
+        self.tamano_celda = tamano_celda
+        self.puntos = list(puntos)
+        self.celdas: Dict[Tuple[int, int], List[Tuple]] = {}
+        self.total = 0
+        lat_max = 0.0
+
+        for cod_estacion, tipo, lat, lon in self.puntos:
+            celda = self._celda(lat, lon)
+            # Se guardan en radianes y con el coseno ya calculado para que la
+            # distancia haversine de la búsqueda solo necesite dos senos
+            # (y también en grados, para devolverlas sin conversiones)
+            phi = math.radians(lat)
+            self.celdas.setdefault(celda, []).append(
+                (phi, math.radians(lon), math.cos(phi), cod_estacion, tipo, lat, lon)
+            )
+            self.total += 1
+            lat_max = max(lat_max, abs(lat))
+
+        # Extensión de la rejilla ocupada, para no recorrer anillos vacíos
+        filas = [i for i, _ in self.celdas] or [0]
+        columnas = [j for _, j in self.celdas] or [0]
+        self._filas = (min(filas), max(filas))
+        self._columnas = (min(columnas), max(columnas))
+        # cos(latitud máxima) acota por debajo la distancia en longitud (ver _cota_anillo)
+        self._cos_lat_max = math.cos(math.radians(min(lat_max, 89.9)))
+
+    def _celda(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.tamano_celda), math.floor(lon / self.tamano_celda)
+
+    def _cota_anillo(self, r: int, cos_lat: float) -> float:
+        """
+        Distancia mínima (km) desde el punto buscado a cualquier estación
+        situada fuera de los anillos 0..r.
+
+        Esa estación difiere al menos r celdas en latitud o en longitud. Para
+        la longitud se usa hav(d) >= cos(phi1)·cos(phi2)·hav(dlambda), con
+        ambas latitudes acotadas por la mayor del índice y la del punto.
+        """
+        angulo = math.radians(r * self.tamano_celda)
+        por_latitud = RADIO_TIERRA_KM * angulo
+        por_longitud = 2 * RADIO_TIERRA_KM * math.asin(min(1.0, cos_lat * math.sin(min(angulo, math.pi) / 2)))
+        return min(por_latitud, por_longitud)
+
+    def _celdas_anillo(self, fila: int, columna: int, r: int):
+        """
+        Celdas a distancia de Chebyshev exactamente r de (fila, columna),
+        recortadas a la extensión ocupada de la rejilla.
+        """
+        fila_min, fila_max = self._filas
+        columna_min, columna_max = self._columnas
+        if r == 0:
+            yield fila, columna
+            return
+        for i in {fila - r, fila + r}:
+            if fila_min <= i <= fila_max:
+                for j in range(max(columna - r, columna_min), min(columna + r, columna_max) + 1):
+                    yield i, j
+        for j in {columna - r, columna + r}:
+            if columna_min <= j <= columna_max:
+                for i in range(max(fila - r + 1, fila_min), min(fila + r - 1, fila_max) + 1):
+                    yield i, j
+
+    def cercanas(self, lat: float, lon: float, n: int = 10, radio_km: Optional[float] = None,
+                 tipo: Optional[str] = None) -> List[Tuple[float, int]]:
+        """
+        Devuelve las n estaciones más cercanas al punto.
+
+        Args:
+            lat, lon: Punto de búsqueda en grados decimales
+            n: Número máximo de estaciones
+            radio_km: Si se indica, solo estaciones a esa distancia o menos
+            tipo: Si se indica, solo estaciones de ese tipo
+
+        Returns:
+            Lista de (distancia_km, cod_estacion) ordenada por distancia.
+        """
+        if self.total == 0 or n <= 0:
+            return []
+
+        fila, columna = self._celda(lat, lon)
+        cos_lat = min(self._cos_lat_max, math.cos(math.radians(min(abs(lat), 89.9))))
+        # Primer y último anillo que pueden contener celdas con estaciones
+        r_min = max(0, self._filas[0] - fila, fila - self._filas[1],
+                    self._columnas[0] - columna, columna - self._columnas[1])
+        r_max = max(
+            abs(fila - self._filas[0]), abs(fila - self._filas[1]),
+            abs(columna - self._columnas[0]), abs(columna - self._columnas[1]),
+        )
+
+        phi = math.radians(lat)
+        lambda_ = math.radians(lon)
+        cos_phi = math.cos(phi)
+        sin, asin, sqrt = math.sin, math.asin, math.sqrt
+        diametro = 2 * RADIO_TIERRA_KM
+
+        # Montículo de máximos (distancias negadas) con las n mejores
+        mejores = []
+        for r in range(r_min, r_max + 1):
+            for celda in self._celdas_anillo(fila, columna, r):
+                for phi_e, lambda_e, cos_phi_e, cod_estacion, tipo_e, _, _ in self.celdas.get(celda, ()):
+                    if tipo and tipo_e != tipo:
+                        continue
+                    # haversine_km en línea, con los valores precalculados
+                    a = sin((phi_e - phi) / 2) ** 2 + cos_phi * cos_phi_e * sin((lambda_e - lambda_) / 2) ** 2
+                    distancia = diametro * asin(min(1.0, sqrt(a)))
+                    if radio_km is not None and distancia > radio_km:
+                        continue
+                    if len(mejores) < n:
+                        heapq.heappush(mejores, (-distancia, cod_estacion))
+                    elif distancia < -mejores[0][0]:
+                        heapq.heapreplace(mejores, (-distancia, cod_estacion))
+
+            cota = self._cota_anillo(r, cos_lat)
+            if radio_km is not None and cota > radio_km:
+                break
+            if len(mejores) == n and cota >= -mejores[0][0]:
+                break
+
+        return sorted((-d, cod_estacion) for d, cod_estacion in mejores)
+
+    def en_rectangulo(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                      tipo: Optional[str] = None) -> List[int]:
+        """
+        Devuelve los códigos de las estaciones dentro del rectángulo (bordes
+        incluidos), recorriendo solo las celdas que lo cortan.
+
+        El orden es el de las celdas (por filas de sur a norte), así que tomar
+        uno de cada k elementos da una muestra repartida por todo el rectángulo.
+        """
+        return [cod_estacion for cod_estacion, _, _ in
+                self.puntos_en_rectangulo(min_lat, min_lon, max_lat, max_lon, tipo)]
+
+    def puntos_en_rectangulo(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                             tipo: Optional[str] = None) -> List[Tuple[int, float, float]]:
+        """Como `en_rectangulo`, pero devuelve (cod_estacion, latitud, longitud)."""
+        if self.total == 0:
+            return []
+        fila_min, columna_min = self._celda(min_lat, min_lon)
+        fila_max, columna_max = self._celda(max_lat, max_lon)
+        fila_min, fila_max = max(fila_min, self._filas[0]), min(fila_max, self._filas[1])
+        columna_min, columna_max = max(columna_min, self._columnas[0]), min(columna_max, self._columnas[1])
+
+        phi_min, phi_max = math.radians(min_lat), math.radians(max_lat)
+        lambda_min, lambda_max = math.radians(min_lon), math.radians(max_lon)
+        puntos = []
+        for i in range(fila_min, fila_max + 1):
+            for j in range(columna_min, columna_max + 1):
+                for phi, lambda_, _, cod_estacion, tipo_e, lat, lon in self.celdas.get((i, j), ()):
+                    if tipo and tipo_e != tipo:
+                        continue
+                    if phi_min <= phi <= phi_max and lambda_min <= lambda_ <= lambda_max:
+                        puntos.append((cod_estacion, lat, lon))
+        return puntos
+
+
+_lock = threading.Lock()
+_indice = None
+_version_indice = None
+
+def obtener_indice() -> IndiceEspacial:
+    """
+    Devuelve el índice de la versión actual de los datos, construyéndolo si
+    aún no existe o si los datos han cambiado desde la última construcción.
+    """
+    global _indice, _version_indice
+    with _lock:
+        version = version_datos()
+        if _indice is None or _version_indice != version:
+            _indice = IndiceEspacial(consultas.coordenadas_estaciones())
+            _version_indice = version
+        return _indice
+
+def _reconstruir_tras_cambio(version: str):
+    """Suscriptor de cambios: reconstruye el índice en cuanto termina una carga o borrado."""
+    try:
+        obtener_indice()
+    except Exception as e:
+        print(f"Error al reconstruir el índice espacial: {e}")
+
+suscribir_cambios(_reconstruir_tras_cambio)
@@ -0,0 +1,233 @@
+"""
+Instantánea columnar en memoria de las estaciones para /api/buscar.
+
+Modo de servicio opcional (sección [busqueda] de config.ini, `memoria = true`):
+en lugar de resolver cada búsqueda con el JOIN de Estacion, Localidad y
+Provincia en PostgreSQL, el servidor guarda ese JOIN entero en columnas y
+evalúa los filtros como máscaras de NumPy:
+
+- localidad, provincia, código postal y tipo se guardan como categorías: un
+  array de códigos enteros por estación y la lista de valores distintos. Un
+  filtro de texto se evalúa sobre los valores distintos (pocos cientos) y se
+  traslada a las estaciones indexando con los códigos.
+- el nombre normalizado de cada estación se guarda en un array de cadenas y
+  se filtra con `np.char.find` / `np.char.startswith`.
+
+Las filas se guardan ya en el orden de `buscar_estaciones` (provincia,
+localidad, nombre, cod_estacion), calculado por PostgreSQL al cargar la
+instantánea para que coincida con su collation: los índices de una máscara
+salen ya ordenados y la paginación por cursor es un corte por posición. Las
+filas devueltas son idénticas a las de `consultas.buscar_estaciones`.
+
+La instantánea se construye al arrancar y se reconstruye tras cada carga o
+borrado (ver `backend.almacen.version`). La nueva se construye aparte y
+sustituye a la anterior con una sola asignación, así que las búsquedas ven
+la instantánea vieja o la nueva entera. Mientras no hay una instantánea de
+la versión actual las búsquedas van a PostgreSQL.
+"""
+
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from backend.almacen.lectura import consultas
+from backend.almacen.database import opcion_booleana
+from backend.almacen.normalizacion import normalizar_clave
+from backend.almacen.version import suscribir_cambios, version_datos
+
+# Posiciones de la clave de ordenación en las filas de consultas.filas_instantanea()
+CAMPOS_ORDEN = ("provincia", "localidad", "nombre", "cod_estacion")
+
+class InstantaneaEstaciones:
+    """
+    Columnas de todas las estaciones con máscaras vectorizadas para filtrar.
+
+    Args:
+        filas: Filas de `consultas.filas_instantanea()`, ya ordenadas
+    """
+
+    def __init__(self, filas: Sequence[Tuple]):
+        n_campos = len(consultas.CAMPOS_ESTACION)
+        self.total = len(filas)
+
+        # Valores de salida: una lista por campo, con los objetos tal cual
+        # llegan de psycopg2 para que el JSON sea el mismo que por SQL
+        columnas = list(zip(*filas)) if filas else [()] * (n_campos + 3)
+        self._columnas = {campo: list(columnas[i]) for i, campo in enumerate(consultas.CAMPOS_ESTACION)}
+        self._orden = [self._columnas[campo] for campo in CAMPOS_ORDEN]
+
+        normalizados = {
+            "localidad": columnas[n_campos],
+            "provincia": columnas[n_campos + 1],
+        }
+        self._categorias = {}
+        for campo, valores in normalizados.items():
+            originales = self._columnas[campo]
+            claves = [normalizar_clave(o) if v is None else v for v, o in zip(valores, originales)]
+            self._categorias[campo] = self._categorizar(claves)
+        self._categorias["codigo_postal"] = self._categorizar(self._columnas["codigo_postal"])
+        self._categorias["tipo"] = self._categorizar(self._columnas["tipo"])
+
+        nombres = [
+            normalizar_clave(o) if v is None else v
+            for v, o in zip(columnas[n_campos + 2], self._columnas["nombre"])
+        ]
+        self._nombres = np.array(nombres, dtype=str) if nombres else np.array([], dtype="<U1")
+
+        self._posiciones = {cod: i for i, cod in enumerate(self._columnas["cod_estacion"])}
+
+    @staticmethod
+    def _categorizar(valores):
+        """Devuelve (array de valores distintos, array de códigos por estación, valor -> código)."""
+        por_valor = {}
+        codigos = np.fromiter(
+            (por_valor.setdefault(v, len(por_valor)) for v in valores), dtype=np.int32, count=len(valores)
+        )
+        distintos = np.array(list(por_valor), dtype=str) if por_valor else np.array([], dtype="<U1")
+        return distintos, codigos, por_valor
+
+    def _coincide_texto(self, valores, texto: str, prefijo: bool):
+        """Máscara de `valores` (normalizados) que contienen o empiezan por el texto."""
+        termino = normalizar_clave(texto)
+        if prefijo:
+            return np.char.startswith(valores, termino)
+        return np.char.find(valores, termino) >= 0
+
+    def _mascara(self, localidad, codigo_postal, provincia, tipo, nombre, prefijo):
+        """Máscara booleana de las estaciones que cumplen los filtros, o None si no hay filtros."""
+        mascara = None
+
+        def combinar(parcial):
+            nonlocal mascara
+            mascara = parcial if mascara is None else mascara & parcial
+
+        for campo, texto in (("localidad", localidad), ("provincia", provincia)):
+            if texto:
+                distintos, codigos, _ = self._categorias[campo]
+                combinar(self._coincide_texto(distintos, texto, prefijo)[codigos])
+
+        for campo, valor in (("codigo_postal", codigo_postal), ("tipo", tipo)):
+            if valor:
+                _, codigos, por_valor = self._categorias[campo]
+                codigo = por_valor.get(valor)
+                combinar(codigos == codigo if codigo is not None else np.zeros(self.total, dtype=bool))
+
+        if nombre:
+            combinar(self._coincide_texto(self._nombres, nombre, prefijo))
+
+        return mascara
+
+    def buscar(self, localidad=None, codigo_postal=None, provincia=None, tipo=None,
+               limite: Optional[int] = None, despues_de: Optional[Tuple] = None,
+               campos: Sequence[str] = consultas.CAMPOS_ESTACION, nombre=None,
+               prefijo: bool = False) -> Optional[List[Tuple]]:
+        """
+        Igual que `consultas.buscar_estaciones`, con las mismas filas de salida.
+
+        Returns:
+            Las filas, o None si `despues_de` no corresponde a ninguna estación
+            de la instantánea (cursor de otra versión de los datos); en ese
+            caso hay que resolver la búsqueda en PostgreSQL.
+        """
+        mascara = self._mascara(localidad, codigo_postal, provincia, tipo, nombre, prefijo)
+
+        desde = 0
+        if despues_de:
+            posicion = self._posiciones.get(despues_de[-1])
+            if posicion is None or tuple(col[posicion] for col in self._orden) != tuple(despues_de):
+                return None
+            desde = posicion + 1
+
+        if mascara is None:
+            hasta = self.total if limite is None else min(self.total, desde + limite)
+            indices = range(desde, hasta)
+        else:
+            seleccion = np.flatnonzero(mascara)
+            if desde:
+                seleccion = seleccion[np.searchsorted(seleccion, desde):]
+            if limite is not None:
+                seleccion = seleccion[:limite]
+            indices = seleccion.tolist()
+
+        columnas = [self._columnas[campo] for campo in campos] + self._orden
+        return list(zip(*[[columna[i] for i in indices] for columna in columnas]))
+
+    def contar(self, localidad=None, codigo_postal=None, provincia=None, tipo=None,
+               nombre=None, prefijo: bool = False) -> int:
+        """Igual que `consultas.contar_estaciones`."""
+        mascara = self._mascara(localidad, codigo_postal, provincia, tipo, nombre, prefijo)
+        return self.total if mascara is None else int(np.count_nonzero(mascara))
+
+
+_activa = None
+
+def instantanea_activa() -> bool:
+    """
+    Indica si está activado el modo en memoria (`memoria = true` en la
+    sección [busqueda] de config.ini). Sin NumPy el modo se desactiva.
+    """
+    global _activa
+    if _activa is None:
+        _activa = opcion_booleana('busqueda', 'memoria')
+        if _activa and np is None:
+            print("Error: la búsqueda en memoria necesita numpy; se usará PostgreSQL")
+            _activa = False
+    return _activa
+
+_lock = threading.Lock()
+# (versión, instantánea): se sustituye entera con una sola asignación
+_actual: Optional[Tuple[str, InstantaneaEstaciones]] = None
+
+def obtener_instantanea() -> InstantaneaEstaciones:
+    """
+    Devuelve la instantánea de la versión actual de los datos, construyéndola
+    si hace falta. Las construcciones se serializan entre sí pero no bloquean
+    a quien lee con `instantanea_lista`.
+    """
+    global _actual
+    with _lock:
+        version = version_datos()
+        actual = _actual
+        if actual is not None and actual[0] == version:
+            return actual[1]
+        instantanea = InstantaneaEstaciones(consultas.filas_instantanea())
+        _actual = (version, instantanea)
+        return instantanea
+
+def instantanea_lista() -> Optional[InstantaneaEstaciones]:
+    """
+    Devuelve la instantánea si el modo en memoria está activo y ya está
+    construida para la versión actual, o None.
+    """
+    if not instantanea_activa():
+        return None
+    actual = _actual
+    if actual is not None and actual[0] == version_datos():
+        return actual[1]
+    return None
+
+def estadisticas_instantanea():
+    """Estado de la instantánea, o None si el modo en memoria no está activo."""
+    if not instantanea_activa():
+        return None
+    actual = _actual
+    return {
+        'estaciones': actual[1].total if actual else 0,
+        'version': actual[0] if actual else None,
+        'al_dia': actual is not None and actual[0] == version_datos(),
+    }
+
+def _reconstruir_tras_cambio(version: str):
+    """Suscriptor de cambios: reconstruye la instantánea en cuanto termina una carga o borrado."""
+    if not instantanea_activa():
+        return
+    try:
+        obtener_instantanea()
+    except Exception as e:
+        print(f"Error al reconstruir la instantánea de estaciones: {e}")
+
+suscribir_cambios(_reconstruir_tras_cambio)
@@ -0,0 +1,380 @@
+"""
+Instantánea de solo lectura del almacén en un fichero SQLite.
+
+Permite nodos que solo sirven búsquedas sin conexiones a PostgreSQL:
+
+- El nodo principal (`exportar = true`) vuelca el almacén a un fichero SQLite
+  tras cada carga o borrado. El fichero se escribe aparte y sustituye al
+  anterior con `os.replace`, así que quien lo lee ve el viejo o el nuevo
+  entero.
+- Los nodos de búsqueda (`servir = true`) leen ese fichero en lugar de
+  PostgreSQL (ver `backend.almacen.consultas_sqlite` y
+  `backend.almacen.lectura`). Cada `intervalo` segundos comprueban si el
+  fichero ha cambiado; si es así reabren las conexiones y notifican un cambio
+  de datos, lo que invalida cachés y ETags y reconstruye los índices en
+  memoria igual que una carga.
+
+El fichero guarda las tres tablas con sus nombres normalizados, una columna
+`orden` con el orden de PostgreSQL (calculado con su collation al exportar,
+para que las búsquedas devuelvan las filas en el mismo orden) y una tabla
+FTS5 para /api/buscar/texto. Las conexiones se abren en modo solo lectura y
+con mmap, de modo que las páginas se comparten con la caché del sistema.
+
+`escribir_instantanea` no necesita PostgreSQL: sirve también para crear
+instantáneas de prueba a partir de filas sintéticas.
+
+Parámetros en la sección opcional [sqlite] de config.ini: ruta (relativa a
+la raíz del proyecto), exportar, servir e intervalo.
+
+Uso manual:
+    python -m backend.almacen.instantanea_sqlite [ruta]
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Optional, Sequence, Tuple
+
+from backend.almacen.database import cargar_seccion, ejecutar_bd, obtener_conexion, opcion_booleana
+from backend.almacen.version import notificar_cambio_datos, suscribir_cambios, version_datos
+
+RAIZ_PROYECTO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+RUTA_POR_DEFECTO = "instantanea.sqlite"
+
+# Bytes del fichero que SQLite lee mediante mmap
+MMAP_BYTES = 256 * 1024 * 1024
+
+ESQUEMA_SQLITE = """
+CREATE TABLE Provincia (
+    codigo INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    nombre_normalizado TEXT,
+    orden INTEGER NOT NULL
+);
+CREATE TABLE Localidad (
+    codigo INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    nombre_normalizado TEXT,
+    codigo_provincia INTEGER NOT NULL,
+    orden INTEGER NOT NULL
+);
+CREATE TABLE Estacion (
+    cod_estacion INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    nombre_normalizado TEXT,
+    tipo TEXT,
+    direccion TEXT,
+    codigo_postal TEXT,
+    longitud REAL,
+    latitud REAL,
+    descripcion TEXT,
+    horario TEXT,
+    contacto TEXT,
+    url TEXT,
+    codigo_localidad INTEGER NOT NULL,
+    orden INTEGER NOT NULL
+);
+CREATE TABLE Metadatos (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+-- rowid = cod_estacion
+CREATE VIRTUAL TABLE Estacion_texto USING fts5(
+    nombre, localidad, provincia, direccion, descripcion, horario,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# Se crean después de insertar, que es más rápido que mantenerlos fila a fila
+INDICES_SQLITE = """
+CREATE INDEX idx_provincia_normalizado ON Provincia(nombre_normalizado);
+CREATE INDEX idx_localidad_normalizado ON Localidad(nombre_normalizado);
+CREATE INDEX idx_localidad_provincia ON Localidad(codigo_provincia);
+CREATE UNIQUE INDEX idx_estacion_orden ON Estacion(orden);
+CREATE INDEX idx_estacion_localidad ON Estacion(codigo_localidad, orden);
+CREATE INDEX idx_estacion_codigo_postal ON Estacion(codigo_postal);
+CREATE INDEX idx_estacion_tipo ON Estacion(tipo, orden);
+CREATE INDEX idx_estacion_normalizado ON Estacion(nombre_normalizado);
+"""
+
+# Ruta fijada con usar_instantanea, que tiene prioridad sobre config.ini
+_ruta_fijada: Optional[str] = None
+
+def opciones_sqlite() -> dict:
+    """Sección [sqlite] de config.ini con sus valores por defecto y la ruta absoluta."""
+    opciones = cargar_seccion('sqlite')
+    return {
+        'ruta': _ruta_fijada or os.path.join(RAIZ_PROYECTO, opciones.get('ruta', RUTA_POR_DEFECTO)),
+        'exportar': opcion_booleana('sqlite', 'exportar'),
+        'servir': opcion_booleana('sqlite', 'servir'),
+        'intervalo': float(opciones.get('intervalo', 2.0)),
+    }
+
+def escribir_instantanea(ruta: str, provincias: Sequence[Tuple], localidades: Sequence[Tuple],
+                         estaciones: Sequence[Tuple], version: Optional[str] = None):
+    """
+    Escribe una instantánea SQLite y la coloca en `ruta` de forma atómica.
+
+    Args:
+        provincias: Filas (codigo, nombre, nombre_normalizado), ordenadas por nombre
+        localidades: Filas (codigo, nombre, nombre_normalizado, codigo_provincia),
+            ordenadas por nombre
+        estaciones: Filas (cod_estacion, nombre, nombre_normalizado, tipo,
+            direccion, codigo_postal, longitud, latitud, descripcion, horario,
+            contacto, url, codigo_localidad) en el orden de
+            `consultas.buscar_estaciones`
+        version: Versión de los datos de origen, que se guarda en Metadatos
+
+    La posición de cada fila en su lista se guarda como su `orden`.
+    """
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(directorio, exist_ok=True)
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    if os.path.exists(temporal):
+        os.remove(temporal)
+
+    nombres_provincia = {codigo: nombre for codigo, nombre, _ in provincias}
+    localidad_de = {codigo: (nombre, nombres_provincia.get(codigo_provincia))
+                    for codigo, nombre, _, codigo_provincia in localidades}
+
+    conn = sqlite3.connect(temporal)
+    try:
+        conn.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;")
+        conn.executescript(ESQUEMA_SQLITE)
+        conn.executemany(
+            "INSERT INTO Provincia VALUES (?, ?, ?, ?)",
+            ((*fila, orden) for orden, fila in enumerate(provincias))
+        )
+        conn.executemany(
+            "INSERT INTO Localidad VALUES (?, ?, ?, ?, ?)",
+            ((*fila, orden) for orden, fila in enumerate(localidades))
+        )
+        conn.executemany(
+            "INSERT INTO Estacion VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((*fila, orden) for orden, fila in enumerate(estaciones))
+        )
+        conn.executemany(
+            "INSERT INTO Estacion_texto (rowid, nombre, localidad, provincia, direccion, descripcion, horario)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((fila[0], fila[1], *localidad_de.get(fila[12], (None, None)), fila[4], fila[8], fila[9])
+             for fila in estaciones)
+        )
+        conn.executescript(INDICES_SQLITE)
+        conn.executemany("INSERT INTO Metadatos VALUES (?, ?)", [
+            ("version", version),
+            ("creada", time.strftime("%Y-%m-%dT%H:%M:%S")),
+            ("estaciones", str(len(estaciones))),
+        ])
+        conn.commit()
+        conn.execute("ANALYZE")
+        conn.execute("INSERT INTO Estacion_texto(Estacion_texto) VALUES ('optimize')")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(temporal, ruta)
+
+def exportar_instantanea(ruta: Optional[str] = None) -> int:
+    """
+    Vuelca el almacén de PostgreSQL a una instantánea SQLite.
+
+    El orden de las filas lo calcula PostgreSQL, con su collation, para que
+    las búsquedas sobre la instantánea devuelvan el mismo orden.
+
+    Returns:
+        int: Número de estaciones exportadas
+    """
+    from backend.almacen.consultas import COLUMNAS_ORDEN
+
+    ruta = ruta or opciones_sqlite()['ruta']
+    version = version_datos()
+    inicio = time.perf_counter()
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            # Una sola transacción REPEATABLE READ: las tres tablas de la misma foto
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            cur.execute("SELECT codigo, nombre, nombre_normalizado FROM Provincia ORDER BY nombre")
+            provincias = cur.fetchall()
+            cur.execute("SELECT codigo, nombre, nombre_normalizado, codigo_provincia FROM Localidad ORDER BY nombre")
+            localidades = cur.fetchall()
+            cur.execute(f"""
+                SELECT e.cod_estacion, e.nombre, e.nombre_normalizado, e.tipo::text, e.direccion,
+                       e.codigo_postal, e.longitud::float8, e.latitud::float8, e.descripcion,
+                       e.horario, e.contacto, e.url, e.codigo_localidad
+                FROM Estacion e
+                JOIN Localidad l ON e.codigo_localidad = l.codigo
+                JOIN Provincia p ON l.codigo_provincia = p.codigo
+                ORDER BY {COLUMNAS_ORDEN}
+            """)
+            estaciones = cur.fetchall()
+
+    escribir_instantanea(ruta, provincias, localidades, estaciones, version)
+    _marcar_fichero_actual(ruta)
+    _stats['exportaciones'] += 1
+    _stats['ultima_exportacion_s'] = round(time.perf_counter() - inicio, 3)
+    return len(estaciones)
+
+
+# Estado del fichero servido: firma (inodo, mtime, tamaño) y generación de
+# las conexiones, que se incrementa cada vez que el fichero cambia
+_lock = threading.Lock()
+_firma = None
+_generacion = 0
+_local = threading.local()
+_stats = {
+    'exportaciones': 0,
+    'ultima_exportacion_s': None,
+    'recargas': 0,
+}
+
+def _firma_fichero(ruta: str):
+    try:
+        info = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    return (info.st_ino, info.st_mtime_ns, info.st_size)
+
+def _marcar_fichero_actual(ruta: str) -> bool:
+    """
+    Toma el fichero actual como el servido. Las conexiones de cada hilo se
+    reabrirán en su siguiente uso.
+
+    Returns:
+        bool: True si el fichero ha cambiado desde la última vez
+    """
+    global _firma, _generacion
+    firma = _firma_fichero(ruta)
+    with _lock:
+        if firma == _firma:
+            return False
+        _firma = firma
+        _generacion += 1
+        return True
+
+def usar_instantanea(ruta: Optional[str]):
+    """
+    Lee la instantánea de `ruta` en lugar de la de config.ini (None vuelve a
+    config.ini). Pensado para benchmarks y pruebas con ficheros generados con
+    `escribir_instantanea`.
+    """
+    global _ruta_fijada, _firma, _generacion
+    with _lock:
+        _ruta_fijada = os.path.abspath(ruta) if ruta else None
+        _firma = None
+        _generacion += 1
+
+def conexion_sqlite() -> sqlite3.Connection:
+    """
+    Conexión de solo lectura a la instantánea para el hilo actual.
+
+    Cada hilo del executor tiene la suya (sqlite3 no comparte conexiones
+    entre hilos) y la reabre cuando el fichero ha cambiado.
+
+    Raises:
+        FileNotFoundError: Si todavía no existe la instantánea
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.generacion == _generacion:
+        return conn
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+    ruta = _ruta_servida()
+    generacion = _generacion
+    conn = _abrir(ruta)
+    _local.conn, _local.generacion = conn, generacion
+    return conn
+
+def abrir_conexion_sqlite(entre_hilos: bool = False) -> sqlite3.Connection:
+    """
+    Abre una conexión nueva de solo lectura a la instantánea; quien la abre
+    la cierra.
+
+    Args:
+        entre_hilos: Permite usarla desde varios hilos, uno cada vez (p. ej.
+            un generador que avanza en distintos hilos del executor)
+
+    Raises:
+        FileNotFoundError: Si todavía no existe la instantánea
+    """
+    return _abrir(_ruta_servida(), entre_hilos)
+
+def _ruta_servida() -> str:
+    ruta = opciones_sqlite()['ruta']
+    if not os.path.exists(ruta):
+        raise FileNotFoundError(f"No existe la instantánea SQLite: {ruta}")
+    if _firma is None:
+        _marcar_fichero_actual(ruta)
+    return ruta
+
+def _abrir(ruta: str, entre_hilos: bool = False) -> sqlite3.Connection:
+    conn = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True, check_same_thread=not entre_hilos)
+    conn.execute(f"PRAGMA mmap_size = {MMAP_BYTES}")
+    return conn
+
+def comprobar_cambios() -> bool:
+    """
+    Comprueba si el fichero servido ha cambiado y, si es así, notifica un
+    cambio de datos (nueva versión, cachés vacías, índices reconstruidos).
+
+    Returns:
+        bool: True si había una instantánea nueva
+    """
+    ruta = opciones_sqlite()['ruta']
+    if _firma_fichero(ruta) is None or not _marcar_fichero_actual(ruta):
+        return False
+    _stats['recargas'] += 1
+    notificar_cambio_datos()
+    return True
+
+async def vigilar_instantanea():
+    """
+    Tarea de fondo de los nodos que sirven la instantánea: cada `intervalo`
+    segundos comprueba si el fichero ha cambiado.
+    """
+    intervalo = opciones_sqlite()['intervalo']
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            await ejecutar_bd(comprobar_cambios)
+        except Exception as e:
+            print(f"Error al comprobar la instantánea SQLite: {e}")
+
+def estadisticas_sqlite():
+    """Estado de la instantánea SQLite, o None si no se exporta ni se sirve."""
+    opciones = opciones_sqlite()
+    if not opciones['exportar'] and not opciones['servir']:
+        return None
+    firma = _firma_fichero(opciones['ruta'])
+    return {
+        'ruta': opciones['ruta'],
+        'exportar': opciones['exportar'],
+        'servir': opciones['servir'],
+        'bytes': firma[2] if firma else None,
+        'generacion': _generacion,
+        **_stats,
+    }
+
+def _exportar_tras_cambio(version: str):
+    """Suscriptor de cambios del nodo principal: exporta la instantánea tras cada carga o borrado."""
+    if not opciones_sqlite()['exportar']:
+        return
+    try:
+        exportar_instantanea()
+    except Exception as e:
+        print(f"Error al exportar la instantánea SQLite: {e}")
+
+# Primero: si este nodo también sirve la instantánea, los índices en memoria
+# que se reconstruyen después ya leen el fichero nuevo
+suscribir_cambios(_exportar_tras_cambio, primero=True)
+
+if __name__ == "__main__":
+    destino = sys.argv[1] if len(sys.argv) > 1 else None
+    inicio = time.perf_counter()
+    total = exportar_instantanea(destino)
+    print(f"{total} estaciones exportadas a {destino or opciones_sqlite()['ruta']} "
+          f"en {time.perf_counter() - inicio:.2f} s")
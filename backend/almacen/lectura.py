@@ -0,0 +1,41 @@
+"""
+Origen de las consultas de lectura: PostgreSQL o la instantánea SQLite.
+
+Los módulos que sirven búsquedas importan `consultas` desde aquí en lugar de
+`backend.almacen.consultas`:
+
+    from backend.almacen.lectura import consultas
+
+Con `servir = true` en la sección [sqlite] de config.ini las llamadas van a
+`backend.almacen.consultas_sqlite`, que lee el fichero exportado por el nodo
+principal; si no, a `backend.almacen.consultas` como hasta ahora. Los dos
+módulos tienen las mismas funciones y devuelven las mismas filas, así que
+los endpoints no distinguen el origen.
+"""
+
+from backend.almacen import consultas as consultas_postgres
+from backend.almacen.database import opcion_booleana
+
+_sqlite = None
+
+def sirve_sqlite() -> bool:
+    """Indica si las lecturas se sirven desde la instantánea SQLite."""
+    global _sqlite
+    if _sqlite is None:
+        _sqlite = opcion_booleana('sqlite', 'servir')
+    return _sqlite
+
+def modulo_consultas():
+    """Módulo de consultas de lectura que corresponde a la configuración."""
+    if sirve_sqlite():
+        from backend.almacen import consultas_sqlite
+        return consultas_sqlite
+    return consultas_postgres
+
+class _Consultas:
+    """Reenvía cada atributo al módulo de `modulo_consultas()` en el momento de usarlo."""
+
+    def __getattr__(self, nombre):
+        return getattr(modulo_consultas(), nombre)
+
+consultas = _Consultas()
@@ -0,0 +1,36 @@
+"""
+Normalización de textos para búsquedas y comparaciones.
+
+Las columnas `nombre_normalizado` de Provincia, Localidad y Estacion guardan
+el nombre pasado por `normalizar_clave`, calculado una sola vez al insertar.
+La búsqueda normaliza igual el término del usuario en Python y lo compara con
+esas columnas indexadas, así que "Castellon", "CASTELLÓN" y "castellón"
+encuentran lo mismo sin normalizar nada en SQL.
+"""
+
+import unicodedata
+from typing import Optional
+
+def normalizar_clave(texto: Optional[str]) -> str:
+    """
+    Normaliza texto para usar como clave en comparaciones.
+    
+    Convierte a minúsculas, elimina acentos y caracteres diacríticos.
+    
+    Args:
+        texto: Texto a normalizar
+    
+    Returns:
+        Texto normalizado (minúsculas, sin acentos)
+    
+    Example:
+        >>> normalizar_clave("València")
+        'valencia'
+        >>> normalizar_clave("A Coruña")
+        'a coruna'
+    """
+    if not texto:
+        return ""
+    texto = str(texto).lower().strip()
+    texto_norm = unicodedata.normalize('NFD', texto)
+    return ''.join(c for c in texto_norm if unicodedata.category(c) != 'Mn')
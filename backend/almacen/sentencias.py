@@ -0,0 +1,168 @@
+"""
+Sentencias preparadas para las consultas de forma variable.
+
+`buscar_estaciones` y `contar_estaciones` montan su SQL según los filtros
+usados, el cursor, el límite y la proyección, pero hay pocas formas distintas
+(una por combinación) y cada una se repite miles de veces. Enviadas como texto,
+PostgreSQL analiza y planifica la consulta en cada llamada.
+
+`ejecutar_preparada` asigna a cada texto de consulta distinto un nombre de
+sentencia y la prepara (`PREPARE`) la primera vez que se usa en cada conexión
+del pool; a partir de ahí solo envía `EXECUTE nombre (parámetros)`. Las
+conexiones que han preparado cada sentencia se recuerdan con referencias
+débiles, así que una conexión reciclada o descartada por el pool
+simplemente vuelve a prepararla. Una sentencia preparada sobrevive a los
+rollback, de modo que el pool puede deshacer transacciones sin perderlas.
+
+Tras cinco ejecuciones PostgreSQL puede pasar a un plan genérico, que no
+depende de los parámetros. Es bueno para las igualdades (código postal,
+tipo), pero con LIKE el mejor plan depende del patrón ('%ab%' frente a
+'valencia%'), así que las sentencias con LIKE se ejecutan con
+`plan_cache_mode = force_custom_plan`: se siguen planificando con sus
+parámetros y solo se ahorra el análisis del texto.
+
+Cada sentencia acumula sus ejecuciones y su tiempo medio, que
+`GET /metricas` muestra en `sentencias`. Hay un máximo de sentencias
+distintas (MAX_SENTENCIAS); pasado ese número las consultas nuevas se
+envían como texto. Se desactiva con `preparadas = false` en la sección
+[busqueda] de config.ini.
+"""
+
+import threading
+import time
+import weakref
+from typing import List, Optional, Sequence, Tuple
+
+from backend.almacen.database import opcion_booleana
+
+# Formas de consulta distintas que se preparan como máximo
+MAX_SENTENCIAS = 512
+
+class SentenciaPreparada:
+    """
+    Una forma de consulta con su nombre de sentencia y sus estadísticas.
+
+    Args:
+        nombre: Nombre de la sentencia en PostgreSQL (único en el proceso)
+        etiqueta: Descripción legible para las métricas
+        query: SQL con marcadores %s de psycopg2
+    """
+
+    def __init__(self, nombre: str, etiqueta: str, query: str):
+        self.nombre = nombre
+        self.etiqueta = etiqueta
+        self.parametros = query.count("%s")
+        # PREPARE usa $1, $2... en lugar de %s
+        partes = query.split("%s")
+        self.sql_prepare = partes[0] + "".join(f"${i}{parte}" for i, parte in enumerate(partes[1:], start=1))
+        self.sql_execute = f"EXECUTE {nombre}" + (f" ({', '.join(['%s'] * self.parametros)})" if self.parametros else "")
+        # Con LIKE el plan depende mucho del patrón: se planifica en cada
+        # ejecución. SET LOCAL dura hasta el rollback con que el pool cierra
+        # la transacción y viaja en el mismo envío que el EXECUTE.
+        self.plan_especifico = " LIKE " in query
+        if self.plan_especifico:
+            self.sql_execute = "SET LOCAL plan_cache_mode = force_custom_plan; " + self.sql_execute
+        self._conexiones = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._stats = {
+            'preparaciones': 0,
+            'ejecuciones': 0,
+            'tiempo_total': 0.0,
+        }
+
+    def ejecutar(self, cur, params: Sequence) -> List[Tuple]:
+        """Ejecuta la sentencia con el cursor, preparándola antes si su conexión aún no la tiene."""
+        conn = cur.connection
+        # Cada conexión la usa un solo hilo a la vez: nadie más puede
+        # prepararla entre la comprobación y el PREPARE
+        with self._lock:
+            preparada = conn in self._conexiones
+        if not preparada:
+            cur.execute(f"PREPARE {self.nombre} AS {self.sql_prepare}")
+            with self._lock:
+                self._conexiones.add(conn)
+                self._stats['preparaciones'] += 1
+
+        inicio = time.perf_counter()
+        cur.execute(self.sql_execute, params)
+        filas = cur.fetchall()
+        duracion = time.perf_counter() - inicio
+        with self._lock:
+            self._stats['ejecuciones'] += 1
+            self._stats['tiempo_total'] += duracion
+        return filas
+
+    def estadisticas(self):
+        """Devuelve las ejecuciones, preparaciones y el tiempo medio de la sentencia."""
+        with self._lock:
+            ejecuciones = self._stats['ejecuciones']
+            return {
+                'sentencia': self.etiqueta,
+                'ejecuciones': ejecuciones,
+                'preparaciones': self._stats['preparaciones'],
+                'conexiones': len(self._conexiones),
+                'tiempo_medio_ms': round(self._stats['tiempo_total'] * 1000 / ejecuciones, 3) if ejecuciones else 0.0,
+                'tiempo_total_ms': round(self._stats['tiempo_total'] * 1000, 3),
+            }
+
+
+_lock = threading.Lock()
+# Texto de la consulta -> sentencia
+_sentencias = {}
+_activas = None
+
+def sentencias_activas() -> bool:
+    """Indica si se usan sentencias preparadas (`preparadas`, activado por defecto)."""
+    global _activas
+    if _activas is None:
+        _activas = opcion_booleana('busqueda', 'preparadas', defecto=True)
+    return _activas
+
+def obtener_sentencia(etiqueta: str, query: str) -> Optional[SentenciaPreparada]:
+    """
+    Devuelve la sentencia de un texto de consulta, creándola si es nuevo.
+
+    Returns:
+        La sentencia, o None si las sentencias preparadas están desactivadas
+        o ya hay MAX_SENTENCIAS formas distintas
+    """
+    if not sentencias_activas():
+        return None
+    sentencia = _sentencias.get(query)
+    if sentencia is None:
+        with _lock:
+            sentencia = _sentencias.get(query)
+            if sentencia is None:
+                if len(_sentencias) >= MAX_SENTENCIAS:
+                    return None
+                sentencia = SentenciaPreparada(f"itv_s{len(_sentencias) + 1}", etiqueta, query)
+                _sentencias[query] = sentencia
+    return sentencia
+
+def ejecutar_preparada(cur, etiqueta: str, query: str, params: Sequence) -> List[Tuple]:
+    """
+    Ejecuta `query` con `params` como sentencia preparada y devuelve sus filas.
+
+    Args:
+        cur: Cursor de una conexión del pool
+        etiqueta: Descripción de la forma de consulta para las métricas
+        query: SQL con marcadores %s, como para `cur.execute`
+
+    Example:
+        >>> with obtener_conexion() as conn:
+        ...     with conn.cursor() as cur:
+        ...         filas = ejecutar_preparada(cur, "provincias", "SELECT nombre FROM Provincia WHERE codigo = %s", (1,))
+    """
+    sentencia = obtener_sentencia(etiqueta, query)
+    if sentencia is None:
+        cur.execute(query, params)
+        return cur.fetchall()
+    return sentencia.ejecutar(cur, params)
+
+def estadisticas_sentencias():
+    """Estadísticas de cada sentencia, de más a menos tiempo total, o None si están desactivadas."""
+    if not sentencias_activas():
+        return None
+    with _lock:
+        sentencias = list(_sentencias.values())
+    return sorted((s.estadisticas() for s in sentencias), key=lambda s: -s['tiempo_total_ms'])
@@ -0,0 +1,183 @@
+"""
+Índice de trigramas en memoria para la búsqueda tolerante a erratas.
+
+La similitud es la de pg_trgm: cada palabra del nombre normalizado se rellena
+con dos espacios delante y uno detrás, se parte en trigramas y la similitud
+entre dos textos es |comunes| / |unión| de sus conjuntos de trigramas
+("orense" y "ourense" dan 0,5). Como en word_similarity de pg_trgm, también
+se acepta un nombre largo que contiene casi todos los trigramas del texto
+buscado ("santyago" y "Santiago de Compostela"). pg_trgm es opcional en el
+esquema, así que el
+índice se mantiene en Python: un índice invertido trigrama -> posiciones, de
+modo que una búsqueda solo recorre las entradas que comparten algún trigrama
+con el texto buscado.
+
+Para las provincias se indexan también las variantes de
+`Validate.MAPA_PROVINCIAS` ("lerida", "gerona"...), que apuntan a la
+provincia canónica.
+
+Los índices se construyen al arrancar el servidor y se reconstruyen tras
+cada carga o borrado (ver `backend.almacen.version`).
+"""
+
+import heapq
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, List, Sequence, Set, Tuple
+
+from backend.almacen.lectura import consultas
+from backend.almacen.normalizacion import normalizar_clave
+from backend.almacen.version import suscribir_cambios, version_datos
+from backend.extractores.filtros import Validate
+
+# Campos de /api/buscar que admiten búsqueda aproximada
+CAMPOS_SIMILITUD = ("localidad", "provincia", "nombre")
+
+# Similitud mínima para considerar un candidato (la de pg_trgm por defecto)
+UMBRAL_SIMILITUD = 0.3
+
+# Fracción mínima de los trigramas buscados presentes en el nombre
+# (pg_trgm.word_similarity_threshold por defecto)
+UMBRAL_PALABRA = 0.6
+
+# Candidatos por campo que se cruzan con las estaciones en modo fuzzy
+MAX_CANDIDATOS = 50
+
+_PALABRA = re.compile(r"[^\W_]+")
+
+def trigramas(clave: str) -> Set[str]:
+    """Trigramas de un texto ya normalizado, con el relleno de pg_trgm."""
+    resultado = set()
+    for palabra in _PALABRA.findall(clave):
+        palabra = f"  {palabra} "
+        for i in range(len(palabra) - 2):
+            resultado.add(palabra[i:i + 3])
+    return resultado
+
+class IndiceTrigramas:
+    """
+    Índice invertido de trigramas sobre nombres normalizados.
+
+    Args:
+        filas: Secuencia de (codigo, nombre, nombre_normalizado). Si
+            nombre_normalizado es None se calcula a partir del nombre. Un
+            mismo código puede aparecer varias veces (variantes de un nombre).
+    """
+
+    def __init__(self, filas: Sequence[Tuple]):
+        self.codigos = array('q')
+        self.nombres: List[str] = []
+        self.tamanos = array('H')
+        posiciones: Dict[str, List[int]] = {}
+
+        for codigo, nombre, normalizado in filas:
+            clave = normalizar_clave(nombre) if normalizado is None else normalizado
+            conjunto = trigramas(clave)
+            if not conjunto:
+                continue
+            posicion = len(self.nombres)
+            self.codigos.append(codigo)
+            self.nombres.append(nombre)
+            self.tamanos.append(min(len(conjunto), 0xFFFF))
+            for trigrama in conjunto:
+                posiciones.setdefault(trigrama, []).append(posicion)
+
+        # array('I') ocupa 4 bytes por posición frente a los ~36 de una lista de int
+        self._posiciones = {trigrama: array('I', lista) for trigrama, lista in posiciones.items()}
+
+    def similares(self, texto: str, n: int = MAX_CANDIDATOS,
+                  umbral: float = UMBRAL_SIMILITUD) -> List[Tuple[int, str, float]]:
+        """
+        Devuelve hasta n entradas con similitud >= umbral o que contienen al
+        menos UMBRAL_PALABRA de los trigramas buscados, de más a menos
+        parecidas. La similitud devuelta es la mayor de las dos medidas; a
+        igualdad va antes el nombre más parecido en conjunto. Si un código
+        aparece con varios nombres se queda el mejor.
+
+        Returns:
+            Lista de (codigo, nombre, similitud)
+        """
+        buscados = trigramas(normalizar_clave(texto))
+        if not buscados or n <= 0:
+            return []
+
+        comunes = Counter()
+        for trigrama in buscados:
+            comunes.update(self._posiciones.get(trigrama, ()))
+
+        mejores: Dict[int, Tuple[float, float, str]] = {}
+        total = len(buscados)
+        for posicion, compartidos in comunes.items():
+            similitud = compartidos / (total + self.tamanos[posicion] - compartidos)
+            palabra = compartidos / total
+            if similitud < umbral and palabra < UMBRAL_PALABRA:
+                continue
+            candidato = (max(similitud, palabra if palabra >= UMBRAL_PALABRA else 0.0), similitud)
+            codigo = self.codigos[posicion]
+            if codigo not in mejores or candidato > mejores[codigo][:2]:
+                mejores[codigo] = (*candidato, self.nombres[posicion])
+
+        elegidos = heapq.nsmallest(
+            n, mejores.items(), key=lambda item: (-item[1][0], -item[1][1], item[1][2])
+        )
+        return [(codigo, nombre, puntuacion) for codigo, (puntuacion, _, nombre) in elegidos]
+
+
+def _filas_indice(campo: str) -> List[Tuple]:
+    """Filas del índice de `campo`; las provincias incluyen sus variantes conocidas."""
+    filas = consultas.nombres_para_similitud(campo)
+    if campo == "provincia":
+        por_nombre = {normalizar_clave(nombre): (codigo, nombre) for codigo, nombre, _ in filas}
+        for variante, canonica in Validate.MAPA_PROVINCIAS.items():
+            provincia = por_nombre.get(normalizar_clave(canonica))
+            if provincia is not None:
+                filas.append((*provincia, normalizar_clave(variante)))
+    return filas
+
+
+_lock = threading.Lock()
+_indices: Dict[str, IndiceTrigramas] = {}
+_version_indices = None
+
+def obtener_indice_similitud(campo: str) -> IndiceTrigramas:
+    """
+    Devuelve el índice de trigramas de `campo` ('localidad', 'provincia' o
+    'nombre') para la versión actual de los datos, construyéndolo si hace falta.
+    """
+    global _version_indices
+    with _lock:
+        version = version_datos()
+        if _version_indices != version:
+            _indices.clear()
+            _version_indices = version
+        if campo not in _indices:
+            _indices[campo] = IndiceTrigramas(_filas_indice(campo))
+        return _indices[campo]
+
+def candidatos_similares(textos: Dict[str, str], n: int = MAX_CANDIDATOS,
+                         umbral: float = UMBRAL_SIMILITUD) -> Dict[str, List[Tuple[int, str, float]]]:
+    """
+    Candidatos de cada campo de texto de una búsqueda.
+
+    Args:
+        textos: Campo de CAMPOS_SIMILITUD -> texto escrito por el usuario
+
+    Returns:
+        Campo -> lista de (codigo, nombre, similitud), como `IndiceTrigramas.similares`
+    """
+    return {
+        campo: obtener_indice_similitud(campo).similares(texto, n, umbral)
+        for campo, texto in textos.items()
+    }
+
+def _reconstruir_tras_cambio(version: str):
+    """Suscriptor de cambios: reconstruye los índices en cuanto termina una carga o borrado."""
+    try:
+        for campo in CAMPOS_SIMILITUD:
+            obtener_indice_similitud(campo)
+    except Exception as e:
+        print(f"Error al reconstruir el índice de similitud: {e}")
+
+suscribir_cambios(_reconstruir_tras_cambio)
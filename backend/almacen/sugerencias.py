@@ -0,0 +1,121 @@
+"""
+Índice en memoria de prefijos para autocompletar localidades y provincias.
+
+Los nombres normalizados (`normalizar_clave`) se guardan ordenados en una
+lista; las entradas que empiezan por un prefijo forman un tramo contiguo que
+se localiza con dos búsquedas binarias. Dentro del tramo se eligen las de
+más estaciones. Para los prefijos de una o dos letras, cuyo tramo puede
+abarcar buena parte del índice, el ranking se precalcula al construirlo.
+
+El índice se construye al arrancar el servidor y se reconstruye tras cada
+carga o borrado (ver `backend.almacen.version`).
+"""
+
+import heapq
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from backend.almacen.lectura import consultas
+from backend.almacen.normalizacion import normalizar_clave
+from backend.almacen.version import suscribir_cambios, version_datos
+
+CAMPOS_SUGERENCIAS = ("localidad", "provincia")
+
+# Máximo de sugerencias por petición
+MAX_SUGERENCIAS = 50
+
+# Prefijos de hasta esta longitud tienen el ranking precalculado
+LONGITUD_PRECALCULADA = 2
+
+class IndicePrefijos:
+    """
+    Lista ordenada de nombres normalizados para búsquedas por prefijo.
+
+    Args:
+        filas: Secuencia de (nombre, nombre_normalizado, provincia, estaciones).
+            Si nombre_normalizado es None se calcula a partir del nombre.
+    """
+
+    def __init__(self, filas: Sequence[Tuple]):
+        self.entradas = sorted(
+            (normalizar_clave(nombre) if normalizado is None else normalizado, nombre, provincia, estaciones)
+            for nombre, normalizado, provincia, estaciones in filas
+        )
+        self.claves = [clave for clave, _, _, _ in self.entradas]
+
+        cortos: Dict[str, List[int]] = {}
+        for posicion, clave in enumerate(self.claves):
+            for longitud in range(1, min(len(clave), LONGITUD_PRECALCULADA) + 1):
+                cortos.setdefault(clave[:longitud], []).append(posicion)
+        self._cortos = {
+            prefijo: heapq.nsmallest(MAX_SUGERENCIAS, posiciones, key=self._orden)
+            for prefijo, posiciones in cortos.items()
+        }
+
+    def _orden(self, posicion: int):
+        """Más estaciones primero; a igualdad, orden alfabético."""
+        clave, nombre, _, estaciones = self.entradas[posicion]
+        return -estaciones, clave, nombre
+
+    def sugerir(self, prefijo: str, n: int = 10) -> List[Tuple[str, Optional[str], int]]:
+        """
+        Devuelve hasta n entradas cuyo nombre empieza por `prefijo` (sin
+        distinguir mayúsculas ni acentos), ordenadas por número de estaciones.
+
+        Returns:
+            Lista de (nombre, provincia, estaciones)
+        """
+        clave = normalizar_clave(prefijo)
+        if not clave or n <= 0:
+            return []
+
+        if len(clave) <= LONGITUD_PRECALCULADA:
+            posiciones = self._cortos.get(clave, [])[:n]
+        else:
+            # "\uffff" es mayor que cualquier carácter de un nombre: marca el final del tramo
+            inicio = bisect_left(self.claves, clave)
+            fin = bisect_left(self.claves, clave + "\uffff", inicio)
+            posiciones = heapq.nsmallest(n, range(inicio, fin), key=self._orden)
+
+        return [self.entradas[p][1:] for p in posiciones]
+
+
+_lock = threading.Lock()
+_indices: Dict[str, IndicePrefijos] = {}
+_version_indices = None
+
+def obtener_indice_sugerencias(campo: str) -> IndicePrefijos:
+    """
+    Devuelve el índice de prefijos de `campo` ('localidad' o 'provincia')
+    para la versión actual de los datos, construyéndolo si hace falta.
+    """
+    global _version_indices
+    with _lock:
+        version = version_datos()
+        if _version_indices != version:
+            _indices.clear()
+            _version_indices = version
+        if campo not in _indices:
+            _indices[campo] = IndicePrefijos(consultas.nombres_para_sugerencias(campo))
+        return _indices[campo]
+
+def indice_sugerencias_listo(campo: str) -> Optional[IndicePrefijos]:
+    """
+    Devuelve el índice de `campo` si ya está construido para la versión
+    actual, o None. Permite responder sin salir del bucle de eventos.
+    """
+    with _lock:
+        if _version_indices == version_datos():
+            return _indices.get(campo)
+        return None
+
+def _reconstruir_tras_cambio(version: str):
+    """Suscriptor de cambios: reconstruye los índices en cuanto termina una carga o borrado."""
+    try:
+        for campo in CAMPOS_SUGERENCIAS:
+            obtener_indice_sugerencias(campo)
+    except Exception as e:
+        print(f"Error al reconstruir el índice de sugerencias: {e}")
+
+suscribir_cambios(_reconstruir_tras_cambio)
@@ -0,0 +1,67 @@
+"""
+Versión de los datos del almacén.
+
+Las estaciones solo cambian cuando se ejecuta una carga (`POST /api/cargar`) o
+un borrado (`DELETE /api/almacen`). Esos endpoints llaman a
+`notificar_cambio_datos` cuando terminan, lo que incrementa un contador en
+memoria y avisa a los suscriptores (cachés, contadores...).
+
+La versión incluye además un identificador aleatorio generado al arrancar el
+proceso, de modo que tras un reinicio (en el que los datos pudieron cambiar
+por otra vía) ninguna versión anterior se considera válida.
+"""
+
+import secrets
+import threading
+from typing import Callable, List
+
+_lock = threading.Lock()
+_arranque = secrets.token_hex(4)
+_contador = 0
+_suscriptores: List[Callable[[str], None]] = []
+
+def version_datos() -> str:
+    """Versión actual de los datos, p. ej. '3f9a1c2e-4'."""
+    return f"{_arranque}-{_contador}"
+
+def suscribir_cambios(callback: Callable[[str], None], primero: bool = False):
+    """
+    Registra una función que se llamará con la nueva versión tras cada cambio.
+
+    Los callbacks se ejecutan en el hilo que notifica el cambio y no deben
+    lanzar excepciones; si lo hacen se ignoran para no afectar al resto.
+
+    Args:
+        primero: Si es True el callback se ejecuta antes que los ya
+            registrados (p. ej. para exportar los datos antes de que los
+            índices en memoria se reconstruyan a partir de ellos)
+    """
+    with _lock:
+        if callback not in _suscriptores:
+            if primero:
+                _suscriptores.insert(0, callback)
+            else:
+                _suscriptores.append(callback)
+
+def notificar_cambio_datos() -> str:
+    """
+    Incrementa la versión de los datos y avisa a los suscriptores.
+
+    Debe llamarse después de confirmar (commit) la transacción que modifica
+    los datos, nunca antes.
+
+    Returns:
+        str: La nueva versión
+    """
+    global _contador
+    with _lock:
+        _contador += 1
+        version = version_datos()
+        suscriptores = list(_suscriptores)
+
+    for callback in suscriptores:
+        try:
+            callback(version)
+        except Exception as e:
+            print(f"Error al notificar cambio de datos: {e}")
+    return version
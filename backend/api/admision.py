@@ -0,0 +1,181 @@
+"""
+Control de admisión de los endpoints que consultan la base de datos.
+
+Cada grupo de endpoints tiene su propio cupo: un máximo de peticiones en curso
+y una cola de espera acotada. Si la cola está llena, o una petición no
+consigue hueco en `espera` segundos, se responde 503 con `Retry-After` en
+lugar de acumular peticiones sin límite delante del pool de conexiones.
+
+Los grupos son independientes, de modo que una carga o un borrado en curso
+no ocupan los huecos de las búsquedas:
+- busqueda: búsquedas, catálogos, mapa y estado del almacén
+- carga: `POST /api/cargar` y `DELETE /api/almacen` (una a la vez por defecto)
+
+Cada grupo fija además el statement_timeout de las consultas de la petición
+(ver `database.fijar_limite_sentencias`); una consulta que lo supera también
+se responde con 503.
+
+Parámetros en la sección opcional [admision] de config.ini, con el grupo como
+prefijo: busqueda_maximo, busqueda_cola, busqueda_espera,
+busqueda_statement_timeout_ms y lo mismo para carga_. Un timeout de 0
+desactiva el límite de duración.
+"""
+
+import asyncio
+from collections import deque
+
+from fastapi import HTTPException
+
+from backend.almacen.database import cargar_seccion, fijar_limite_sentencias
+
+# Valores por defecto de cada grupo
+GRUPOS = {
+    "busqueda": {"maximo": 32, "cola": 128, "espera": 2.0, "statement_timeout_ms": 10000},
+    "carga": {"maximo": 1, "cola": 0, "espera": 0.0, "statement_timeout_ms": 120000},
+}
+
+# Segundos sugeridos al cliente en la cabecera Retry-After
+REINTENTAR_TRAS = 1
+
+class AdmisionRechazadaError(Exception):
+    """El grupo no tiene hueco libre ni sitio en la cola dentro del tiempo de espera."""
+
+class LimiteConcurrencia:
+    """
+    Semáforo con cola de espera acotada y tiempo máximo de espera.
+
+    Se usa solo desde el bucle de eventos del servidor, por eso no necesita
+    lock. Los huecos se ceden por orden de llegada: al salir una petición el
+    hueco pasa directamente a la primera que espera.
+
+    Args:
+        nombre: Nombre del grupo (para mensajes y métricas)
+        maximo: Peticiones en curso a la vez
+        cola: Peticiones que pueden esperar hueco; con 0 se rechaza en cuanto
+            no hay hueco
+        espera: Segundos máximos esperando hueco
+        statement_timeout_ms: Límite de duración de las consultas del grupo
+    """
+
+    def __init__(self, nombre: str, maximo: int, cola: int, espera: float, statement_timeout_ms: int):
+        if maximo < 1 or cola < 0:
+            raise ValueError(f"Cupo de admisión inválido para '{nombre}': maximo={maximo}, cola={cola}")
+        self.nombre = nombre
+        self.maximo = maximo
+        self.cola = cola
+        self.espera = espera
+        self.statement_timeout_ms = statement_timeout_ms
+        self._en_curso = 0
+        self._esperando = deque()
+        self._stats = {
+            'admitidas': 0,
+            'esperas': 0,
+            'rechazadas': 0,
+            'timeouts': 0,
+        }
+
+    async def entrar(self):
+        """
+        Ocupa un hueco, esperando como máximo `espera` segundos.
+
+        Raises:
+            AdmisionRechazadaError: Si la cola está llena o no hay hueco a tiempo
+        """
+        if self._en_curso < self.maximo and not self._esperando:
+            self._en_curso += 1
+            self._stats['admitidas'] += 1
+            return
+
+        if len(self._esperando) >= self.cola:
+            self._stats['rechazadas'] += 1
+            raise AdmisionRechazadaError(
+                f"Servidor saturado: {self._en_curso} peticiones de {self.nombre} en curso "
+                f"y {len(self._esperando)} en espera"
+            )
+
+        self._stats['esperas'] += 1
+        hueco = asyncio.get_running_loop().create_future()
+        self._esperando.append(hueco)
+        try:
+            # shield: al vencer la espera `hueco` no se cancela y se puede
+            # comprobar si el hueco llegó justo a tiempo
+            await asyncio.wait_for(asyncio.shield(hueco), self.espera)
+        except asyncio.TimeoutError:
+            if not hueco.done():
+                self._esperando.remove(hueco)
+                hueco.cancel()
+                self._stats['timeouts'] += 1
+                raise AdmisionRechazadaError(
+                    f"Servidor saturado: ninguna petición de {self.nombre} terminó "
+                    f"en {self.espera}s de espera"
+                )
+        except asyncio.CancelledError:
+            if hueco.done():
+                self.salir()
+            else:
+                self._esperando.remove(hueco)
+                hueco.cancel()
+            raise
+        self._stats['admitidas'] += 1
+
+    def salir(self):
+        """Libera el hueco, cediéndolo a la primera petición en espera si la hay."""
+        while self._esperando:
+            hueco = self._esperando.popleft()
+            if not hueco.done():
+                hueco.set_result(None)
+                return
+        self._en_curso -= 1
+
+    def estadisticas(self):
+        """Devuelve un resumen del estado del grupo."""
+        return {
+            'maximo': self.maximo,
+            'cola': self.cola,
+            'en_curso': self._en_curso,
+            'en_espera': len(self._esperando),
+            **self._stats,
+            'statement_timeout_ms': self.statement_timeout_ms,
+        }
+
+
+_limites = {}
+
+def obtener_limite(grupo: str) -> LimiteConcurrencia:
+    """Devuelve el cupo de un grupo, creándolo con la configuración en el primer uso."""
+    if grupo not in _limites:
+        opciones = cargar_seccion('admision')
+        defecto = GRUPOS[grupo]
+        _limites[grupo] = LimiteConcurrencia(
+            grupo,
+            maximo=int(opciones.get(f'{grupo}_maximo', defecto['maximo'])),
+            cola=int(opciones.get(f'{grupo}_cola', defecto['cola'])),
+            espera=float(opciones.get(f'{grupo}_espera', defecto['espera'])),
+            statement_timeout_ms=int(opciones.get(f'{grupo}_statement_timeout_ms', defecto['statement_timeout_ms'])),
+        )
+    return _limites[grupo]
+
+def admision(grupo: str):
+    """
+    Dependencia de FastAPI que admite la petición en el cupo de `grupo` y
+    fija el límite de duración de sus consultas.
+
+    Example:
+        >>> @router.get("/ruta", dependencies=[Depends(admision("busqueda"))])
+    """
+    async def admitir():
+        limite = obtener_limite(grupo)
+        try:
+            await limite.entrar()
+        except AdmisionRechazadaError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(REINTENTAR_TRAS)})
+        try:
+            fijar_limite_sentencias(limite.statement_timeout_ms or None)
+            yield
+        finally:
+            limite.salir()
+    return admitir
+
+def estadisticas_admision():
+    """Estadísticas de los grupos ya creados."""
+    return {grupo: limite.estadisticas() for grupo, limite in _limites.items()}
@@ -5,30 +5,340 @@ Este módulo proporciona endpoints REST para buscar estaciones ITV en la base de
 obtener listas de provincias y localidades disponibles.
 """
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
-from backend.models import EstacionResponse, ProvinciaResponse, LocalidadResponse
-from backend.almacen.database import conectar
+import base64
+import json
+from backend.models import (
+    EstacionResponse, EstacionCercanaResponse, EstacionRelevanteResponse, ClusterResponse, SugerenciaResponse,
+    FacetasResponse, BusquedaLoteRequest, ResultadoLoteResponse,
+    ProvinciaResponse, LocalidadResponse
+)
+from backend.almacen.database import ejecutar_bd, iterar_bd, BaseDatosSaturadaError
+from backend.almacen.lectura import consultas
+from backend.almacen.version import version_datos
+from backend.almacen.normalizacion import normalizar_clave
+from backend.almacen.indice_espacial import LAT_MAX_MERCATOR, obtener_indice, ajustar_a_teselas, muestra_repartida
+from backend.almacen.clusters import obtener_clusters
+from backend.almacen.similitud import candidatos_similares
+from backend.almacen.instantanea import instantanea_lista
+from backend.almacen.sugerencias import (
+    CAMPOS_SUGERENCIAS, MAX_SUGERENCIAS, indice_sugerencias_listo, obtener_indice_sugerencias
+)
+from backend.api.serializacion import RespuestaJSON, a_json, filas_a_json, filas_a_ndjson
+from backend.api.admision import admision
+from backend.api.cache_resultados import obtener_o_calcular
+from backend.api.cache_http import (
+    CABECERAS_ETAG, RESPUESTA_304, cabeceras_cache, etag_peticion,
+    no_modificado, respuesta_no_modificada
+)
 
 router = APIRouter(
     prefix="/api",
     tags=["Búsqueda"],
+    dependencies=[Depends(admision("busqueda"))],
     responses={
-        500: {"description": "Error interno del servidor o de base de datos"}
+        500: {"description": "Error interno del servidor o de base de datos"},
+        503: {"description": "Servidor saturado: cupo de admisión lleno, sin conexiones libres o consulta demasiado larga"}
     }
 )
 
+# Límites de paginación de /api/buscar y /api/estaciones
+LIMITE_POR_DEFECTO = 1000
+LIMITE_MAXIMO = 5000
+
+# Tipo de contenido del modo flujo de /api/buscar y /api/estaciones: una
+# estación JSON por línea
+MEDIA_NDJSON = "application/x-ndjson"
+
+# Máximo de estaciones por defecto en /api/estaciones/bbox: lo que tiene sentido
+# pintar de una vez en el mapa
+LIMITE_BBOX = 2000
+
+# Máximo de elementos por defecto en /api/clusters. Una pantalla completa a
+# 60 px por celda no llega a 1000, así que solo se alcanza con bbox enormes
+LIMITE_CLUSTERS = 2000
+
+# Resultados por defecto y máximos de /api/buscar/texto
+LIMITE_TEXTO = 50
+LIMITE_TEXTO_MAXIMO = 500
+
+CABECERAS_PAGINACION = {
+    "X-Next-Cursor": {"description": "Cursor opaco de la página siguiente (ausente en la última página)", "schema": {"type": "string"}},
+    "X-Total-Count": {"description": "Total de estaciones que cumplen los filtros (solo con total=true)", "schema": {"type": "integer"}},
+    "Link": {"description": "Enlace rel=\"next\" a la página siguiente", "schema": {"type": "string"}},
+}
+
+CABECERA_QUIZAS = {
+    "X-Quizas-Quiso-Decir": {
+        "description": "Si la búsqueda exacta no encuentra nada: JSON con nombres parecidos por campo, "
+                       "p. ej. {\"provincia\": [\"Ourense\"]}",
+        "schema": {"type": "string"}
+    },
+}
+
+# Sugerencias "quizás quiso decir" por campo cuando una búsqueda no encuentra nada
+MAX_QUIZAS = 3
+
+# Valores por faceta que devuelve /api/facetas por defecto y como máximo
+LIMITE_FACETAS = 100
+LIMITE_FACETAS_MAXIMO = 5000
+
+# Dimensión de consultas.contar_facetas -> clave de FacetasResponse
+DIMENSIONES_FACETAS = {"provincia": "provincias", "localidad": "localidades", "tipo": "tipos"}
+
+# Proyecciones predefinidas para el parámetro fields
+PRESETS_CAMPOS = {
+    "mapa": ("cod_estacion", "nombre", "tipo", "latitud", "longitud"),
+}
+
+DESCRIPCION_FIELDS = (
+    "Campos a devolver separados por comas (p. ej. nombre,latitud,longitud) o un preset: "
+    + ", ".join(f"'{nombre}' ({', '.join(campos)})" for nombre, campos in PRESETS_CAMPOS.items())
+    + ". Sin este parámetro se devuelven todos los campos."
+)
+
+def resolver_campos(fields: Optional[str]) -> Optional[tuple]:
+    """
+    Traduce el parámetro fields a una tupla de campos de EstacionResponse.
+
+    Returns:
+        None si no se pidió proyección, o la tupla de campos sin duplicados.
+
+    Raises:
+        HTTPException: 400 si algún campo no existe
+    """
+    if not fields:
+        return None
+    if fields in PRESETS_CAMPOS:
+        return PRESETS_CAMPOS[fields]
+
+    campos = []
+    for campo in fields.split(","):
+        campo = campo.strip()
+        if campo not in consultas.COLUMNAS_ESTACION:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Campo desconocido: '{campo}'. Campos válidos: {', '.join(consultas.CAMPOS_ESTACION)}"
+            )
+        if campo not in campos:
+            campos.append(campo)
+    return tuple(campos)
+
+def codificar_cursor(clave: tuple) -> str:
+    """Convierte la clave de ordenación (provincia, localidad, nombre, cod_estacion) en un cursor opaco."""
+    contenido = json.dumps(list(clave), ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+    return base64.urlsafe_b64encode(contenido).decode('ascii').rstrip("=")
+
+def decodificar_cursor(cursor: str) -> tuple:
+    """
+    Recupera la clave de ordenación de un cursor generado por `codificar_cursor`.
+
+    Raises:
+        HTTPException: 400 si el cursor no es válido
+    """
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        clave = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        provincia, localidad, nombre, cod_estacion = clave
+        if not all(isinstance(x, str) for x in (provincia, localidad, nombre)) or not isinstance(cod_estacion, int):
+            raise ValueError(clave)
+        return provincia, localidad, nombre, cod_estacion
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+def clave_busqueda(localidad, codigo_postal, provincia, tipo, nombre, prefijo,
+                   limit, despues_de, total, campos, fuzzy=False) -> tuple:
+    """
+    Clave de la caché de resultados para una página de búsqueda.
+
+    Los filtros de texto se normalizan igual que en la consulta (sin
+    mayúsculas ni acentos), así que "Castellon" y "Castellón" comparten
+    entrada; los vacíos equivalen a no filtrar.
+    """
+    return (
+        normalizar_clave(localidad) or None,
+        codigo_postal or None,
+        normalizar_clave(provincia) or None,
+        tipo or None,
+        normalizar_clave(nombre) or None,
+        prefijo,
+        limit, despues_de, total, campos, fuzzy,
+    )
+
+def _textos_busqueda(localidad, provincia, nombre) -> dict:
+    """Filtros de texto con contenido tras normalizar, por campo."""
+    textos = {"localidad": localidad, "provincia": provincia, "nombre": nombre}
+    return {campo: texto for campo, texto in textos.items() if texto and normalizar_clave(texto)}
+
+async def _similares(textos) -> Optional[dict]:
+    """
+    Resuelve los filtros de texto de una búsqueda aproximada en sus candidatos.
+
+    Returns:
+        Campo -> lista de (codigo, similitud), o None si algún campo no tiene
+        ningún candidato (la búsqueda no puede encontrar nada).
+    """
+    candidatos = await ejecutar_bd(candidatos_similares, textos)
+    if not all(candidatos.values()):
+        return None
+    return {
+        campo: [(codigo, similitud) for codigo, _, similitud in lista]
+        for campo, lista in candidatos.items()
+    }
+
+async def _consultar_aproximada(textos, codigo_postal, tipo, limit, campos):
+    """
+    Búsqueda tolerante a erratas: los filtros de texto se resuelven con los
+    índices de trigramas y las estaciones se ordenan por similitud.
+
+    Returns:
+        tuple: (cuerpo JSON en bytes, cabeceras)
+    """
+    similares = await _similares(textos)
+    if similares is None:
+        return filas_a_json(campos, []), {}
+
+    rows = await ejecutar_bd(
+        consultas.buscar_estaciones_similares, similares, codigo_postal, tipo, limite=limit, campos=campos
+    )
+    return filas_a_json(campos, rows), {}
+
+async def _quizas_quiso_decir(textos) -> dict:
+    """Nombres parecidos a cada filtro de texto, para una búsqueda sin resultados."""
+    candidatos = await ejecutar_bd(candidatos_similares, textos, MAX_QUIZAS * 2)
+    propuestas = {}
+    for campo, lista in candidatos.items():
+        buscado = normalizar_clave(textos[campo])
+        nombres = []
+        for _, nombre, _ in lista:
+            if nombre not in nombres and normalizar_clave(nombre) != buscado:
+                nombres.append(nombre)
+        if nombres:
+            propuestas[campo] = nombres[:MAX_QUIZAS]
+    return propuestas
+
+async def _consultar_pagina(localidad, codigo_postal, provincia, tipo, nombre, prefijo,
+                            limit, despues_de, total, campos, fuzzy=False):
+    """
+    Consulta una página de estaciones y la serializa.
+
+    La búsqueda aproximada (fuzzy con filtros de texto) es una sola página y
+    no usa despues_de ni total: /api/buscar rechaza esas combinaciones.
+
+    Returns:
+        tuple: (cuerpo JSON en bytes, cabeceras X-Next-Cursor / X-Total-Count /
+            X-Quizas-Quiso-Decir)
+    """
+    textos = _textos_busqueda(localidad, provincia, nombre)
+    if fuzzy and textos:
+        return await _consultar_aproximada(textos, codigo_postal, tipo, limit, campos)
+
+    paginacion = {}
+
+    # Con el modo en memoria activo y la instantánea al día no se consulta
+    # PostgreSQL; un cursor de otra versión de los datos sí va a SQL
+    instantanea = instantanea_lista()
+    rows = None
+    if instantanea is not None:
+        rows = instantanea.buscar(
+            localidad, codigo_postal, provincia, tipo,
+            limite=limit + 1, despues_de=despues_de, campos=campos, nombre=nombre, prefijo=prefijo
+        )
+
+    # Se pide una fila extra para saber si existe una página siguiente
+    if rows is None:
+        instantanea = None
+        rows = await ejecutar_bd(
+            consultas.buscar_estaciones, localidad, codigo_postal, provincia, tipo,
+            limite=limit + 1, despues_de=despues_de, campos=campos, nombre=nombre, prefijo=prefijo
+        )
+    hay_mas = len(rows) > limit
+    rows = rows[:limit]
+
+    if total:
+        if instantanea is not None:
+            cantidad = instantanea.contar(localidad, codigo_postal, provincia, tipo, nombre=nombre, prefijo=prefijo)
+        else:
+            cantidad = await ejecutar_bd(
+                consultas.contar_estaciones, localidad, codigo_postal, provincia, tipo,
+                nombre=nombre, prefijo=prefijo
+            )
+        paginacion["X-Total-Count"] = str(cantidad)
+
+    if hay_mas:
+        # Las cuatro últimas columnas de cada fila son la clave de ordenación
+        paginacion["X-Next-Cursor"] = codificar_cursor(rows[-1][-4:])
+
+    if not rows and despues_de is None and textos:
+        propuestas = await _quizas_quiso_decir(textos)
+        if propuestas:
+            # json.dumps escapa a ASCII por defecto: las cabeceras HTTP no admiten UTF-8
+            paginacion["X-Quizas-Quiso-Decir"] = json.dumps(propuestas, separators=(",", ":"))
+
+    # Las filas se codifican directamente a JSON sin construir
+    # EstacionResponse; response_model solo se usa para OpenAPI
+    return filas_a_json(campos, rows), paginacion
+
+def pide_flujo(request: Request, stream: bool) -> bool:
+    """Indica si la petición quiere el listado en NDJSON (stream=true o Accept: application/x-ndjson)."""
+    return stream or MEDIA_NDJSON in request.headers.get("accept", "")
+
+async def _flujo_estaciones(localidad, codigo_postal, provincia, tipo, nombre, prefijo, despues_de, campos):
+    """
+    Lee el primer lote de una búsqueda completa y devuelve el generador del cuerpo NDJSON.
+
+    El primer lote se lee antes de responder para que los errores de la
+    consulta (pool agotado, statement_timeout) se respondan con su código y
+    no como una respuesta 200 cortada. Un error posterior corta el flujo
+    sin el último fragmento, y el cliente lo detecta como respuesta incompleta.
+    """
+    lotes = iterar_bd(
+        consultas.iterar_estaciones, localidad, codigo_postal, provincia, tipo,
+        despues_de=despues_de, campos=campos, nombre=nombre, prefijo=prefijo
+    )
+    try:
+        primero = await anext(lotes, [])
+    except BaseException:
+        await lotes.aclose()
+        raise
+
+    async def cuerpo():
+        try:
+            if primero:
+                yield filas_a_ndjson(campos, primero)
+            async for filas in lotes:
+                yield filas_a_ndjson(campos, filas)
+        except Exception as e:
+            print(f"Error enviando el flujo de estaciones: {e}")
+            raise
+        finally:
+            # También si el cliente se desconecta: libera la conexión del cursor
+            await lotes.aclose()
+
+    return cuerpo()
+
 @router.get(
     "/buscar",
     response_model=List[EstacionResponse],
     summary="Buscar estaciones ITV",
     description="Busca estaciones ITV aplicando filtros opcionales. Todos los filtros son opcionales y se pueden combinar.",
-    response_description="Lista de estaciones que cumplen los criterios de búsqueda, ordenadas por provincia, localidad y nombre"
+    response_description="Lista de estaciones que cumplen los criterios de búsqueda, ordenadas por provincia, localidad y nombre",
+    responses={
+        200: {
+            "headers": {**CABECERAS_PAGINACION, **CABECERA_QUIZAS, **CABECERAS_ETAG},
+            "content": {MEDIA_NDJSON: {"schema": {"type": "string"}}}
+        },
+        400: {"description": "Cursor de paginación inválido, cursor, total o stream con fuzzy=true"},
+        **RESPUESTA_304
+    }
 )
 async def buscar_estaciones(
+    request: Request,
     localidad: Optional[str] = Query(
         None,
-        description="Nombre de la localidad (búsqueda parcial, case-insensitive)",
+        description="Nombre de la localidad (búsqueda parcial, sin distinguir mayúsculas ni acentos)",
         examples=["Valencia"]
     ),
     codigo_postal: Optional[str] = Query(
@@ -40,7 +350,7 @@ async def buscar_estaciones(
     ),
     provincia: Optional[str] = Query(
         None,
-        description="Nombre de la provincia (búsqueda parcial, case-insensitive)",
+        description="Nombre de la provincia (búsqueda parcial, sin distinguir mayúsculas ni acentos)",
         examples=["Valencia"]
     ),
     tipo: Optional[str] = Query(
@@ -48,131 +358,817 @@ async def buscar_estaciones(
         description="Tipo de estación",
         examples=["Estación_fija"],
         enum=["Estación_fija", "Estación_móvil", "Otros"]
+    ),
+    nombre: Optional[str] = Query(
+        None,
+        description="Nombre de la estación (búsqueda parcial, sin distinguir mayúsculas ni acentos)",
+        examples=["Verín"]
+    ),
+    coincidencia: str = Query(
+        "subcadena",
+        description="Cómo se comparan los filtros de texto: 'subcadena' (contienen el término) "
+                    "o 'prefijo' (empiezan por él)",
+        enum=["subcadena", "prefijo"]
+    ),
+    fuzzy: bool = Query(
+        False,
+        description="Si es true, los filtros de texto toleran erratas (similitud de trigramas) y los "
+                    "resultados se ordenan por parecido. Devuelve una sola página, sin cursor ni total"
+    ),
+    limit: int = Query(
+        LIMITE_POR_DEFECTO,
+        ge=1,
+        le=LIMITE_MAXIMO,
+        description="Número máximo de estaciones por página"
+    ),
+    cursor: Optional[str] = Query(
+        None,
+        description="Cursor opaco de la cabecera X-Next-Cursor de la página anterior"
+    ),
+    total: bool = Query(
+        False,
+        description="Si es true, incluye el total de resultados en la cabecera X-Total-Count"
+    ),
+    fields: Optional[str] = Query(
+        None,
+        description=DESCRIPCION_FIELDS,
+        examples=["mapa"]
+    ),
+    stream: bool = Query(
+        False,
+        description="Si es true (o con Accept: application/x-ndjson), devuelve todas las estaciones "
+                    "desde el cursor en NDJSON, una por línea, enviadas por partes. Ignora limit"
     )
 ):
     """
     Busca estaciones ITV en la base de datos aplicando filtros opcionales.
     
     Este endpoint permite buscar estaciones utilizando uno o varios criterios de búsqueda.
-    Los filtros de texto (localidad, provincia) utilizan búsqueda parcial case-insensitive.
+    Los filtros de texto (localidad, provincia, nombre) utilizan búsqueda
+    parcial sin distinguir mayúsculas ni acentos: el término se normaliza y se
+    compara con las columnas nombre_normalizado, calculadas al cargar los datos
+    e indexadas.
     
     Args:
         localidad: Filtro opcional por nombre de localidad (búsqueda con LIKE)
         codigo_postal: Filtro opcional por código postal exacto
         provincia: Filtro opcional por nombre de provincia (búsqueda con LIKE)
         tipo: Filtro opcional por tipo de estación (exacto)
+        nombre: Filtro opcional por nombre de la estación (búsqueda con LIKE)
+        coincidencia: 'subcadena' (por defecto) o 'prefijo' para los filtros de texto
+        fuzzy: Búsqueda tolerante a erratas ("Orense", "Cornela"): cada filtro de
+            texto se compara por similitud de trigramas con los nombres de
+            localidades, provincias (y sus variantes conocidas) o estaciones, y
+            la página se ordena por similitud en lugar de alfabéticamente.
+            No admite cursor ni total
+        limit: Tamaño máximo de la página
+        cursor: Cursor de continuación (paginación por clave)
+        total: Si se debe calcular el total de resultados
+        fields: Proyección de campos; reduce tanto el SELECT como el JSON
+        stream: Modo flujo: en lugar de una página, todas las estaciones que
+            cumplen los filtros (desde el cursor, si se indica) en NDJSON. Se
+            leen con un cursor del servidor por lotes de
+            `consultas.FILAS_POR_LOTE` y cada lote se envía en cuanto está
+            listo, así que la memoria no crece con el número de estaciones.
+            No pasa por la caché de resultados; total=true sigue añadiendo
+            X-Total-Count. No admite fuzzy
     
     Returns:
-        List[EstacionResponse]: Lista de estaciones que cumplen los criterios,
+        List[EstacionResponse]: Página de estaciones que cumplen los criterios,
             ordenadas alfabéticamente por provincia, localidad y nombre.
-            Retorna lista vacía si no hay resultados.
+            Retorna lista vacía si no hay resultados; en ese caso la cabecera
+            X-Quizas-Quiso-Decir propone nombres parecidos a los filtros de
+            texto. Si hay más páginas, las cabeceras X-Next-Cursor y Link
+            indican cómo pedir la siguiente.
     
     Raises:
         HTTPException: 
+            - 400: Cursor inválido, cursor, total o stream con fuzzy, o campo desconocido en fields
             - 500: Error al conectar con la base de datos o error en la consulta SQL
     
     Examples:
         - Buscar todas las estaciones: GET /api/buscar
         - Buscar por provincia: GET /api/buscar?provincia=Valencia
+        - Sin acentos: GET /api/buscar?provincia=castellon (encuentra Castellón)
+        - Localidades que empiezan por "vil": GET /api/buscar?localidad=vil&coincidencia=prefijo
         - Buscar estaciones fijas en Valencia: GET /api/buscar?provincia=Valencia&tipo=Estación_fija
         - Buscar por código postal: GET /api/buscar?codigo_postal=46001
+        - Página siguiente: GET /api/buscar?limit=100&cursor=<X-Next-Cursor>
+        - Datos mínimos para el mapa: GET /api/buscar?fields=mapa
+        - Con erratas: GET /api/buscar?provincia=orense&localidad=verin&fuzzy=true
+        - Todas las de Valencia en NDJSON: GET /api/buscar?provincia=Valencia&stream=true
     """
 
-    conn = conectar()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Error al conectar con la base de datos")
-    
+    # La búsqueda aproximada devuelve una sola página ordenada por parecido
+    if fuzzy and cursor:
+        raise HTTPException(status_code=400, detail="La búsqueda con fuzzy=true no admite cursor")
+    if fuzzy and total:
+        raise HTTPException(status_code=400, detail="La búsqueda con fuzzy=true no admite total")
+    flujo = pide_flujo(request, stream)
+    if fuzzy and flujo:
+        raise HTTPException(status_code=400, detail="La búsqueda con fuzzy=true no admite stream")
+    despues_de = decodificar_cursor(cursor) if cursor else None
+    proyeccion = resolver_campos(fields)
+    campos = proyeccion or consultas.CAMPOS_ESTACION
+
+    # La versión se lee antes de consultar: si cambia durante la consulta el
+    # ETag queda antiguo y el cliente simplemente volverá a descargar
+    version = version_datos()
+    etag = etag_peticion(request, version)
+    if flujo:
+        # La misma URL puede pedir NDJSON solo con Accept: otro ETag
+        etag = etag[:-1] + '-ndjson"'
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag, vary="Accept")
+
     try:
-        cur = conn.cursor()
-        query = """
-            SELECT 
-                e.cod_estacion, e.nombre, e.tipo, e.direccion, e.codigo_postal,
-                e.longitud, e.latitud, e.descripcion, e.horario, e.contacto, e.url,
-                l.nombre as localidad_nombre, p.nombre as provincia_nombre
-            FROM Estacion e
-            JOIN Localidad l ON e.codigo_localidad = l.codigo
-            JOIN Provincia p ON l.codigo_provincia = p.codigo
-            WHERE 1=1
-        """
-        params = []
-        
-        if localidad:
-            query += " AND LOWER(l.nombre) LIKE LOWER(%s)"
-            params.append(f"%{localidad}%")
-        
-        if codigo_postal:
-            query += " AND e.codigo_postal = %s"
-            params.append(codigo_postal)
-        
-        if provincia:
-            query += " AND LOWER(p.nombre) LIKE LOWER(%s)"
-            params.append(f"%{provincia}%")
-        
-        if tipo:
-            query += " AND e.tipo = %s"
-            params.append(tipo)
-        
-        query += " ORDER BY p.nombre, l.nombre, e.nombre"
-        
-        cur.execute(query, params)
-        rows = cur.fetchall()
-        
-        estaciones = []
-        for row in rows:
-            estaciones.append(EstacionResponse(
-                cod_estacion=row[0],
-                nombre=row[1],
-                tipo=row[2],
-                direccion=row[3],
-                codigo_postal=row[4],
-                longitud=row[5],
-                latitud=row[6],
-                descripcion=row[7],
-                horario=row[8],
-                contacto=row[9],
-                url=row[10],
-                localidad=row[11],
-                provincia=row[12]
-            ))
-        
-        return estaciones
+        prefijo = coincidencia == "prefijo"
+        if flujo:
+            cabeceras = {**cabeceras_cache(etag), "Vary": "Accept"}
+            if total:
+                cantidad = await ejecutar_bd(
+                    consultas.contar_estaciones, localidad, codigo_postal, provincia, tipo,
+                    nombre=nombre, prefijo=prefijo
+                )
+                cabeceras["X-Total-Count"] = str(cantidad)
+            cuerpo = await _flujo_estaciones(
+                localidad, codigo_postal, provincia, tipo, nombre, prefijo, despues_de, campos
+            )
+            return StreamingResponse(cuerpo, media_type=MEDIA_NDJSON, headers=cabeceras)
+
+        clave = clave_busqueda(
+            localidad, codigo_postal, provincia, tipo, nombre, prefijo, limit, despues_de, total, campos, fuzzy
+        )
+        cuerpo, paginacion = await obtener_o_calcular(clave, version, lambda: _consultar_pagina(
+            localidad, codigo_postal, provincia, tipo, nombre, prefijo, limit, despues_de, total, campos, fuzzy
+        ))
+
+        cabeceras = {**cabeceras_cache(etag), "Vary": "Accept", **paginacion}
+        if "X-Next-Cursor" in paginacion:
+            siguiente = paginacion["X-Next-Cursor"]
+            cabeceras["Link"] = f'<{request.url.include_query_params(cursor=siguiente)}>; rel="next"'
+
+        return RespuestaJSON(cuerpo, headers=cabeceras)
+    
+    except BaseDatosSaturadaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    except HTTPException:
+        raise
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en la búsqueda: {str(e)}")
-    
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
 @router.get(
     "/estaciones",
     response_model=List[EstacionResponse],
     summary="Obtener todas las estaciones",
-    description="Retorna todas las estaciones disponibles sin filtros.",
-    response_description="Lista completa de estaciones"
+    description="Retorna todas las estaciones disponibles sin filtros, paginadas por cursor.",
+    response_description="Página del catálogo completo de estaciones",
+    responses={
+        200: {
+            "headers": {**CABECERAS_PAGINACION, **CABECERAS_ETAG},
+            "content": {MEDIA_NDJSON: {"schema": {"type": "string"}}}
+        },
+        400: {"description": "Cursor de paginación inválido"},
+        **RESPUESTA_304
+    }
 )
-async def obtener_todas_estaciones():
+async def obtener_todas_estaciones(
+    request: Request,
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO, description="Número máximo de estaciones por página"),
+    cursor: Optional[str] = Query(None, description="Cursor opaco de la cabecera X-Next-Cursor de la página anterior"),
+    total: bool = Query(False, description="Si es true, incluye el total en la cabecera X-Total-Count"),
+    fields: Optional[str] = Query(None, description=DESCRIPCION_FIELDS, examples=["mapa"]),
+    stream: bool = Query(False, description="Si es true (o con Accept: application/x-ndjson), todo el catálogo en NDJSON, enviado por partes")
+):
     """
     Obtiene todas las estaciones ITV disponibles en la base de datos.
     
     Este endpoint es equivalente a buscar sin filtros, pero proporciona
     una URL semántica específica para obtener el catálogo completo.
+    Admite la misma paginación por cursor, proyección de campos y modo
+    flujo (stream) que /api/buscar.
+    
+    Returns:
+        List[EstacionResponse]: Página del catálogo de estaciones.
+    """
+    return await buscar_estaciones(
+        request, localidad=None, codigo_postal=None, provincia=None, tipo=None,
+        nombre=None, coincidencia="subcadena", fuzzy=False, limit=limit, cursor=cursor, total=total, fields=fields,
+        stream=stream
+    )
+
+@router.get(
+    "/buscar/texto",
+    response_model=List[EstacionRelevanteResponse],
+    summary="Búsqueda de texto completo",
+    description="Busca palabras en el nombre, localidad, provincia, dirección, descripción y horario de las estaciones, ordenando por relevancia.",
+    response_description="Estaciones ordenadas por relevancia decreciente",
+    responses={200: {"headers": CABECERAS_ETAG}, 400: {"description": "Campo desconocido en fields"}, **RESPUESTA_304}
+)
+async def buscar_texto(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Texto a buscar", examples=["Lugo sábados"]),
+    tipo: Optional[str] = Query(
+        None,
+        description="Tipo de estación",
+        enum=["Estación_fija", "Estación_móvil", "Otros"]
+    ),
+    limit: int = Query(LIMITE_TEXTO, ge=1, le=LIMITE_TEXTO_MAXIMO, description="Número máximo de estaciones"),
+    fields: Optional[str] = Query(None, description=DESCRIPCION_FIELDS, examples=["mapa"])
+):
+    """
+    Busca estaciones por texto libre.
+    
+    La consulta usa la columna `Estacion.busqueda` (tsvector mantenido por un
+    trigger al insertar, con índice GIN), así que no se analiza el texto de
+    las estaciones en cada búsqueda. Las palabras se comparan por su raíz en
+    español y catalán ("sábados" encuentra "sábado" y "sabados") y pesan más
+    las coincidencias en el nombre que en la localidad, la dirección o el
+    horario.
+    
+    Args:
+        q: Texto a buscar. Todas las palabras deben aparecer; admite frases
+            entre comillas, "or" y "-palabra" para excluir
+        tipo: Filtro opcional por tipo de estación
+        limit: Número máximo de estaciones a devolver
+        fields: Proyección de campos (relevancia se incluye siempre)
     
     Returns:
-        List[EstacionResponse]: Lista completa de estaciones.
+        List[EstacionRelevanteResponse]: Estaciones ordenadas por relevancia
+    
+    Examples:
+        - GET /api/buscar/texto?q=Lugo sábados
+        - GET /api/buscar/texto?q="Sant Cugat"&fields=mapa
     """
-    return await buscar_estaciones(localidad=None, codigo_postal=None, provincia=None, tipo=None)
+    campos = resolver_campos(fields) or consultas.CAMPOS_ESTACION
+
+    etag = etag_peticion(request, version_datos())
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag)
+
+    try:
+        rows = await ejecutar_bd(consultas.buscar_texto, q, limit, campos, tipo)
+        estaciones = []
+        for row in rows:
+            estacion = dict(zip(campos, row))
+            estacion["relevancia"] = round(row[-1], 4)
+            estaciones.append(estacion)
+
+        return RespuestaJSON(a_json(estaciones), headers=cabeceras_cache(etag))
+    
+    except BaseDatosSaturadaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la búsqueda de texto: {str(e)}")
+
+async def _consultar_facetas(localidad, codigo_postal, provincia, tipo, nombre, prefijo, fuzzy, limit):
+    """
+    Calcula las facetas de unos filtros y las serializa.
+
+    Returns:
+        tuple: (cuerpo JSON en bytes, cabeceras)
+    """
+    textos = _textos_busqueda(localidad, provincia, nombre)
+    if fuzzy and textos:
+        similares = await _similares(textos)
+        if similares is None:
+            rows = []
+        else:
+            rows = await ejecutar_bd(consultas.contar_facetas, codigo_postal=codigo_postal, tipo=tipo,
+                                     similares=similares)
+    else:
+        rows = await ejecutar_bd(
+            consultas.contar_facetas, localidad, codigo_postal, provincia, tipo, nombre, prefijo
+        )
+
+    facetas = {"total": 0, "provincias": [], "localidades": [], "tipos": []}
+    for dimension, nombre_provincia, nombre_localidad, nombre_tipo, cantidad in rows:
+        if dimension == "total":
+            facetas["total"] = cantidad
+        elif dimension == "provincia":
+            facetas["provincias"].append({"valor": nombre_provincia, "cantidad": cantidad})
+        elif dimension == "localidad":
+            facetas["localidades"].append(
+                {"valor": nombre_localidad, "provincia": nombre_provincia, "cantidad": cantidad}
+            )
+        else:
+            facetas["tipos"].append({"valor": nombre_tipo, "cantidad": cantidad})
+
+    for clave in DIMENSIONES_FACETAS.values():
+        valores = sorted(facetas[clave], key=lambda faceta: (-faceta["cantidad"], faceta["valor"] or ""))
+        facetas[clave] = valores[:limit]
+
+    return a_json(facetas), {}
+
+@router.get(
+    "/facetas",
+    response_model=FacetasResponse,
+    summary="Recuentos por provincia, localidad y tipo",
+    description="Cuenta las estaciones que cumplen los mismos filtros que /api/buscar, agrupadas por provincia, localidad y tipo.",
+    response_description="Total y recuentos por dimensión, de más a menos estaciones",
+    responses={200: {"headers": CABECERAS_ETAG}, **RESPUESTA_304}
+)
+async def obtener_facetas(
+    request: Request,
+    localidad: Optional[str] = Query(None, description="Igual que en /api/buscar"),
+    codigo_postal: Optional[str] = Query(None, min_length=5, max_length=5, description="Igual que en /api/buscar"),
+    provincia: Optional[str] = Query(None, description="Igual que en /api/buscar"),
+    tipo: Optional[str] = Query(
+        None,
+        description="Tipo de estación",
+        enum=["Estación_fija", "Estación_móvil", "Otros"]
+    ),
+    nombre: Optional[str] = Query(None, description="Igual que en /api/buscar"),
+    coincidencia: str = Query("subcadena", description="Igual que en /api/buscar", enum=["subcadena", "prefijo"]),
+    fuzzy: bool = Query(False, description="Igual que en /api/buscar"),
+    limit: int = Query(
+        LIMITE_FACETAS,
+        ge=1,
+        le=LIMITE_FACETAS_MAXIMO,
+        description="Número máximo de valores por faceta (los de más estaciones)"
+    )
+):
+    """
+    Cuenta las estaciones de una búsqueda por provincia, localidad y tipo.
+    
+    Los tres recuentos y el total salen de una sola consulta con
+    `GROUP BY GROUPING SETS`, sin descargar las estaciones. Los filtros se
+    interpretan exactamente igual que en /api/buscar, así que las facetas
+    describen el mismo conjunto de resultados. La respuesta se guarda en la
+    caché de resultados y su ETag depende de la misma versión de datos que
+    las búsquedas.
+    
+    Returns:
+        FacetasResponse: Total y listas de {valor, cantidad} (las localidades
+            incluyen su provincia), de más a menos estaciones.
+    
+    Examples:
+        - Por provincia y tipo de todo el almacén: GET /api/facetas
+        - De una búsqueda: GET /api/facetas?provincia=Barcelona&tipo=Estación_fija
+    """
+    version = version_datos()
+    etag = etag_peticion(request, version)
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag)
+
+    try:
+        prefijo = coincidencia == "prefijo"
+        clave = ("facetas",) + clave_busqueda(
+            localidad, codigo_postal, provincia, tipo, nombre, prefijo, limit, None, False, None, fuzzy
+        )
+        cuerpo, cabeceras = await obtener_o_calcular(clave, version, lambda: _consultar_facetas(
+            localidad, codigo_postal, provincia, tipo, nombre, prefijo, fuzzy, limit
+        ))
+
+        return RespuestaJSON(cuerpo, headers={**cabeceras_cache(etag), **cabeceras})
+    
+    except BaseDatosSaturadaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular las facetas: {str(e)}")
+
+@router.post(
+    "/buscar/lote",
+    response_model=List[ResultadoLoteResponse],
+    summary="Resolver muchas búsquedas en una petición",
+    description="Aplica cada conjunto de filtros de la lista y devuelve sus estaciones, en el mismo orden en que se enviaron.",
+    response_description="Un resultado por búsqueda, con su posición, el total y las estaciones"
+)
+async def buscar_estaciones_lote(lote: BusquedaLoteRequest):
+    """
+    Resuelve hasta 5000 búsquedas en una sola petición.
+    
+    Pensado para clientes que cruzan listas largas (p. ej. todos los códigos
+    postales de una flota) y que de otro modo harían una petición a
+    /api/buscar por elemento. En lugar de una consulta por búsqueda, los
+    filtros viajan como arrays y se cruzan con las estaciones en una consulta
+    por cada combinación de filtros usada (ver `consultas.buscar_estaciones_lote`).
+    
+    Cada búsqueda necesita al menos un filtro. Los filtros de texto se
+    comparan sin mayúsculas ni acentos; con `coincidencia` 'exacta' (por
+    defecto) deben coincidir completos, lo que permite usar los índices con
+    lotes grandes, y 'prefijo' o 'subcadena' se comportan como en /api/buscar.
+    
+    Returns:
+        List[ResultadoLoteResponse]: Un elemento por búsqueda, en el orden
+            enviado, con `total` (estaciones que cumplen los filtros) y hasta
+            `limite_por_busqueda` estaciones ordenadas como en /api/buscar.
+            Las búsquedas sin resultados devuelven total 0 y lista vacía.
+    
+    Raises:
+        HTTPException:
+            - 400: Alguna búsqueda no tiene filtros o `fields` no es válido
+            - 500: Error en la consulta
+    
+    Example:
+        POST /api/buscar/lote
+        {"busquedas": [{"codigo_postal": "46001"}, {"localidad": "Vigo", "tipo": "Estación_fija"}]}
+    """
+    campos = resolver_campos(lote.fields) or consultas.CAMPOS_ESTACION
+    vacias = [
+        indice for indice, busqueda in enumerate(lote.busquedas)
+        if not any(busqueda.model_dump().values())
+    ]
+    if vacias:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Las búsquedas deben tener al menos un filtro (sin filtros: {vacias[:10]})"
+        )
+
+    busquedas = [
+        (indice, b.localidad, b.codigo_postal, b.provincia, b.tipo.value if b.tipo else None, b.nombre)
+        for indice, b in enumerate(lote.busquedas)
+    ]
+
+    try:
+        rows = await ejecutar_bd(
+            consultas.buscar_estaciones_lote, busquedas, lote.coincidencia, lote.limite_por_busqueda, campos
+        )
+
+        resultados = [{"indice": indice, "total": 0, "estaciones": []} for indice in range(len(busquedas))]
+        for row in rows:
+            resultado = resultados[row[0]]
+            resultado["total"] = row[-1]
+            resultado["estaciones"].append(dict(zip(campos, row[1:-1])))
+        return RespuestaJSON(a_json(resultados))
+    
+    except BaseDatosSaturadaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al resolver el lote de búsquedas: {str(e)}")
+
+def _estaciones_en_rectangulo(rectangulo, tipo, limite):
+    """
+    Códigos de las estaciones del rectángulo según el índice espacial.
+
+    Returns:
+        tuple: (códigos, total). Si hay más de `limite` se devuelve una muestra
+            repartida por todo el rectángulo.
+    """
+    codigos = obtener_indice().en_rectangulo(*rectangulo, tipo=tipo)
+    return muestra_repartida(codigos, limite), len(codigos)
+
+@router.get(
+    "/estaciones/bbox",
+    response_model=List[EstacionResponse],
+    summary="Estaciones dentro de un rectángulo",
+    description="Devuelve las estaciones visibles en una vista del mapa (rectángulo de coordenadas).",
+    response_description="Estaciones del rectángulo (o una muestra repartida si superan el límite)",
+    responses={
+        200: {"headers": {
+            "X-Total-Count": {"description": "Estaciones que hay en el rectángulo cubierto", "schema": {"type": "integer"}},
+            "X-Bbox": {"description": "Rectángulo realmente cubierto: min_lat,min_lon,max_lat,max_lon", "schema": {"type": "string"}},
+            **CABECERAS_ETAG,
+        }},
+        400: {"description": "Rectángulo inválido o campo desconocido en fields"},
+        **RESPUESTA_304
+    }
+)
+async def obtener_estaciones_bbox(
+    request: Request,
+    min_lat: float = Query(..., ge=-90, le=90, description="Latitud del borde sur"),
+    min_lon: float = Query(..., ge=-180, le=180, description="Longitud del borde oeste"),
+    max_lat: float = Query(..., ge=-90, le=90, description="Latitud del borde norte"),
+    max_lon: float = Query(..., ge=-180, le=180, description="Longitud del borde este"),
+    zoom: Optional[int] = Query(
+        None, ge=0, le=22,
+        description="Nivel de zoom del mapa: el rectángulo se amplía a las teselas que lo cubren en ese nivel"
+    ),
+    tipo: Optional[str] = Query(
+        None,
+        description="Tipo de estación",
+        enum=["Estación_fija", "Estación_móvil", "Otros"]
+    ),
+    limit: int = Query(LIMITE_BBOX, ge=1, le=LIMITE_MAXIMO, description="Número máximo de estaciones"),
+    fields: Optional[str] = Query(None, description=DESCRIPCION_FIELDS, examples=["mapa"])
+):
+    """
+    Obtiene las estaciones situadas dentro de un rectángulo de coordenadas.
+    
+    Pensado para que el mapa pida solo lo que está en pantalla. Con `zoom`, el
+    rectángulo se amplía a los bordes de las teselas web mercator de ese nivel:
+    vistas próximas comparten así el mismo rectángulo (y la misma entrada de
+    la caché de resultados), y el cliente puede no volver a pedir nada
+    mientras la vista siga dentro del rectángulo cubierto (cabecera X-Bbox).
+    
+    La selección se hace con el índice espacial en memoria y los datos se
+    recuperan por clave primaria. Si hay más estaciones que `limit` se
+    devuelve una muestra repartida por el rectángulo y X-Total-Count indica
+    el total.
+    
+    Raises:
+        HTTPException:
+            - 400: min_lat > max_lat, min_lon > max_lon o campo desconocido
+            - 500: Error al consultar la base de datos
+    
+    Example:
+        GET /api/estaciones/bbox?min_lat=39.3&min_lon=-0.6&max_lat=39.6&max_lon=-0.2&zoom=11&fields=mapa
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="El rectángulo debe cumplir min_lat <= max_lat y min_lon <= max_lon")
+    campos = resolver_campos(fields) or consultas.CAMPOS_ESTACION
+
+    rectangulo = (min_lat, min_lon, max_lat, max_lon)
+    if zoom is not None:
+        rectangulo = ajustar_a_teselas(*rectangulo, zoom)
+
+    version = version_datos()
+    etag = etag_peticion(request, version)
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag)
+
+    try:
+        async def calcular():
+            codigos, total = await ejecutar_bd(_estaciones_en_rectangulo, rectangulo, tipo, limit)
+            rows = await ejecutar_bd(consultas.estaciones_por_codigo, codigos, campos) if codigos else []
+            return (
+                a_json([dict(zip(campos, row[1:])) for row in rows]),
+                {
+                    "X-Total-Count": str(total),
+                    "X-Bbox": ",".join(f"{x:.6f}" for x in rectangulo),
+                },
+            )
+
+        clave = ("bbox", rectangulo, tipo, limit, campos)
+        cuerpo, cabeceras = await obtener_o_calcular(clave, version, calcular)
+
+        return RespuestaJSON(cuerpo, headers={**cabeceras_cache(etag), **cabeceras})
+    
+    except BaseDatosSaturadaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la búsqueda por rectángulo: {str(e)}")
+
+def parsear_bbox(bbox: Optional[str]) -> tuple:
+    """
+    Convierte el parámetro bbox ("min_lat,min_lon,max_lat,max_lon") en una
+    tupla de floats. Sin bbox se devuelve el mundo entero.
+
+    Raises:
+        HTTPException: 400 si el formato o las coordenadas no son válidos
+    """
+    if not bbox:
+        return (-LAT_MAX_MERCATOR, -180.0, LAT_MAX_MERCATOR, 180.0)
+    try:
+        min_lat, min_lon, max_lat, max_lon = (float(x) for x in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox debe tener el formato min_lat,min_lon,max_lat,max_lon")
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+        raise HTTPException(
+            status_code=400,
+            detail="bbox inválido: latitudes en [-90, 90], longitudes en [-180, 180] y mínimos <= máximos"
+        )
+    return (min_lat, min_lon, max_lat, max_lon)
+
+def _consultar_clusters(zoom, rectangulo, limite):
+    """Consulta la jerarquía de clusters (construyéndola si hace falta) desde un hilo del executor."""
+    return obtener_clusters().consultar(zoom, *rectangulo, limite=limite)
+
+@router.get(
+    "/clusters",
+    response_model=List[ClusterResponse],
+    summary="Estaciones agrupadas para el mapa",
+    description="Devuelve las estaciones de una vista del mapa agrupadas según el nivel de zoom.",
+    response_description="Grupos (centroide y número de estaciones) y estaciones sueltas del rectángulo",
+    responses={
+        200: {"headers": {
+            "X-Total-Count": {"description": "Elementos (grupos y estaciones sueltas) del rectángulo cubierto", "schema": {"type": "integer"}},
+            "X-Bbox": {"description": "Rectángulo realmente cubierto: min_lat,min_lon,max_lat,max_lon", "schema": {"type": "string"}},
+            **CABECERAS_ETAG,
+        }},
+        400: {"description": "bbox con formato o coordenadas inválidas"},
+        **RESPUESTA_304
+    }
+)
+async def obtener_clusters_mapa(
+    request: Request,
+    zoom: int = Query(..., ge=0, le=22, description="Nivel de zoom del mapa (el de Leaflet/OpenStreetMap)"),
+    bbox: Optional[str] = Query(
+        None,
+        description="Rectángulo visible: min_lat,min_lon,max_lat,max_lon. Sin él, el mundo entero",
+        examples=["39.3,-0.6,39.6,-0.2"]
+    ),
+    limit: int = Query(LIMITE_CLUSTERS, ge=1, le=LIMITE_MAXIMO, description="Número máximo de elementos")
+):
+    """
+    Obtiene las estaciones de una vista del mapa agrupadas por proximidad.
+    
+    Los grupos se precalculan tras cada carga o borrado para todos los
+    niveles de zoom hasta ZOOM_MAX_CLUSTERS (`backend/almacen/clusters.py`),
+    agrupando las estaciones que caen en una misma celda de 60 píxeles de
+    pantalla. La respuesta depende por tanto del tamaño de la vista y no del
+    número de estaciones del almacén. Por encima de ese zoom, y en cualquier
+    grupo de una sola estación, se devuelve la estación con su código,
+    nombre y tipo.
+    
+    El rectángulo se amplía a los bordes de las teselas del zoom, como en
+    /api/estaciones/bbox, y el realmente cubierto se indica en X-Bbox. Si
+    hay más elementos que `limit` se devuelve, como allí, una muestra
+    repartida por el rectángulo y X-Total-Count indica el total.
+    
+    Raises:
+        HTTPException:
+            - 400: bbox mal formado o inválido
+            - 500: Error al consultar la base de datos
+    
+    Example:
+        GET /api/clusters?zoom=6&bbox=35.5,-10.5,44.0,4.5
+        Response: [
+            {"latitud": 39.47, "longitud": -0.38, "cantidad": 42, "cod_estacion": null, ...},
+            {"latitud": 38.35, "longitud": -0.49, "cantidad": 1, "cod_estacion": 17, "nombre": "...", "tipo": "Estación_fija"},
+            ...
+        ]
+    """
+    rectangulo = ajustar_a_teselas(*parsear_bbox(bbox), zoom)
+
+    version = version_datos()
+    etag = etag_peticion(request, version)
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag)
+
+    try:
+        async def calcular():
+            grupos, total = await ejecutar_bd(_consultar_clusters, zoom, rectangulo, limit)
+
+            # Las estaciones sueltas se completan con sus datos por clave primaria
+            codigos = [cod for _, _, _, cod in grupos if cod is not None]
+            por_codigo = {}
+            if codigos:
+                rows = await ejecutar_bd(consultas.estaciones_por_codigo, codigos, ("nombre", "tipo"))
+                por_codigo = {row[0]: row[1:] for row in rows}
+
+            clusters = []
+            for lat, lon, cantidad, cod_estacion in grupos:
+                cluster = {"latitud": lat, "longitud": lon, "cantidad": cantidad}
+                if cod_estacion is not None and cod_estacion in por_codigo:
+                    nombre, tipo = por_codigo[cod_estacion]
+                    cluster.update(cod_estacion=cod_estacion, nombre=nombre, tipo=tipo)
+                clusters.append(cluster)
+
+            return (
+                a_json(clusters),
+                {
+                    "X-Total-Count": str(total),
+                    "X-Bbox": ",".join(f"{x:.6f}" for x in rectangulo),
+                },
+            )
+
+        clave = ("clusters", zoom, rectangulo, limit)
+        cuerpo, cabeceras = await obtener_o_calcular(clave, version, calcular)
+
+        return RespuestaJSON(cuerpo, headers={**cabeceras_cache(etag), **cabeceras})
+    
+    except BaseDatosSaturadaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al agrupar las estaciones: {str(e)}")
+
+def _buscar_cercanas(lat, lon, n, radio_km, tipo):
+    """Consulta el índice espacial (construyéndolo si hace falta) desde un hilo del executor."""
+    return obtener_indice().cercanas(lat, lon, n=n, radio_km=radio_km, tipo=tipo)
+
+@router.get(
+    "/cercanas",
+    response_model=List[EstacionCercanaResponse],
+    summary="Estaciones más cercanas a un punto",
+    description="Devuelve las N estaciones más cercanas a unas coordenadas, ordenadas por distancia.",
+    response_description="Estaciones ordenadas por distancia creciente, con la distancia en km",
+    responses={200: {"headers": CABECERAS_ETAG}, 400: {"description": "Campo desconocido en fields"}, **RESPUESTA_304}
+)
+async def obtener_cercanas(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90, description="Latitud del punto de búsqueda", examples=[39.4699]),
+    lon: float = Query(..., ge=-180, le=180, description="Longitud del punto de búsqueda", examples=[-0.3763]),
+    n: int = Query(10, ge=1, le=100, description="Número máximo de estaciones"),
+    radio_km: Optional[float] = Query(None, gt=0, description="Distancia máxima en km"),
+    tipo: Optional[str] = Query(
+        None,
+        description="Tipo de estación",
+        enum=["Estación_fija", "Estación_móvil", "Otros"]
+    ),
+    fields: Optional[str] = Query(None, description=DESCRIPCION_FIELDS, examples=["mapa"])
+):
+    """
+    Busca las estaciones más cercanas a un punto.
+    
+    La búsqueda se resuelve con el índice espacial en memoria
+    (`backend/almacen/indice_espacial.py`), que se reconstruye tras cada carga
+    o borrado; la base de datos solo se consulta para recuperar por clave
+    primaria los datos de las estaciones encontradas.
+    
+    Args:
+        lat, lon: Coordenadas del punto de búsqueda
+        n: Número máximo de estaciones a devolver
+        radio_km: Si se indica, solo estaciones a esa distancia o menos
+        tipo: Filtro opcional por tipo de estación
+        fields: Proyección de campos (distancia_km se incluye siempre)
+    
+    Returns:
+        List[EstacionCercanaResponse]: Estaciones ordenadas por distancia
+            haversine creciente. Las estaciones sin coordenadas no se incluyen.
+    
+    Examples:
+        - Las 5 más cercanas: GET /api/cercanas?lat=39.47&lon=-0.376&n=5
+        - Fijas a menos de 20 km: GET /api/cercanas?lat=39.47&lon=-0.376&radio_km=20&tipo=Estación_fija
+    """
+    campos = resolver_campos(fields) or consultas.CAMPOS_ESTACION
+
+    etag = etag_peticion(request)
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag)
+
+    try:
+        encontradas = await ejecutar_bd(_buscar_cercanas, lat, lon, n, radio_km, tipo)
+        estaciones = []
+        if encontradas:
+            rows = await ejecutar_bd(
+                consultas.estaciones_por_codigo, [cod for _, cod in encontradas], campos
+            )
+            por_codigo = {row[0]: row[1:] for row in rows}
+            for distancia, cod_estacion in encontradas:
+                row = por_codigo.get(cod_estacion)
+                # Puede faltar si se borró entre la búsqueda y la consulta
+                if row is not None:
+                    estacion = dict(zip(campos, row))
+                    estacion["distancia_km"] = round(distancia, 3)
+                    estaciones.append(estacion)
+
+        return RespuestaJSON(a_json(estaciones), headers=cabeceras_cache(etag))
+    
+    except BaseDatosSaturadaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la búsqueda por cercanía: {str(e)}")
+
+@router.get(
+    "/sugerencias",
+    response_model=List[SugerenciaResponse],
+    summary="Autocompletar localidades y provincias",
+    description="Devuelve las localidades o provincias cuyo nombre empieza por el prefijo indicado.",
+    response_description="Sugerencias ordenadas por número de estaciones",
+    responses={200: {"headers": CABECERAS_ETAG}, 400: {"description": "Campo desconocido"}, **RESPUESTA_304}
+)
+async def obtener_sugerencias(
+    request: Request,
+    campo: str = Query(..., description="Qué se autocompleta", enum=["localidad", "provincia"]),
+    prefijo: str = Query(..., min_length=1, max_length=100, description="Texto escrito por el usuario", examples=["val"]),
+    n: int = Query(10, ge=1, le=MAX_SUGERENCIAS, description="Número máximo de sugerencias")
+):
+    """
+    Sugiere nombres de localidades o provincias para el formulario de búsqueda.
+    
+    Se resuelve con un índice de prefijos en memoria
+    (`backend/almacen/sugerencias.py`) construido a partir de Localidad y
+    Provincia al arrancar y tras cada carga o borrado, sin consultar la base
+    de datos. El prefijo se compara sin mayúsculas ni acentos y las
+    sugerencias se ordenan por número de estaciones.
+    
+    Examples:
+        - GET /api/sugerencias?campo=localidad&prefijo=val
+        - GET /api/sugerencias?campo=provincia&prefijo=cas&n=5
+    """
+    if campo not in CAMPOS_SUGERENCIAS:
+        raise HTTPException(status_code=400, detail=f"Campo desconocido: '{campo}'. Campos válidos: {', '.join(CAMPOS_SUGERENCIAS)}")
+
+    etag = etag_peticion(request, version_datos())
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag)
+
+    try:
+        # Con el índice ya construido se responde sin pasar por el executor
+        indice = indice_sugerencias_listo(campo)
+        if indice is None:
+            indice = await ejecutar_bd(obtener_indice_sugerencias, campo)
+
+        sugerencias = [
+            {"nombre": nombre, "provincia": provincia, "estaciones": estaciones}
+            for nombre, provincia, estaciones in indice.sugerir(prefijo, n)
+        ]
+        return RespuestaJSON(a_json(sugerencias), headers=cabeceras_cache(etag))
+    
+    except BaseDatosSaturadaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener sugerencias: {str(e)}")
 
 @router.get(
     "/provincias",
     response_model=List[ProvinciaResponse],
     summary="Obtener lista de provincias",
     description="Retorna todas las provincias disponibles en la base de datos",
-    response_description="Lista de provincias ordenadas alfabéticamente por nombre"
+    response_description="Lista de provincias ordenadas alfabéticamente por nombre",
+    responses={200: {"headers": CABECERAS_ETAG}, **RESPUESTA_304}
 )
-async def obtener_provincias():
+async def obtener_provincias(request: Request):
     """
     Obtiene la lista completa de provincias disponibles en la base de datos.
     
@@ -194,35 +1190,31 @@ async def obtener_provincias():
             ...
         ]
     """
-    conn = conectar()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Error al conectar con la base de datos")
-    
+    etag = etag_peticion(request)
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag)
+
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT codigo, nombre FROM Provincia ORDER BY nombre")
-        rows = cur.fetchall()
+        rows = await ejecutar_bd(consultas.listar_provincias)
         
-        provincias = [ProvinciaResponse(codigo=row[0], nombre=row[1]) for row in rows]
-        return provincias
+        provincias = [{"codigo": row[0], "nombre": row[1]} for row in rows]
+        return RespuestaJSON(a_json(provincias), headers=cabeceras_cache(etag))
+    
+    except BaseDatosSaturadaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener provincias: {str(e)}")
-    
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
 @router.get(
     "/localidades/{provincia}",
     response_model=List[LocalidadResponse],
     summary="Obtener localidades de una provincia",
     description="Retorna todas las localidades de una provincia específica",
-    response_description="Lista de localidades ordenadas alfabéticamente por nombre"
+    response_description="Lista de localidades ordenadas alfabéticamente por nombre",
+    responses={200: {"headers": CABECERAS_ETAG}, **RESPUESTA_304}
 )
-async def obtener_localidades(provincia: str):
+async def obtener_localidades(request: Request, provincia: str):
     """
     Obtiene todas las localidades pertenecientes a una provincia específica.
     
@@ -249,33 +1241,21 @@ async def obtener_localidades(provincia: str):
             ...
         ]
     """
-    conn = conectar()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Error al conectar con la base de datos")
-    
+    etag = etag_peticion(request)
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag)
+
     try:
-        cur = conn.cursor()
-        query = """
-            SELECT l.codigo, l.nombre, p.nombre as provincia_nombre
-            FROM Localidad l
-            JOIN Provincia p ON l.codigo_provincia = p.codigo
-            WHERE LOWER(p.nombre) = LOWER(%s)
-            ORDER BY l.nombre
-        """
-        cur.execute(query, (provincia,))
-        rows = cur.fetchall()
+        rows = await ejecutar_bd(consultas.listar_localidades, provincia)
         
         localidades = [
-            LocalidadResponse(codigo=row[0], nombre=row[1], provincia=row[2]) 
+            {"codigo": row[0], "nombre": row[1], "provincia": row[2]}
             for row in rows
         ]
-        return localidades
+        return RespuestaJSON(a_json(localidades), headers=cabeceras_cache(etag))
+    
+    except BaseDatosSaturadaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener localidades: {str(e)}")
-    
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
@@ -9,9 +9,12 @@ Este módulo proporciona endpoints REST para:
 La carga de datos se realiza de forma asíncrona y paralela para múltiples comunidades.
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from backend.models import CargaRequest, CargaResponse, EstadoAlmacenResponse
-from backend.almacen.database import conectar
+from backend.almacen.database import obtener_conexion, ejecutar_bd, BaseDatosSaturadaError
+from backend.api.admision import admision
+from backend.almacen.version import notificar_cambio_datos
+from backend.almacen.estado import estado_almacen
 import httpx
 import asyncio
 
@@ -19,7 +22,8 @@ router = APIRouter(
     prefix="/api",
     tags=["Carga de Datos"],
     responses={
-        500: {"description": "Error interno del servidor o de base de datos"}
+        500: {"description": "Error interno del servidor o de base de datos"},
+        503: {"description": "Servidor saturado: cupo de admisión lleno, sin conexiones libres o consulta demasiado larga"}
     }
 )
 
@@ -46,7 +50,8 @@ async def call_wrapper(url: str):
     response_model=CargaResponse,
     summary="Cargar datos de estaciones ITV",
     description="Carga datos de estaciones desde archivos fuente de las comunidades seleccionadas. La carga se realiza en paralelo.",
-    response_description="Resumen de la carga con estadísticas por comunidad"
+    response_description="Resumen de la carga con estadísticas por comunidad",
+    dependencies=[Depends(admision("carga"))]
 )
 async def cargar_datos(request: CargaRequest):
     """
@@ -124,6 +129,10 @@ async def cargar_datos(request: CargaRequest):
         
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
+        # Los wrappers ya han confirmado sus inserciones (aunque alguno haya
+        # fallado, otros pueden haber insertado): invalida cachés y ETags
+        await ejecutar_bd(notificar_cambio_datos)
+
         for label, result in zip(labels, results):
             if isinstance(result, Exception):
                 mensajes.append(f"Error en {label.capitalize()}: {str(result)}")
@@ -149,11 +158,28 @@ async def cargar_datos(request: CargaRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en la carga de datos: {str(e)}")
 
+def _borrar_tablas():
+    """Borra Estacion, Localidad y Provincia en una transacción y devuelve las filas borradas de cada una."""
+    with obtener_conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM Estacion")
+            estaciones_borradas = cur.rowcount
+            
+            cur.execute("DELETE FROM Localidad")
+            localidades_borradas = cur.rowcount
+            
+            cur.execute("DELETE FROM Provincia")
+            provincias_borradas = cur.rowcount
+        
+        conn.commit()
+    return estaciones_borradas, localidades_borradas, provincias_borradas
+
 @router.delete(
     "/almacen",
     summary="Borrar todos los datos del almacén",
     description="Elimina todas las estaciones, localidades y provincias de la base de datos",
-    response_description="Confirmación del borrado con cantidad de registros eliminados"
+    response_description="Confirmación del borrado con cantidad de registros eliminados",
+    dependencies=[Depends(admision("carga"))]
 )
 async def borrar_almacen():
     """
@@ -194,23 +220,11 @@ async def borrar_almacen():
         }
     """
 
-    conn = conectar()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Error al conectar con la base de datos")
-    
     try:
-        cur = conn.cursor()
-        
-        cur.execute("DELETE FROM Estacion")
-        estaciones_borradas = cur.rowcount
-        
-        cur.execute("DELETE FROM Localidad")
-        localidades_borradas = cur.rowcount
-        
-        cur.execute("DELETE FROM Provincia")
-        provincias_borradas = cur.rowcount
-        
-        conn.commit()
+        # En el executor: esperar conexión y los DELETE no bloquean las búsquedas
+        estaciones_borradas, localidades_borradas, provincias_borradas = await ejecutar_bd(_borrar_tablas)
+
+        await ejecutar_bd(notificar_cambio_datos)
         
         return {
             "success": True,
@@ -222,15 +236,55 @@ async def borrar_almacen():
             }
         }
     
+    except BaseDatosSaturadaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
     except Exception as e:
-        if conn:
-            conn.rollback()
+        # El pool deshace la transacción al recuperar la conexión
         raise HTTPException(status_code=500, detail=f"Error al borrar el almacén: {str(e)}")
-    
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
-
 
+@router.get(
+    "/estado",
+    response_model=EstadoAlmacenResponse,
+    summary="Obtener estadísticas del almacén",
+    description="Retorna el número de estaciones, provincias y localidades, y las estaciones por tipo",
+    response_description="Recuentos del almacén",
+    dependencies=[Depends(admision("busqueda"))]
+)
+async def obtener_estado():
+    """
+    Obtiene las estadísticas del almacén de datos.
+    
+    Los recuentos no se calculan en cada petición: se mantienen en memoria y
+    se recalculan con una única consulta agrupada tras cada carga o borrado
+    (ver `backend/almacen/estado.py`), así que el coste no crece con el almacén.
+    
+    Returns:
+        EstadoAlmacenResponse: Objeto con:
+            - total_estaciones: Número total de estaciones
+            - total_provincias: Número total de provincias
+            - total_localidades: Número total de localidades
+            - estaciones_por_tipo: Diccionario tipo -> número de estaciones
+    
+    Raises:
+        HTTPException:
+            - 500: Si hay error al consultar la base de datos
+    
+    Example:
+        GET /api/estado
+        
+        Response: {
+            "total_estaciones": 150,
+            "total_provincias": 12,
+            "total_localidades": 45,
+            "estaciones_por_tipo": {"Estación_fija": 140, "Estación_móvil": 8, "Otros": 2}
+        }
+    """
+    try:
+        return EstadoAlmacenResponse(**await ejecutar_bd(estado_almacen))
+    
+    except BaseDatosSaturadaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener el estado del almacén: {str(e)}")
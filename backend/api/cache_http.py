@@ -0,0 +1,81 @@
+"""
+Caché HTTP condicional (ETag / If-None-Match) para los endpoints de lectura.
+
+El ETag de una respuesta se deriva de la versión de los datos
+(`backend.almacen.version`) y de la ruta con sus parámetros, así que no hace
+falta consultar la base de datos para calcularlo. Si el cliente envía un
+If-None-Match que coincide se responde 304 sin tocar la base de datos.
+
+Uso en un endpoint:
+
+    etag = etag_peticion(request)
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag)
+    ...
+    return RespuestaJSON(cuerpo, headers=cabeceras_cache(etag))
+"""
+
+import hashlib
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from backend.almacen.version import version_datos
+
+# Los datos pueden cambiar en cualquier momento por una carga: el cliente puede
+# guardar la respuesta pero debe revalidarla siempre con If-None-Match.
+CACHE_CONTROL = "no-cache"
+
+CABECERAS_ETAG = {
+    "ETag": {"description": "Versión de la respuesta; enviarla en If-None-Match para obtener 304 si no ha cambiado", "schema": {"type": "string"}},
+    "Cache-Control": {"description": "Siempre no-cache: la respuesta se puede guardar pero hay que revalidarla", "schema": {"type": "string"}},
+}
+
+RESPUESTA_304 = {304: {"description": "Los datos no han cambiado desde el ETag indicado en If-None-Match"}}
+
+def etag_peticion(request: Request, version: str = None) -> str:
+    """ETag fuerte para la versión de los datos (la actual por defecto) y la URL pedida."""
+    url = request.url.path
+    if request.url.query:
+        url += "?" + request.url.query
+    resumen = hashlib.blake2s(url.encode("utf-8"), digest_size=8).hexdigest()
+    return f'"{version or version_datos()}-{resumen}"'
+
+def no_modificado(request: Request, etag: str) -> bool:
+    """
+    Indica si el If-None-Match de la petición coincide con el ETag.
+
+    Sigue la comparación débil de RFC 9110 (se ignora el prefijo W/) y
+    acepta '*' y listas de ETags separadas por comas.
+    """
+    cabecera = request.headers.get("if-none-match")
+    if not cabecera:
+        return False
+    if cabecera.strip() == "*":
+        return True
+    for valor in cabecera.split(","):
+        valor = valor.strip()
+        if valor.startswith("W/"):
+            valor = valor[2:]
+        if valor == etag:
+            return True
+    return False
+
+def cabeceras_cache(etag: str) -> dict:
+    """Cabeceras de caché que acompañan a una respuesta 200 o 304."""
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+def respuesta_no_modificada(etag: str, vary: Optional[str] = None) -> Response:
+    """
+    Respuesta 304 sin cuerpo.
+
+    Args:
+        etag: ETag de la respuesta que se revalida
+        vary: Cabecera Vary de la respuesta 200, si el cuerpo depende de
+            cabeceras de la petición; el 304 debe llevar la misma
+    """
+    cabeceras = cabeceras_cache(etag)
+    if vary:
+        cabeceras["Vary"] = vary
+    return Response(status_code=304, headers=cabeceras)
@@ -0,0 +1,171 @@
+"""
+Caché en memoria de resultados de búsqueda ya serializados.
+
+Guarda el JSON (bytes) de cada página de /api/buscar y /api/estaciones junto
+con sus cabeceras de paginación, indexado por los filtros normalizados y la
+página. Las entradas caducan por TTL y, si se supera el límite de memoria, se
+expulsan las menos usadas recientemente (LRU).
+
+La caché se vacía entera cuando cambia la versión de los datos (carga o
+borrado del almacén). Cada entrada recuerda la versión con la que se calculó
+y `guardar` descarta resultados de una versión anterior, de modo que una
+consulta que empezó antes de una carga no puede repoblar la caché con datos
+viejos después de invalidarla.
+
+`obtener_o_calcular` combina la caché con `backend.api.coalescencia`: los
+fallos simultáneos de una misma clave comparten una única consulta.
+
+Parámetros en la sección opcional [cache] de config.ini: max_mb y ttl.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Optional, Tuple
+
+from backend.almacen.database import cargar_seccion
+from backend.almacen.version import suscribir_cambios, version_datos
+from backend.api.coalescencia import obtener_coalescedor
+
+class CacheResultados:
+    """
+    Caché LRU con TTL y límite de tamaño en bytes. Segura entre hilos.
+
+    Args:
+        max_bytes: Tamaño máximo de los cuerpos guardados
+        ttl: Segundos que una entrada es válida
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # clave -> (caduca_en, version, cuerpo, cabeceras)
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._stats = {
+            'aciertos': 0,
+            'fallos': 0,
+            'expulsiones': 0,
+            'caducadas': 0,
+            'invalidaciones': 0,
+        }
+
+    def obtener(self, clave: Hashable, version: str) -> Optional[Tuple[bytes, dict]]:
+        """
+        Devuelve (cuerpo, cabeceras) si la clave está en caché para la versión
+        de datos `version` y no ha caducado.
+
+        Comprobar la versión cierra el hueco entre el incremento de la versión
+        y la llamada a `invalidar`: en ese intervalo no se sirven datos viejos.
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self._stats['fallos'] += 1
+                return None
+            caduca_en, version_entrada, cuerpo, cabeceras = entrada
+            if version_entrada != version or caduca_en <= time.monotonic():
+                self._quitar(clave)
+                self._stats['caducadas'] += 1
+                self._stats['fallos'] += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self._stats['aciertos'] += 1
+            return cuerpo, cabeceras
+
+    def guardar(self, clave: Hashable, cuerpo: bytes, cabeceras: dict, version: str):
+        """
+        Guarda un resultado calculado con la versión de datos `version`.
+
+        Si la versión ya no es la actual, o el cuerpo no cabe en la caché,
+        no se guarda.
+        """
+        tamano = len(cuerpo)
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            if version != version_datos():
+                return
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = (time.monotonic() + self.ttl, version, cuerpo, cabeceras)
+            self._bytes += tamano
+            while self._bytes > self.max_bytes:
+                antigua = next(iter(self._entradas))
+                self._quitar(antigua)
+                self._stats['expulsiones'] += 1
+
+    def invalidar(self, version: str = None):
+        """Vacía la caché. Se registra como suscriptor de los cambios de datos."""
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+            self._stats['invalidaciones'] += 1
+
+    def estadisticas(self):
+        """Devuelve un resumen del estado de la caché."""
+        with self._lock:
+            consultas = self._stats['aciertos'] + self._stats['fallos']
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                **self._stats,
+                'tasa_aciertos': round(self._stats['aciertos'] / consultas, 3) if consultas else 0.0,
+            }
+
+    def _quitar(self, clave):
+        """Elimina una entrada. Debe llamarse con el lock adquirido."""
+        _, _, cuerpo, _ = self._entradas.pop(clave)
+        self._bytes -= len(cuerpo)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def obtener_cache() -> CacheResultados:
+    """
+    Devuelve la caché global del proceso, creándola en el primer uso.
+
+    El tamaño y el TTL se leen de la sección opcional [cache] de config.ini:
+    max_mb (64 por defecto) y ttl en segundos (300 por defecto).
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            opciones = cargar_seccion('cache')
+            _cache = CacheResultados(
+                max_bytes=int(float(opciones.get('max_mb', 64)) * 1024 * 1024),
+                ttl=float(opciones.get('ttl', 300.0)),
+            )
+            suscribir_cambios(_cache.invalidar)
+        return _cache
+
+async def obtener_o_calcular(clave: Hashable, version: str,
+                             calcular: Callable[[], Awaitable[Tuple[bytes, dict]]]) -> Tuple[bytes, dict]:
+    """
+    Devuelve (cuerpo, cabeceras) de la caché o, si no está, de `calcular()`.
+
+    Las peticiones simultáneas con la misma clave y versión que fallan en la
+    caché esperan un único cálculo, que guarda el resultado antes de
+    terminar: quien llegue después ya lo encuentra en la caché.
+    """
+    cache = obtener_cache()
+    guardado = cache.obtener(clave, version)
+    if guardado is not None:
+        return guardado
+
+    async def calcular_y_guardar():
+        resultado = await calcular()
+        cache.guardar(clave, *resultado, version)
+        return resultado
+
+    return await obtener_coalescedor().ejecutar((clave, version), calcular_y_guardar)
+
+def estadisticas_cache():
+    """Estadísticas de la caché global, o None si aún no se ha creado."""
+    if _cache is None:
+        return None
+    return _cache.estadisticas()
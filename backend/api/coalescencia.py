@@ -0,0 +1,80 @@
+"""
+Coalescencia de peticiones idénticas simultáneas ("single-flight").
+
+Al arrancar, cada cliente de escritorio descarga el catálogo completo desde el
+mapa y desde la pestaña de búsqueda, y con varios clientes llegan a la vez
+decenas de peticiones iguales. Mientras la primera está calculándose la caché
+de resultados sigue vacía, así que sin coalescencia todas irían a PostgreSQL.
+
+`Coalescedor.ejecutar` agrupa las peticiones por clave: la primera lanza el
+cálculo (consulta y serialización) como una tarea aparte y las que llegan
+mientras sigue en curso esperan esa misma tarea y reciben los mismos bytes.
+Un error se propaga a todas las que esperaban. La tarea no depende de la
+petición que la lanzó: si esa petición se cancela, las demás siguen esperando
+el resultado.
+
+Las claves incluyen la versión de los datos, de modo que una petición que
+llega tras una carga nunca se une a una consulta que empezó antes.
+
+El coalescedor solo se usa desde el bucle de eventos del servidor, por eso no
+necesita lock.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+class Coalescedor:
+    """Agrupa los cálculos simultáneos con la misma clave en uno solo."""
+
+    def __init__(self):
+        self._en_vuelo: Dict[Hashable, asyncio.Future] = {}
+        self._stats = {
+            'ejecuciones': 0,
+            'coalescidas': 0,
+            'errores': 0,
+        }
+
+    async def ejecutar(self, clave: Hashable, calcular: Callable[[], Awaitable[T]]) -> T:
+        """
+        Devuelve el resultado de `calcular()`, compartiendo el cálculo con las
+        demás llamadas con la misma clave que lleguen mientras esté en curso.
+        """
+        tarea = self._en_vuelo.get(clave)
+        if tarea is None:
+            tarea = asyncio.ensure_future(calcular())
+            self._en_vuelo[clave] = tarea
+            tarea.add_done_callback(lambda t: self._terminar(clave, t))
+            self._stats['ejecuciones'] += 1
+        else:
+            self._stats['coalescidas'] += 1
+        # shield: cancelar a quien espera no cancela el cálculo compartido
+        return await asyncio.shield(tarea)
+
+    def _terminar(self, clave: Hashable, tarea: asyncio.Future):
+        """Retira la tarea terminada y cuenta los errores."""
+        if self._en_vuelo.get(clave) is tarea:
+            del self._en_vuelo[clave]
+        if not tarea.cancelled() and tarea.exception() is not None:
+            self._stats['errores'] += 1
+
+    def estadisticas(self):
+        """Devuelve un resumen de la coalescencia."""
+        peticiones = self._stats['ejecuciones'] + self._stats['coalescidas']
+        return {
+            'en_vuelo': len(self._en_vuelo),
+            **self._stats,
+            'tasa_coalescidas': round(self._stats['coalescidas'] / peticiones, 3) if peticiones else 0.0,
+        }
+
+
+_coalescedor = Coalescedor()
+
+def obtener_coalescedor() -> Coalescedor:
+    """Devuelve el coalescedor global del proceso."""
+    return _coalescedor
+
+def estadisticas_coalescencia():
+    """Estadísticas del coalescedor global."""
+    return _coalescedor.estadisticas()
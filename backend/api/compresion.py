@@ -0,0 +1,357 @@
+"""
+Compresión de las respuestas negociada con Accept-Encoding.
+
+El JSON de las estaciones repite en cada fila los mismos nombres de campo,
+provincias, tipos y URLs, y se comprime diez veces o más. `CompresionMiddleware`
+elige la mejor codificación que acepta el cliente (zstd, br o gzip, en ese
+orden de preferencia a igual `q`) y comprime las respuestas JSON, NDJSON y de
+texto que superan un tamaño mínimo. brotli y zstandard son opcionales: sin
+ellos solo se ofrece gzip.
+
+- Respuestas completas: se comprimen enteras. Si llevan ETag (todas las de
+  búsqueda, que dependen de la URL y de la versión de los datos) el
+  resultado se guarda en una `CacheResultados` propia indexada por
+  (ETag, codificación), así que la misma respuesta no se vuelve a comprimir
+  en cada petición; los fallos simultáneos comparten una sola compresión con
+  un `Coalescedor`. La caché se vacía cuando cambian los datos.
+- Respuestas por partes (el modo flujo NDJSON): cada parte se comprime y se
+  vacía del compresor antes de enviarla, de modo que el cliente puede
+  descomprimir y procesar cada lote en cuanto llega.
+
+Los cuerpos grandes se comprimen en un hilo para no bloquear el bucle de
+eventos. Las respuestas comprimibles a una petición que acepta alguna
+codificación llevan `Vary: Accept-Encoding` y su ETag pasa a débil (`W/`),
+como hace nginx, aunque por su tamaño se envíen sin comprimir: sigue
+sirviendo para If-None-Match, porque `cache_http.no_modificado` compara en
+modo débil. Sus 304 llevan las mismas cabeceras.
+
+Parámetros en la sección opcional [compresion] de config.ini: activada
+(true por defecto), minimo (bytes, 1024 por defecto), max_mb y ttl de la
+caché de cuerpos comprimidos (32 MB y 300 s) y nivel_gzip, nivel_br y
+nivel_zstd (6, 5 y 3).
+"""
+
+import asyncio
+import gzip
+import zlib
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+
+from backend.almacen.database import cargar_seccion, opcion_booleana
+from backend.almacen.version import suscribir_cambios, version_datos
+from backend.api.cache_resultados import CacheResultados
+from backend.api.coalescencia import Coalescedor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Codificaciones disponibles, de más a menos preferida
+CODIFICACIONES = tuple(
+    codificacion for codificacion, modulo in (("zstd", zstandard), ("br", brotli), ("gzip", gzip))
+    if modulo is not None
+)
+
+# Tipos de contenido que merece la pena comprimir
+TIPOS_COMPRIMIBLES = ("application/json", "application/x-ndjson", "application/javascript", "text/")
+
+# A partir de este tamaño la compresión se hace en un hilo aparte
+BYTES_EN_HILO = 256 * 1024
+
+def elegir_codificacion(cabecera: Optional[str]) -> Optional[str]:
+    """
+    Elige la codificación para un Accept-Encoding, o None para enviar sin comprimir.
+
+    Respeta los valores q (q=0 rechaza una codificación) y el comodín `*`;
+    a igual q gana el orden de CODIFICACIONES.
+
+    Example:
+        >>> elegir_codificacion("gzip, deflate, br;q=0.9")
+        'gzip'
+    """
+    if not cabecera:
+        return None
+    calidades = {}
+    for parte in cabecera.split(","):
+        nombre, _, parametros = parte.partition(";")
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        calidad = 1.0
+        for parametro in parametros.split(";"):
+            clave, _, valor = parametro.partition("=")
+            if clave.strip().lower() == "q":
+                try:
+                    calidad = float(valor)
+                except ValueError:
+                    calidad = 0.0
+        calidades["gzip" if nombre == "x-gzip" else nombre] = calidad
+
+    elegida, mejor = None, 0.0
+    for codificacion in CODIFICACIONES:
+        calidad = calidades.get(codificacion, calidades.get("*", 0.0))
+        if calidad > mejor:
+            elegida, mejor = codificacion, calidad
+    return elegida
+
+def comprimir(datos: bytes, codificacion: str, nivel: int) -> bytes:
+    """Comprime un cuerpo completo con una de las CODIFICACIONES."""
+    if codificacion == "zstd":
+        return zstandard.ZstdCompressor(level=nivel).compress(datos)
+    if codificacion == "br":
+        return brotli.compress(datos, quality=nivel)
+    # mtime=0: la misma respuesta produce siempre los mismos bytes
+    return gzip.compress(datos, compresslevel=nivel, mtime=0)
+
+class CompresorFlujo:
+    """
+    Compresor de una respuesta por partes: cada parte sale vaciada del
+    compresor, de modo que el cliente puede descomprimirla sin esperar al resto.
+    """
+
+    def __init__(self, codificacion: str, nivel: int):
+        self.codificacion = codificacion
+        if codificacion == "zstd":
+            self._compresor = zstandard.ZstdCompressor(level=nivel).compressobj()
+        elif codificacion == "br":
+            self._compresor = brotli.Compressor(quality=nivel)
+        else:
+            self._compresor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def parte(self, datos: bytes) -> bytes:
+        """Comprime una parte y devuelve todo lo que ya se puede enviar."""
+        if self.codificacion == "zstd":
+            return self._compresor.compress(datos) + self._compresor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.codificacion == "br":
+            return self._compresor.process(datos) + self._compresor.flush()
+        return self._compresor.compress(datos) + self._compresor.flush(zlib.Z_SYNC_FLUSH)
+
+    def terminar(self) -> bytes:
+        """Cierra el flujo comprimido."""
+        if self.codificacion == "br":
+            return self._compresor.finish()
+        return self._compresor.flush()
+
+async def _en_hilo_si_grande(tamano: int, funcion, *args):
+    """Ejecuta `funcion` en un hilo si el cuerpo es grande; si no, directamente."""
+    if tamano < BYTES_EN_HILO:
+        return funcion(*args)
+    return await asyncio.get_running_loop().run_in_executor(None, funcion, *args)
+
+def comprimible(cabeceras: MutableHeaders) -> bool:
+    """Indica si una respuesta es de un tipo comprimible y aún no está codificada."""
+    tipo = cabeceras.get("content-type", "").split(";")[0].strip().lower()
+    return (
+        tipo.startswith(TIPOS_COMPRIMIBLES)
+        and "content-encoding" not in cabeceras
+        and "no-transform" not in cabeceras.get("cache-control", "")
+    )
+
+_opciones = None
+
+def opciones_compresion():
+    """Opciones de la sección [compresion] de config.ini, leídas una vez."""
+    global _opciones
+    if _opciones is None:
+        seccion = cargar_seccion('compresion')
+        _opciones = {
+            'activada': opcion_booleana('compresion', 'activada', defecto=True),
+            'minimo': int(seccion.get('minimo', 1024)),
+            'max_bytes': int(float(seccion.get('max_mb', 32)) * 1024 * 1024),
+            'ttl': float(seccion.get('ttl', 300.0)),
+            'niveles': {
+                'gzip': int(seccion.get('nivel_gzip', 6)),
+                'br': int(seccion.get('nivel_br', 5)),
+                'zstd': int(seccion.get('nivel_zstd', 3)),
+            },
+        }
+    return _opciones
+
+_cache = None
+_coalescedor = Coalescedor()
+_stats = {}
+
+def obtener_cache_compresion() -> CacheResultados:
+    """Caché de cuerpos comprimidos por (ETag, codificación), creada en el primer uso."""
+    global _cache
+    if _cache is None:
+        opciones = opciones_compresion()
+        _cache = CacheResultados(max_bytes=opciones['max_bytes'], ttl=opciones['ttl'])
+        suscribir_cambios(_cache.invalidar)
+    return _cache
+
+def _contar(codificacion: str, original: int, enviado: int):
+    stats = _stats.setdefault(codificacion, {'respuestas': 0, 'bytes_originales': 0, 'bytes_enviados': 0})
+    stats['respuestas'] += 1
+    stats['bytes_originales'] += original
+    stats['bytes_enviados'] += enviado
+
+async def comprimir_con_cache(cuerpo: bytes, codificacion: str, etag: Optional[str]) -> bytes:
+    """
+    Comprime un cuerpo completo, reutilizando la compresión guardada si la
+    respuesta tiene ETag.
+    """
+    nivel = opciones_compresion()['niveles'][codificacion]
+    if not etag:
+        return await _en_hilo_si_grande(len(cuerpo), comprimir, cuerpo, codificacion, nivel)
+
+    cache = obtener_cache_compresion()
+    clave = (etag, codificacion)
+    version = version_datos()
+    guardado = cache.obtener(clave, version)
+    if guardado is not None:
+        return guardado[0]
+
+    async def comprimir_y_guardar():
+        comprimido = await _en_hilo_si_grande(len(cuerpo), comprimir, cuerpo, codificacion, nivel)
+        cache.guardar(clave, comprimido, {}, version)
+        return comprimido
+
+    return await _coalescedor.ejecutar((clave, version), comprimir_y_guardar)
+
+
+def _debilitar_etag(cabeceras: MutableHeaders):
+    """Pasa a débil (W/) el ETag de una respuesta, si lo tiene."""
+    etag = cabeceras.get("etag")
+    if etag and not etag.startswith("W/"):
+        cabeceras["ETag"] = "W/" + etag
+
+
+class CompresionMiddleware:
+    """
+    Middleware ASGI que comprime las respuestas según el Accept-Encoding de
+    cada petición (ver la documentación del módulo).
+
+    Args:
+        app: Aplicación ASGI envuelta
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not opciones_compresion()['activada']:
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = None
+        for nombre, valor in scope["headers"]:
+            if nombre == b"accept-encoding":
+                accept_encoding = valor.decode("latin-1")
+                break
+        codificacion = elegir_codificacion(accept_encoding)
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _EnvioComprimido(send, codificacion).enviar)
+
+
+class _EnvioComprimido:
+    """Sustituto de `send` de una petición: comprime el cuerpo antes de enviarlo."""
+
+    def __init__(self, send, codificacion: str):
+        self.send = send
+        self.codificacion = codificacion
+        self.inicio = None
+        # None hasta el primer fragmento del cuerpo; luego "directo" o "flujo"
+        self.modo = None
+        self.flujo = None
+        self.original = 0
+        self.enviado = 0
+
+    async def enviar(self, mensaje):
+        if mensaje["type"] == "http.response.start":
+            # Las cabeceras dependen de si el cuerpo se comprime: se esperan a él
+            self.inicio = mensaje
+            return
+        if mensaje["type"] != "http.response.body":
+            await self.send(mensaje)
+            return
+
+        cuerpo = mensaje.get("body", b"")
+        mas = mensaje.get("more_body", False)
+        if self.modo is None:
+            await self._primer_fragmento(cuerpo, mas, mensaje)
+        elif self.modo == "flujo":
+            await self._fragmento_flujo(cuerpo, mas)
+        else:
+            await self.send(mensaje)
+
+    async def _primer_fragmento(self, cuerpo: bytes, mas: bool, mensaje):
+        inicio = self.inicio
+        cabeceras = MutableHeaders(scope=inicio)
+        if inicio["status"] == 304:
+            # Mismas cabeceras de variante que el 200 que revalida: una caché
+            # compartida no debe guardar el ETag fuerte para el cuerpo comprimido
+            cabeceras.add_vary_header("Accept-Encoding")
+            _debilitar_etag(cabeceras)
+        if inicio["status"] in (204, 304) or not comprimible(cabeceras):
+            self.modo = "directo"
+            await self.send(inicio)
+            await self.send(mensaje)
+            return
+
+        # La respuesta depende del Accept-Encoding aunque esta vez no se comprima;
+        # el ETag es débil en ambos casos para que coincida con el de sus 304
+        cabeceras.add_vary_header("Accept-Encoding")
+        etag = cabeceras.get("etag")
+        _debilitar_etag(cabeceras)
+        if not mas and len(cuerpo) < opciones_compresion()['minimo']:
+            self.modo = "directo"
+            await self.send(inicio)
+            await self.send(mensaje)
+            return
+
+        cabeceras["Content-Encoding"] = self.codificacion
+
+        if not mas:
+            self.modo = "directo"
+            comprimido = await comprimir_con_cache(cuerpo, self.codificacion, etag)
+            cabeceras["Content-Length"] = str(len(comprimido))
+            _contar(self.codificacion, len(cuerpo), len(comprimido))
+            await self.send(inicio)
+            await self.send({"type": "http.response.body", "body": comprimido})
+            return
+
+        self.modo = "flujo"
+        self.flujo = CompresorFlujo(self.codificacion, opciones_compresion()['niveles'][self.codificacion])
+        if "content-length" in cabeceras:
+            del cabeceras["content-length"]
+        await self.send(inicio)
+        await self._fragmento_flujo(cuerpo, mas)
+
+    async def _fragmento_flujo(self, cuerpo: bytes, mas: bool):
+        datos = await _en_hilo_si_grande(len(cuerpo), self.flujo.parte, cuerpo) if cuerpo else b""
+        if not mas:
+            datos += self.flujo.terminar()
+        self.original += len(cuerpo)
+        self.enviado += len(datos)
+        if not mas:
+            _contar(self.codificacion, self.original, self.enviado)
+        await self.send({"type": "http.response.body", "body": datos, "more_body": mas})
+
+
+def estadisticas_compresion():
+    """Respuestas y bytes antes y después de comprimir por codificación, y estado de la caché."""
+    opciones = opciones_compresion()
+    if not opciones['activada']:
+        return None
+    return {
+        'codificaciones': list(CODIFICACIONES),
+        'minimo': opciones['minimo'],
+        'por_codificacion': {
+            codificacion: {
+                **stats,
+                'ratio': round(stats['bytes_originales'] / stats['bytes_enviados'], 2) if stats['bytes_enviados'] else 0.0,
+            }
+            for codificacion, stats in _stats.items()
+        },
+        'cache': _cache.estadisticas() if _cache is not None else None,
+        'coalescencia': _coalescedor.estadisticas(),
+    }
@@ -0,0 +1,67 @@
+"""
+Serialización rápida de filas de la base de datos a JSON.
+
+Los endpoints de estaciones pueden devolver miles de filas por página. Pasar
+cada fila por `EstacionResponse` y dejar que FastAPI vuelva a validarla contra
+`response_model` cuesta más CPU que la propia consulta, así que aquí las tuplas
+de psycopg2 se convierten directamente en bytes JSON.
+
+La validación se puede omitir porque los tipos ya los garantiza el esquema
+(`NOT NULL`, coordenadas convertidas a float8 en `consultas.COLUMNAS_ESTACION`).
+Los endpoints mantienen `response_model`, de modo que el esquema OpenAPI de
+`backend/models.py` no cambia: FastAPI simplemente no serializa nada cuando
+el endpoint ya devuelve una `Response`.
+
+Si orjson está instalado se usa como codificador; si no, se recurre al módulo
+estándar json con la misma salida compacta.
+"""
+
+import json
+from typing import Iterable, Sequence
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def a_json(contenido) -> bytes:
+    """Codifica un objeto (listas, dicts, str, int, float, None) como JSON UTF-8 compacto."""
+    if orjson is not None:
+        return orjson.dumps(contenido)
+    return json.dumps(contenido, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def filas_a_json(campos: Sequence[str], filas: Iterable[Sequence]) -> bytes:
+    """
+    Convierte filas de la base de datos en un array JSON de objetos.
+
+    Args:
+        campos: Nombres de los campos, en el orden de las columnas
+        filas: Tuplas devueltas por psycopg2. Las columnas sobrantes al final
+            (p. ej. la clave de ordenación de la paginación) se ignoran.
+
+    Returns:
+        bytes: El array JSON listo para enviar
+    """
+    n = len(campos)
+    return a_json([dict(zip(campos, fila[:n])) for fila in filas])
+
+class RespuestaJSON(Response):
+    """
+    Respuesta JSON cuyo contenido ya viene codificado en bytes.
+
+    A diferencia de JSONResponse no vuelve a serializar: `content` debe ser la
+    salida de `filas_a_json` o `a_json`.
+    """
+    media_type = "application/json"
+
+def filas_a_ndjson(campos: Sequence[str], filas: Iterable[Sequence]) -> bytes:
+    """
+    Convierte filas en NDJSON: un objeto JSON por línea, cada una terminada en salto de línea.
+
+    Se usa para enviar un listado por partes; cada lote se puede decodificar
+    por separado, línea a línea, sin esperar al resto.
+    """
+    n = len(campos)
+    return b"".join(a_json(dict(zip(campos, fila[:n]))) + b"\n" for fila in filas)
@@ -11,8 +11,9 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
-from backend.almacen.database import conectar
+from backend.almacen.database import obtener_conexion
 from backend.extractores.filtros import Validate
+from backend.almacen.normalizacion import normalizar_clave
 
 def limpiar_texto(texto):
     if isinstance(texto, str):
@@ -145,7 +146,10 @@ def get_or_create_provincia(cursor, nombre_provincia):
     if resultado:
         return resultado[0]
     else:
-        cursor.execute("INSERT INTO Provincia (nombre) VALUES (%s) RETURNING codigo", (nombre_provincia,))
+        cursor.execute(
+            "INSERT INTO Provincia (nombre, nombre_normalizado) VALUES (%s, %s) RETURNING codigo",
+            (nombre_provincia, normalizar_clave(nombre_provincia))
+        )
         return cursor.fetchone()[0]
 
 def get_or_create_localidad(cursor, nombre_localidad, provincia_id):
@@ -154,7 +158,10 @@ def get_or_create_localidad(cursor, nombre_localidad, provincia_id):
     if resultado:
         return resultado[0]
     else:
-        cursor.execute("INSERT INTO Localidad (nombre, codigo_provincia) VALUES (%s, %s) RETURNING codigo", (nombre_localidad, provincia_id))
+        cursor.execute(
+            "INSERT INTO Localidad (nombre, nombre_normalizado, codigo_provincia) VALUES (%s, %s, %s) RETURNING codigo",
+            (nombre_localidad, normalizar_clave(nombre_localidad), provincia_id)
+        )
         return cursor.fetchone()[0]
 
 def leer_datos_cv():
@@ -210,169 +217,164 @@ def procesar_datos_cv():
     
     driver = iniciar_driver()
 
-    conn = None
-    cur = None
-    
-    conn = conectar()
-    cur = conn.cursor()
-    filtro = Validate(cur)
+    with obtener_conexion() as conn:
+        cur = conn.cursor()
+        filtro = Validate(cur)
 
-    contadores = {'insertados': 0, 'descartados': 0, 'cp': 0, 'coordenadas': 0, 'nombre': 0, 'provincia': 0, 'datos': 0, 'modificados': 0}
+        contadores = {'insertados': 0, 'descartados': 0, 'cp': 0, 'coordenadas': 0, 'nombre': 0, 'provincia': 0, 'datos': 0, 'modificados': 0}
 
-    try:
+        try:
 
-        total = len(datos_json)
+            total = len(datos_json)
 
-        print(f"Procesando {total} estaciones encontradas en el JSON...")
+            print(f"Procesando {total} estaciones encontradas en el JSON...")
 
-        print(f"------- Seguimiento de la ejecución -------")
+            print(f"------- Seguimiento de la ejecución -------")
 
-        for i, item in enumerate(datos_json):
+            for i, item in enumerate(datos_json):
             
-            nombre_prov = limpiar_texto(item.get('PROVINCIA'))
-            nombre_prov_final = filtro.estandarizar_nombre_provincia(nombre_prov)
-            nombre_loc = limpiar_texto(item.get('MUNICIPIO')).capitalize()
-            tipo_estacion = normalizar_tipo_estacion(item.get('TIPO ESTACIÓN'))
-
-
-            if tipo_estacion == "Estación_fija":
-                nombre_estacion = "Estación ITV de " + nombre_loc
-            elif tipo_estacion == "Estación_móvil":
-                nombre_estacion = "ITV móvil de " + nombre_prov_final
-            else:
-                nombre_estacion = limpiar_texto(item.get('DIRECCIÓN')) +' '+ nombre_prov_final
+                nombre_prov = limpiar_texto(item.get('PROVINCIA'))
+                nombre_prov_final = filtro.estandarizar_nombre_provincia(nombre_prov)
+                nombre_loc = limpiar_texto(item.get('MUNICIPIO')).capitalize()
+                tipo_estacion = normalizar_tipo_estacion(item.get('TIPO ESTACIÓN'))
+
+
+                if tipo_estacion == "Estación_fija":
+                    nombre_estacion = "Estación ITV de " + nombre_loc
+                elif tipo_estacion == "Estación_móvil":
+                    nombre_estacion = "ITV móvil de " + nombre_prov_final
+                else:
+                    nombre_estacion = limpiar_texto(item.get('DIRECCIÓN')) +' '+ nombre_prov_final
             
-            if not nombre_loc and nombre_prov:
-                nombre_loc = nombre_prov_final
+                if not nombre_loc and nombre_prov:
+                    nombre_loc = nombre_prov_final
             
 
-            if (tipo_estacion == "Estación_móvil" or tipo_estacion == "Otros"):
-                direccion = ""
-            else:
-                direccion = limpiar_texto(item.get('DIRECCIÓN'))
+                if (tipo_estacion == "Estación_móvil" or tipo_estacion == "Otros"):
+                    direccion = ""
+                else:
+                    direccion = limpiar_texto(item.get('DIRECCIÓN'))
                 
-            cp_raw = item.get('C.POSTAL')
-            codigo_postal = filtro.validar_y_formatear_cp(cp_raw, comunidad_destino='CV')
+                cp_raw = item.get('C.POSTAL')
+                codigo_postal = filtro.validar_y_formatear_cp(cp_raw, comunidad_destino='CV')
 
-            horario = limpiar_texto(item.get('HORARIOS'))
+                horario = limpiar_texto(item.get('HORARIOS'))
 
-            contacto = limpiar_texto(item.get('CORREO'))
+                contacto = limpiar_texto(item.get('CORREO'))
 
-            url_web = "www.sitval.com" 
+                url_web = "www.sitval.com" 
 
-            print(f"\nInsertando datos [{i+1}/{total}], estacion: {nombre_estacion} ({nombre_loc}, {nombre_prov})")
+                print(f"\nInsertando datos [{i+1}/{total}], estacion: {nombre_estacion} ({nombre_loc}, {nombre_prov})")
 
-            print(f"--[{i+1}/{total}] Buscando coords para: {nombre_estacion} ({nombre_loc})...")
+                print(f"--[{i+1}/{total}] Buscando coords para: {nombre_estacion} ({nombre_loc})...")
 
-            if (tipo_estacion == "Estación_móvil" or tipo_estacion == "Otros"):
-                latitud, longitud = None, None
-            else:
-                max_retries = 3
-                for attempt in range(max_retries):
-                    latitud, longitud = obtener_coordenadas(driver, direccion, nombre_loc, nombre_prov)
+                if (tipo_estacion == "Estación_móvil" or tipo_estacion == "Otros"):
+                    latitud, longitud = None, None
+                else:
+                    max_retries = 3
+                    for attempt in range(max_retries):
+                        latitud, longitud = obtener_coordenadas(driver, direccion, nombre_loc, nombre_prov)
                     
-                    if latitud is not None and longitud is not None:
-                        if abs(latitud - 40.712) < 0.1 and abs(longitud - (-74.006)) < 0.1:
-                            print(f"--Intento {attempt+1}/{max_retries}: Coordenadas incorrectas (NYC detected), reintentando...")
-                            time.sleep(2)
-                            continue
+                        if latitud is not None and longitud is not None:
+                            if abs(latitud - 40.712) < 0.1 and abs(longitud - (-74.006)) < 0.1:
+                                print(f"--Intento {attempt+1}/{max_retries}: Coordenadas incorrectas (NYC detected), reintentando...")
+                                time.sleep(2)
+                                continue
+                            else:
+                                break
                         else:
-                            break
+                            print(f"--Intento {attempt+1}/{max_retries}: Fallo al obtener coordenadas, reintentando...")
+                            time.sleep(2)
                     else:
-                        print(f"--Intento {attempt+1}/{max_retries}: Fallo al obtener coordenadas, reintentando...")
-                        time.sleep(2)
-                else:
-                    print(f"--Fallo: No se pudieron obtener coordenadas válidas tras {max_retries} intentos.")
-                    latitud, longitud = None, None
+                        print(f"--Fallo: No se pudieron obtener coordenadas válidas tras {max_retries} intentos.")
+                        latitud, longitud = None, None
 
-            if not nombre_prov or not nombre_loc:
-                print(f"--Descartado (Falta provincia/localiad).")
-                contadores['descartados'] +=1
-                contadores['datos'] += 1
-                continue 
-
-            if not nombre_estacion or filtro.es_duplicado(nombre_estacion):
-                print(f"--Descartado (Nombre duplicado), nombre duplicado: {nombre_estacion}.")
-                contadores['descartados'] += 1
-                contadores['nombre'] += 1
-                continue
-
-            if not filtro.es_provincia_real(nombre_prov_final):
-                print(f"--Descartado (Provincia no válida), nombre provincia: {nombre_prov}.")
-                contadores['descartados'] += 1
-                contadores['provincia'] += 1
-                continue
-
-            if tipo_estacion == "Estación_fija" and codigo_postal == "":
-                print(f"--Descartado (CP inválido), cp: {cp_raw}.")
-                contadores['descartados'] += 1
-                contadores['cp'] += 1
-                continue
-            
-            if (tipo_estacion == "Estación_móvil" or tipo_estacion == "Otros") and codigo_postal !="":
-                codigo_postal = ""
-                contadores['modificados'] += 1
-                print(f"--CP modificado, ya que, tipo: {tipo_estacion} no puede contener un CP.")
-
-            if tipo_estacion == "Estación_fija":
-                if not filtro.tiene_coordenadas_validas(latitud, longitud, 'CV'):
-                    print(f"--Descartado (Sin coordenadas válidas), coordenadas: ({latitud},{longitud}).")
+                if not nombre_prov or not nombre_loc:
+                    print(f"--Descartado (Falta provincia/localiad).")
+                    contadores['descartados'] +=1
+                    contadores['datos'] += 1
+                    continue 
+
+                if not nombre_estacion or filtro.es_duplicado(nombre_estacion):
+                    print(f"--Descartado (Nombre duplicado), nombre duplicado: {nombre_estacion}.")
                     contadores['descartados'] += 1
-                    contadores['coordenadas'] += 1
+                    contadores['nombre'] += 1
                     continue
-            provincia_id = get_or_create_provincia(cur, nombre_prov_final)
-            localidad_id = get_or_create_localidad(cur, nombre_loc, provincia_id)
-
-            cur.execute("""
-                INSERT INTO Estacion 
-                (nombre, tipo, direccion, codigo_postal, longitud, latitud, horario, contacto, url, codigo_localidad) 
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
-                (nombre_estacion, tipo_estacion, direccion, codigo_postal, longitud, latitud, horario, contacto, url_web, localidad_id)
-            )
-            
-            print(f"--Insertado correctamente.")
-
-            contadores['insertados'] += 1
-
-        conn.commit()
 
-        print("\n------- Resumen Final Comunidad Valenciana -------")
-        print(f"Se han insertado : {contadores['insertados']} correctamente en la base de datos.")
-        print(f"Se han descartado : {contadores['descartados']}.")
-        print(f"------- Resumen de los campos ({contadores['descartados']}) descartados. -------")
-        print(f"Se han descartado : {contadores['cp']} por tener el CP mal registrado.")
-        print(f"Se han descartado : {contadores['datos']} por falta de datos en la provincia o localiad.")
-        print(f"Se han descartado : {contadores['coordenadas']} por tener las coordenadas mal registradas.")
-        print(f"Se han descartado : {contadores['nombre']} por tener el nombre de la estación duplicado.")
-        print(f"Se han descartado : {contadores['provincia']} por tener una provincia que no existe.")
-        print(f"------- Resumen de los campos ({contadores['modificados']}) modificados. -------")
-        print(f"Se han modificado: {contadores['modificados']} por tener un CP en tipos de estación incorrectos.")
-        print(f"------- Final -------")
-
-        return {
-            'insertados': contadores['insertados'],
-            'descartados': contadores['descartados'],
-            'log': output_buffer.getvalue()
-        }
+                if not filtro.es_provincia_real(nombre_prov_final):
+                    print(f"--Descartado (Provincia no válida), nombre provincia: {nombre_prov}.")
+                    contadores['descartados'] += 1
+                    contadores['provincia'] += 1
+                    continue
 
-    except Exception as e:
-        print(f"Error en el proceso: {e}")
-        if conn: 
-            conn.rollback()
-        return {
-            'insertados': contadores.get('insertados', 0),
-            'descartados': contadores.get('descartados', 0),
-            'log': output_buffer.getvalue()
-        }
+                if tipo_estacion == "Estación_fija" and codigo_postal == "":
+                    print(f"--Descartado (CP inválido), cp: {cp_raw}.")
+                    contadores['descartados'] += 1
+                    contadores['cp'] += 1
+                    continue
+            
+                if (tipo_estacion == "Estación_móvil" or tipo_estacion == "Otros") and codigo_postal !="":
+                    codigo_postal = ""
+                    contadores['modificados'] += 1
+                    print(f"--CP modificado, ya que, tipo: {tipo_estacion} no puede contener un CP.")
+
+                if tipo_estacion == "Estación_fija":
+                    if not filtro.tiene_coordenadas_validas(latitud, longitud, 'CV'):
+                        print(f"--Descartado (Sin coordenadas válidas), coordenadas: ({latitud},{longitud}).")
+                        contadores['descartados'] += 1
+                        contadores['coordenadas'] += 1
+                        continue
+                provincia_id = get_or_create_provincia(cur, nombre_prov_final)
+                localidad_id = get_or_create_localidad(cur, nombre_loc, provincia_id)
+
+                cur.execute("""
+                    INSERT INTO Estacion 
+                    (nombre, nombre_normalizado, tipo, direccion, codigo_postal, longitud, latitud, horario, contacto, url, codigo_localidad) 
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    (nombre_estacion, normalizar_clave(nombre_estacion), tipo_estacion, direccion, codigo_postal, longitud, latitud, horario, contacto, url_web, localidad_id)
+                )
+            
+                print(f"--Insertado correctamente.")
+
+                contadores['insertados'] += 1
+
+            conn.commit()
+
+            print("\n------- Resumen Final Comunidad Valenciana -------")
+            print(f"Se han insertado : {contadores['insertados']} correctamente en la base de datos.")
+            print(f"Se han descartado : {contadores['descartados']}.")
+            print(f"------- Resumen de los campos ({contadores['descartados']}) descartados. -------")
+            print(f"Se han descartado : {contadores['cp']} por tener el CP mal registrado.")
+            print(f"Se han descartado : {contadores['datos']} por falta de datos en la provincia o localiad.")
+            print(f"Se han descartado : {contadores['coordenadas']} por tener las coordenadas mal registradas.")
+            print(f"Se han descartado : {contadores['nombre']} por tener el nombre de la estación duplicado.")
+            print(f"Se han descartado : {contadores['provincia']} por tener una provincia que no existe.")
+            print(f"------- Resumen de los campos ({contadores['modificados']}) modificados. -------")
+            print(f"Se han modificado: {contadores['modificados']} por tener un CP en tipos de estación incorrectos.")
+            print(f"------- Final -------")
+
+            return {
+                'insertados': contadores['insertados'],
+                'descartados': contadores['descartados'],
+                'log': output_buffer.getvalue()
+            }
 
-    finally:
-        if driver: 
-            driver.quit()
-        if cur: 
-            cur.close()
-        if conn: 
-            conn.close()
+        except Exception as e:
+            print(f"Error en el proceso: {e}")
+            if conn: 
+                conn.rollback()
+            return {
+                'insertados': contadores.get('insertados', 0),
+                'descartados': contadores.get('descartados', 0),
+                'log': output_buffer.getvalue()
+            }
+
+        finally:
+            if driver: 
+                driver.quit()
+            if cur: 
+                cur.close()
 
 if __name__ == "__main__":
     result = procesar_datos_cv()
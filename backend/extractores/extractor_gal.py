@@ -24,8 +24,9 @@ import sys
 from io import StringIO
 from typing import Optional, Tuple
 
-from backend.almacen.database import conectar
+from backend.almacen.database import obtener_conexion
 from backend.extractores.filtros import Validate
+from backend.almacen.normalizacion import normalizar_clave
 
 def limpiar_texto(texto: Optional[str]) -> Optional[str]:
     """
@@ -130,7 +131,10 @@ def get_or_create_provincia(cursor, nombre_provincia: str) -> int:
     if resultado:
         return resultado[0]
     else:
-        cursor.execute("INSERT INTO Provincia (nombre) VALUES (%s) RETURNING codigo", (nombre_provincia,))
+        cursor.execute(
+            "INSERT INTO Provincia (nombre, nombre_normalizado) VALUES (%s, %s) RETURNING codigo",
+            (nombre_provincia, normalizar_clave(nombre_provincia))
+        )
         return cursor.fetchone()[0]
 
 def get_or_create_localidad(cursor, nombre_localidad: str, provincia_id: int) -> int:
@@ -154,7 +158,10 @@ def get_or_create_localidad(cursor, nombre_localidad: str, provincia_id: int) ->
     if resultado:
         return resultado[0]
     else:
-        cursor.execute("INSERT INTO Localidad (nombre, codigo_provincia) VALUES (%s, %s) RETURNING codigo", (nombre_localidad, provincia_id))
+        cursor.execute(
+            "INSERT INTO Localidad (nombre, nombre_normalizado, codigo_provincia) VALUES (%s, %s, %s) RETURNING codigo",
+            (nombre_localidad, normalizar_clave(nombre_localidad), provincia_id)
+        )
         return cursor.fetchone()[0]
     
 def leer_datos_gal() -> Optional[str]:
@@ -246,150 +253,145 @@ def procesar_datos_gal() -> dict:
             'log': output_buffer.getvalue()
         }
 
-    conn = None
-    cur = None
-
-    conn = conectar()
-    cur = conn.cursor()
-    filtro = Validate(cur)
+    with obtener_conexion() as conn:
+        cur = conn.cursor()
+        filtro = Validate(cur)
     
-    contadores = {'insertados': 0, 'descartados': 0, 'cp': 0, 'coordenadas': 0, 'nombre': 0, 'provincia': 0, 'datos': 0, 'modificados': 0}
+        contadores = {'insertados': 0, 'descartados': 0, 'cp': 0, 'coordenadas': 0, 'nombre': 0, 'provincia': 0, 'datos': 0, 'modificados': 0}
 
-    try:
+        try:
         
-        lista_estaciones = list(csv.DictReader(StringIO(datos_csv_galicia), delimiter=';'))
-        total = len(lista_estaciones)
+            lista_estaciones = list(csv.DictReader(StringIO(datos_csv_galicia), delimiter=';'))
+            total = len(lista_estaciones)
         
-        print(f"Procesando {total} estaciones encontradas en el CSV...")
+            print(f"Procesando {total} estaciones encontradas en el CSV...")
 
-        print(f"------- Seguimiento de la ejecución -------")
+            print(f"------- Seguimiento de la ejecución -------")
 
-        for i, item in enumerate(lista_estaciones):
+            for i, item in enumerate(lista_estaciones):
                 
-            nombre_estacion = limpiar_texto(item.get('NOME DA ESTACIÓN'))
+                nombre_estacion = limpiar_texto(item.get('NOME DA ESTACIÓN'))
 
-            nombre_prov = limpiar_texto(item.get('PROVINCIA'))
-            nombre_prov_final = filtro.estandarizar_nombre_provincia(nombre_prov)
+                nombre_prov = limpiar_texto(item.get('PROVINCIA'))
+                nombre_prov_final = filtro.estandarizar_nombre_provincia(nombre_prov)
 
-            nombre_loc = limpiar_texto(item.get('CONCELLO'))
+                nombre_loc = limpiar_texto(item.get('CONCELLO'))
 
-            tipo_estacion = 'Estación_fija'
+                tipo_estacion = 'Estación_fija'
 
-            direccion = limpiar_texto(item.get('ENDEREZO'))
+                direccion = limpiar_texto(item.get('ENDEREZO'))
 
-            cp_raw = item.get('CÓDIGO POSTAL')
-            codigo_postal = filtro.validar_y_formatear_cp(cp_raw, comunidad_destino='GAL')
-            horario = limpiar_texto(item.get('HORARIO'))
+                cp_raw = item.get('CÓDIGO POSTAL')
+                codigo_postal = filtro.validar_y_formatear_cp(cp_raw, comunidad_destino='GAL')
+                horario = limpiar_texto(item.get('HORARIO'))
 
-            tel = limpiar_texto(item.get('TELÉFONO'))
-            email = limpiar_texto(item.get('CORREO ELECTRÓNICO'))
+                tel = limpiar_texto(item.get('TELÉFONO'))
+                email = limpiar_texto(item.get('CORREO ELECTRÓNICO'))
 
-            contacto = f"Tel: {tel} " if tel else ""
-            if email:
-                if contacto:
-                    contacto += f"| Email: {email}"
-                else:
-                    contacto = f"Email: {email}"
+                contacto = f"Tel: {tel} " if tel else ""
+                if email:
+                    if contacto:
+                        contacto += f"| Email: {email}"
+                    else:
+                        contacto = f"Email: {email}"
                 
-            url = limpiar_texto(item.get('SOLICITUDE DE CITA PREVIA'))
+                url = limpiar_texto(item.get('SOLICITUDE DE CITA PREVIA'))
 
-            coordenadas_str = item.get('COORDENADAS GMAPS')
+                coordenadas_str = item.get('COORDENADAS GMAPS')
                 
-            if coordenadas_str and ',' in coordenadas_str:
-                partes = coordenadas_str.split(',')
-                if len(partes) == 2:
-                    latitud = convertir_coordenadas(partes[0])
-                    longitud = convertir_coordenadas(partes[1])
-
-            print(f"\nInsertando datos [{i+1}/{total}], estacion: {nombre_estacion} ({nombre_loc}, {nombre_prov})")
-
-            if not nombre_prov or not nombre_loc:
-                print(f"--Descartado (Falta provincia/localiad).")
-                contadores['descartados'] +=1
-                contadores['datos'] += 1
-                continue 
-
-            if not nombre_estacion or filtro.es_duplicado(nombre_estacion):
-                print(f"--Descartado (Nombre duplicado), nombre duplicado: {nombre_estacion}.")
-                contadores['descartados'] += 1
-                contadores['nombre'] += 1
-                continue
-
-            if not filtro.es_provincia_real(nombre_prov_final):
-                print(f"--Descartado (Provincia no válida), nombre provincia: {nombre_prov}.")
-                contadores['descartados'] += 1
-                contadores['provincia'] += 1
-                continue
-
-            if tipo_estacion == "Estación_fija" and codigo_postal == "":
-                print(f"--Descartado (CP inválido), cp: {cp_raw}.")
-                contadores['descartados'] += 1
-                contadores['cp'] += 1
-                continue
+                if coordenadas_str and ',' in coordenadas_str:
+                    partes = coordenadas_str.split(',')
+                    if len(partes) == 2:
+                        latitud = convertir_coordenadas(partes[0])
+                        longitud = convertir_coordenadas(partes[1])
+
+                print(f"\nInsertando datos [{i+1}/{total}], estacion: {nombre_estacion} ({nombre_loc}, {nombre_prov})")
+
+                if not nombre_prov or not nombre_loc:
+                    print(f"--Descartado (Falta provincia/localiad).")
+                    contadores['descartados'] +=1
+                    contadores['datos'] += 1
+                    continue 
+
+                if not nombre_estacion or filtro.es_duplicado(nombre_estacion):
+                    print(f"--Descartado (Nombre duplicado), nombre duplicado: {nombre_estacion}.")
+                    contadores['descartados'] += 1
+                    contadores['nombre'] += 1
+                    continue
+
+                if not filtro.es_provincia_real(nombre_prov_final):
+                    print(f"--Descartado (Provincia no válida), nombre provincia: {nombre_prov}.")
+                    contadores['descartados'] += 1
+                    contadores['provincia'] += 1
+                    continue
+
+                if tipo_estacion == "Estación_fija" and codigo_postal == "":
+                    print(f"--Descartado (CP inválido), cp: {cp_raw}.")
+                    contadores['descartados'] += 1
+                    contadores['cp'] += 1
+                    continue
             
-            if tipo_estacion == "Estación_móvil" or tipo_estacion == "Otros":
-                codigo_postal = ""
-                contadores['modificados'] += 1
-                print(f"--CP modificado, ya que, tipo: {tipo_estacion} no puede contener un CP.")
+                if tipo_estacion == "Estación_móvil" or tipo_estacion == "Otros":
+                    codigo_postal = ""
+                    contadores['modificados'] += 1
+                    print(f"--CP modificado, ya que, tipo: {tipo_estacion} no puede contener un CP.")
 
-            if not filtro.tiene_coordenadas_validas(latitud, longitud, 'GAL'):
-                print(f"--Descartado (Sin coordenadas válidas), coordenadas: ({latitud},{longitud}).")
-                contadores['descartados'] += 1
-                contadores['coordenadas'] += 1
-                continue
+                if not filtro.tiene_coordenadas_validas(latitud, longitud, 'GAL'):
+                    print(f"--Descartado (Sin coordenadas válidas), coordenadas: ({latitud},{longitud}).")
+                    contadores['descartados'] += 1
+                    contadores['coordenadas'] += 1
+                    continue
 
                 
-            provincia_id = get_or_create_provincia(cur, nombre_prov_final)
-            localidad_id = get_or_create_localidad(cur, nombre_loc, provincia_id)
+                provincia_id = get_or_create_provincia(cur, nombre_prov_final)
+                localidad_id = get_or_create_localidad(cur, nombre_loc, provincia_id)
             
-            cur.execute("""
-                INSERT INTO Estacion 
-                (nombre, tipo, direccion, codigo_postal, longitud, latitud, horario, contacto, url, codigo_localidad) 
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
-                (nombre_estacion, tipo_estacion, direccion, codigo_postal, longitud, latitud, horario, contacto, url, localidad_id)
-            )
+                cur.execute("""
+                    INSERT INTO Estacion 
+                    (nombre, nombre_normalizado, tipo, direccion, codigo_postal, longitud, latitud, horario, contacto, url, codigo_localidad) 
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    (nombre_estacion, normalizar_clave(nombre_estacion), tipo_estacion, direccion, codigo_postal, longitud, latitud, horario, contacto, url, localidad_id)
+                )
                 
-            print(f"--Insertado correctamente.")
+                print(f"--Insertado correctamente.")
 
-            contadores['insertados'] += 1
+                contadores['insertados'] += 1
 
-        conn.commit()
+            conn.commit()
         
-        print("\n------- Resumen Final Galicia -------")
-        print(f"Se han insertado : {contadores['insertados']} correctamente en la base de datos.")
-        print(f"Se han descartado : {contadores['descartados']}.")
-        print(f"------- Resumen de los campos ({contadores['descartados']}) descartados. -------")
-        print(f"Se han descartado : {contadores['cp']} por tener el CP mal registrado.")
-        print(f"Se han descartado : {contadores['datos']} por falta de datos en la provincia o localiad.")
-        print(f"Se han descartado : {contadores['coordenadas']} por tener las coordenadas mal registradas.")
-        print(f"Se han descartado : {contadores['nombre']} por tener el nombre de la estación duplicado.")
-        print(f"Se han descartado : {contadores['provincia']} por tener una provincia que no existe.")
-        print(f"------- Resumen de los campos ({contadores['modificados']}) modificados. -------")
-        print(f"Se han modificado: {contadores['modificados']} por tener un CP en tipos de estación incorrectos.")
-        print(f"------- Final -------")
+            print("\n------- Resumen Final Galicia -------")
+            print(f"Se han insertado : {contadores['insertados']} correctamente en la base de datos.")
+            print(f"Se han descartado : {contadores['descartados']}.")
+            print(f"------- Resumen de los campos ({contadores['descartados']}) descartados. -------")
+            print(f"Se han descartado : {contadores['cp']} por tener el CP mal registrado.")
+            print(f"Se han descartado : {contadores['datos']} por falta de datos en la provincia o localiad.")
+            print(f"Se han descartado : {contadores['coordenadas']} por tener las coordenadas mal registradas.")
+            print(f"Se han descartado : {contadores['nombre']} por tener el nombre de la estación duplicado.")
+            print(f"Se han descartado : {contadores['provincia']} por tener una provincia que no existe.")
+            print(f"------- Resumen de los campos ({contadores['modificados']}) modificados. -------")
+            print(f"Se han modificado: {contadores['modificados']} por tener un CP en tipos de estación incorrectos.")
+            print(f"------- Final -------")
         
-        return {
-            'insertados': contadores['insertados'],
-            'descartados': contadores['descartados'],
-            'log': output_buffer.getvalue()
-        }
-
-    except Exception as e:
-        print(f"Error en el proceso: {e}")
-        if conn:
-            conn.rollback()
-        return {
-            'insertados': contadores.get('insertados', 0),
-            'descartados': contadores.get('descartados', 0),
-            'log': output_buffer.getvalue()
-        }
-
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+            return {
+                'insertados': contadores['insertados'],
+                'descartados': contadores['descartados'],
+                'log': output_buffer.getvalue()
+            }
+
+        except Exception as e:
+            print(f"Error en el proceso: {e}")
+            if conn:
+                conn.rollback()
+            return {
+                'insertados': contadores.get('insertados', 0),
+                'descartados': contadores.get('descartados', 0),
+                'log': output_buffer.getvalue()
+            }
+
+        finally:
+            if cur:
+                cur.close()
 
 if __name__ == "__main__":
     result = procesar_datos_gal()
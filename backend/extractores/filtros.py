@@ -16,9 +16,10 @@ Comunidades soportadas:
 - Cataluña (CAT): Barcelona, Girona, Lleida, Tarragona
 """
 
-import unicodedata
 from typing import Optional
 
+from backend.almacen.normalizacion import normalizar_clave
+
 class Validate:
     """
     Clase de validación y normalización de datos de estaciones ITV.
@@ -89,7 +90,9 @@ class Validate:
         """
         Normaliza texto para usar como clave en comparaciones.
         
-        Convierte a minúsculas, elimina acentos y caracteres diacríticos.
+        Convierte a minúsculas, elimina acentos y caracteres diacríticos. Es
+        la misma normalización que se guarda en las columnas
+        `nombre_normalizado` (ver `backend.almacen.normalizacion`).
         
         Args:
             texto: Texto a normalizar
@@ -103,11 +106,7 @@ class Validate:
             >>> self._normalizar_para_clave("A Coruña")
             'a coruna'
         """
-        if not texto:
-            return ""
-        texto = str(texto).lower().strip()
-        texto_norm = unicodedata.normalize('NFD', texto)
-        return ''.join(c for c in texto_norm if unicodedata.category(c) != 'Mn')
+        return normalizar_clave(texto)
     
     def estandarizar_nombre_provincia(self, nombre_sucio: Optional[str]) -> Optional[str]:
         """
@@ -40,11 +40,86 @@ class EstacionResponse(BaseModel):
     localidad: str = Field(..., description="Nombre de la localidad/municipio")
     provincia: str = Field(..., description="Nombre de la provincia")
 
+class EstacionCercanaResponse(EstacionResponse):
+    """
+    Estación devuelta por la búsqueda de cercanía, con su distancia al punto
+    de búsqueda.
+    """
+    distancia_km: float = Field(..., description="Distancia haversine al punto de búsqueda, en km")
+
+class EstacionRelevanteResponse(EstacionResponse):
+    """
+    Estación devuelta por la búsqueda de texto completo, con la relevancia de
+    la coincidencia.
+    """
+    relevancia: float = Field(..., description="Puntuación ts_rank_cd de la coincidencia (mayor es mejor)")
+
+class ClusterResponse(BaseModel):
+    """
+    Grupo de estaciones próximas en un nivel de zoom del mapa.
+
+    Cuando el grupo tiene una sola estación se incluyen sus datos básicos
+    (proyección "mapa") para poder pintarla como un marcador normal.
+    """
+    latitud: float = Field(..., description="Latitud del centroide del grupo")
+    longitud: float = Field(..., description="Longitud del centroide del grupo")
+    cantidad: int = Field(..., description="Número de estaciones del grupo")
+    cod_estacion: Optional[int] = Field(None, description="ID de la estación (solo si cantidad es 1)")
+    nombre: Optional[str] = Field(None, description="Nombre de la estación (solo si cantidad es 1)")
+    tipo: Optional[str] = Field(None, description="Tipo de estación (solo si cantidad es 1)")
+
+class SugerenciaResponse(BaseModel):
+    """Sugerencia de autocompletado para el formulario de búsqueda."""
+    nombre: str = Field(..., description="Nombre de la localidad o provincia")
+    provincia: Optional[str] = Field(None, description="Provincia de la localidad (solo con campo=localidad)")
+    estaciones: int = Field(..., description="Número de estaciones, usado para ordenar las sugerencias")
+
+class FacetaResponse(BaseModel):
+    """Número de estaciones con un valor de una dimensión (provincia, localidad o tipo)."""
+    valor: Optional[str] = Field(None, description="Nombre de la provincia o localidad, o tipo de estación")
+    provincia: Optional[str] = Field(None, description="Provincia de la localidad (solo en localidades)")
+    cantidad: int = Field(..., description="Estaciones que cumplen los filtros con ese valor")
+
+class FacetasResponse(BaseModel):
+    """
+    Recuentos de las estaciones que cumplen unos filtros de búsqueda,
+    agrupados por dimensión y ordenados de más a menos estaciones.
+    """
+    total: int = Field(..., description="Estaciones que cumplen los filtros")
+    provincias: List[FacetaResponse]
+    localidades: List[FacetaResponse]
+    tipos: List[FacetaResponse]
+
 class BusquedaRequest(BaseModel):
-    localidad: Optional[str] = None
-    codigo_postal: Optional[str] = None
-    provincia: Optional[str] = None
-    tipo: Optional[str] = None
+    """Filtros de una búsqueda; usado por cada elemento de POST /api/buscar/lote."""
+    localidad: Optional[str] = Field(None, description="Nombre de la localidad")
+    codigo_postal: Optional[str] = Field(None, min_length=5, max_length=5, description="Código postal exacto")
+    provincia: Optional[str] = Field(None, description="Nombre de la provincia")
+    tipo: Optional[TipoEstacion] = Field(None, description="Tipo de estación")
+    nombre: Optional[str] = Field(None, description="Nombre de la estación")
+
+class BusquedaLoteRequest(BaseModel):
+    """
+    Lote de búsquedas resueltas en una sola petición.
+
+    Los filtros de texto se comparan sin mayúsculas ni acentos, como en
+    /api/buscar; por defecto el nombre debe coincidir completo.
+    """
+    busquedas: List[BusquedaRequest] = Field(
+        ..., min_length=1, max_length=5000, description="Búsquedas a resolver (hasta 5000)"
+    )
+    coincidencia: str = Field(
+        "exacta", pattern="^(exacta|prefijo|subcadena)$",
+        description="Cómo se comparan los filtros de texto: 'exacta', 'prefijo' o 'subcadena'"
+    )
+    limite_por_busqueda: int = Field(100, ge=1, le=1000, description="Estaciones máximas por búsqueda")
+    fields: Optional[str] = Field(None, description="Proyección de campos, como en /api/buscar")
+
+class ResultadoLoteResponse(BaseModel):
+    """Resultado de una de las búsquedas de un lote."""
+    indice: int = Field(..., description="Posición de la búsqueda en la lista enviada")
+    total: int = Field(..., description="Estaciones que cumplen los filtros (aunque se devuelvan menos)")
+    estaciones: List[EstacionResponse]
 
 class ProvinciaResponse(BaseModel):
     codigo: int
@@ -7,13 +7,70 @@ Este módulo configura y ejecuta el servidor FastAPI que proporciona:
 - Gestión del almacén de datos (borrado, estadísticas)
 - Documentación interactiva OpenAPI/Swagger en /docs
 
-El servidor incluye middleware CORS para permitir peticiones desde el frontend Qt.
+El servidor incluye middleware CORS para permitir peticiones desde el frontend Qt
+y compresión de las respuestas negociada con Accept-Encoding.
 """
 
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from backend.api.api_busqueda import router as busqueda_router
 from backend.api.api_carga import router as carga_router
+from backend.almacen.database import cerrar_pool, estadisticas_pool, ejecutar_bd
+from backend.almacen.estado import estado_almacen
+from backend.almacen.indice_espacial import obtener_indice
+from backend.almacen.clusters import obtener_clusters
+from backend.almacen.sugerencias import CAMPOS_SUGERENCIAS, obtener_indice_sugerencias
+from backend.almacen.similitud import CAMPOS_SIMILITUD, obtener_indice_similitud
+from backend.almacen.instantanea import estadisticas_instantanea, instantanea_activa, obtener_instantanea
+from backend.almacen.instantanea_sqlite import (
+    estadisticas_sqlite, exportar_instantanea, opciones_sqlite, vigilar_instantanea,
+)
+from backend.almacen.sentencias import estadisticas_sentencias
+from backend.almacen.version import version_datos
+from backend.api.cache_resultados import estadisticas_cache
+from backend.api.coalescencia import estadisticas_coalescencia
+from backend.api.admision import estadisticas_admision
+from backend.api.compresion import CompresionMiddleware, estadisticas_compresion
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Ciclo de vida del servidor: calcula el estado del almacén, el índice
+    espacial, los clusters del mapa, los índices de sugerencias y de
+    trigramas y, en modo memoria, la instantánea de estaciones al arrancar y
+    libera el pool de conexiones al apagar.
+
+    Con la instantánea SQLite activada exporta el almacén antes que nada
+    (`exportar`) o vigila el fichero mientras el servidor está en marcha
+    (`servir`).
+    """
+    opciones = opciones_sqlite()
+    try:
+        if opciones['exportar']:
+            await ejecutar_bd(exportar_instantanea)
+    except Exception as e:
+        print(f"Error al exportar la instantánea SQLite al arrancar: {e}")
+    try:
+        await ejecutar_bd(estado_almacen)
+        await ejecutar_bd(obtener_indice)
+        await ejecutar_bd(obtener_clusters)
+        for campo in CAMPOS_SUGERENCIAS:
+            await ejecutar_bd(obtener_indice_sugerencias, campo)
+        for campo in CAMPOS_SIMILITUD:
+            await ejecutar_bd(obtener_indice_similitud, campo)
+        if instantanea_activa():
+            await ejecutar_bd(obtener_instantanea)
+    except Exception as e:
+        # Sin base de datos el servidor arranca igualmente; todos se
+        # calcularán en la primera petición que los necesite
+        print(f"No se pudo preparar el estado del almacén al arrancar: {e}")
+    vigilancia = asyncio.create_task(vigilar_instantanea()) if opciones['servir'] else None
+    yield
+    if vigilancia is not None:
+        vigilancia.cancel()
+    cerrar_pool()
 
 app = FastAPI(
     title="API de Estaciones ITV",
@@ -46,6 +103,7 @@ app = FastAPI(
     license_info={
         "name": "MIT",
     },
+    lifespan=lifespan,
 )
 
 # Configurar CORS para permitir conexiones desde la aplicación Qt
@@ -57,6 +115,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Comprimir las respuestas (gzip, br o zstd según el cliente); al añadirse
+# después de CORS queda por fuera y comprime también sus respuestas
+app.add_middleware(CompresionMiddleware)
+
 # Registrar routers
 app.include_router(busqueda_router)
 app.include_router(carga_router)
@@ -68,11 +130,18 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "busqueda": "/api/buscar",
+            "busqueda_texto": "/api/buscar/texto",
+            "facetas": "/api/facetas",
+            "busqueda_lote": "/api/buscar/lote (POST)",
+            "cercanas": "/api/cercanas",
+            "clusters": "/api/clusters",
+            "sugerencias": "/api/sugerencias",
             "provincias": "/api/provincias",
             "localidades": "/api/localidades/{provincia}",
             "cargar": "/api/cargar",
             "borrar": "/api/almacen",
-            "estado": "/api/estado"
+            "estado": "/api/estado",
+            "metricas": "/metricas"
         }
     }
 
@@ -81,6 +150,21 @@ async def health():
     """Endpoint de salud para verificar que el servidor está activo"""
     return {"status": "healthy"}
 
+@app.get("/metricas")
+async def metricas():
+    """Métricas internas del servidor: pool de conexiones, caché de resultados, coalescencia, admisión, instantáneas en memoria y SQLite, sentencias preparadas, compresión y versión de los datos"""
+    return {
+        "pool": estadisticas_pool(),
+        "cache": estadisticas_cache(),
+        "coalescencia": estadisticas_coalescencia(),
+        "admision": estadisticas_admision(),
+        "instantanea": estadisticas_instantanea(),
+        "sqlite": estadisticas_sqlite(),
+        "sentencias": estadisticas_sentencias(),
+        "compresion": estadisticas_compresion(),
+        "version_datos": version_datos(),
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -0,0 +1,97 @@
+"""
+Benchmark del índice espacial de /api/cercanas.
+
+Genera estaciones sintéticas repartidas por la península (100.000 por
+defecto), construye `IndiceEspacial` y mide el tiempo de cada búsqueda de las
+N más cercanas a puntos aleatorios. Comprueba además contra una búsqueda por
+fuerza bruta que los resultados son exactos.
+
+No necesita base de datos ni servidor.
+
+Uso:
+    python benchmarks/bench_cercanas.py
+    python benchmarks/bench_cercanas.py --estaciones 200000 --consultas 5000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.almacen.indice_espacial import IndiceEspacial, haversine_km
+
+TIPOS = ["Estación_fija", "Estación_móvil", "Otros"]
+
+def percentil(valores, p):
+    """Percentil p (0-100) por el método del rango más cercano."""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+def generar_puntos(n, semilla):
+    aleatorio = random.Random(semilla)
+    return [
+        (i, aleatorio.choice(TIPOS), aleatorio.uniform(36.0, 43.8), aleatorio.uniform(-9.3, 3.3))
+        for i in range(n)
+    ]
+
+def fuerza_bruta(puntos, lat, lon, n, radio_km, tipo):
+    candidatas = []
+    for cod_estacion, tipo_e, lat_e, lon_e in puntos:
+        if tipo and tipo_e != tipo:
+            continue
+        distancia = haversine_km(lat, lon, lat_e, lon_e)
+        if radio_km is None or distancia <= radio_km:
+            candidatas.append((distancia, cod_estacion))
+    return sorted(candidatas)[:n]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--estaciones", type=int, default=100000)
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--comprobar", type=int, default=50, help="Consultas a verificar por fuerza bruta")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    puntos = generar_puntos(args.estaciones, args.semilla)
+    inicio = time.perf_counter()
+    indice = IndiceEspacial(puntos)
+    print(f"{args.estaciones:,} estaciones, índice construido en {(time.perf_counter() - inicio) * 1000:.0f} ms "
+          f"({len(indice.celdas):,} celdas)")
+
+    aleatorio = random.Random(args.semilla + 1)
+    escenarios = [
+        ("n=10", dict(n=10)),
+        ("n=100", dict(n=100)),
+        ("n=10 radio=5km", dict(n=10, radio_km=5.0)),
+        ("n=10 tipo=Otros", dict(n=10, tipo="Otros")),
+    ]
+
+    print(f"{'escenario':>18} {'p50 µs':>9} {'p99 µs':>9} {'media µs':>9} {'fuerza bruta ms':>16}")
+    for nombre, opciones in escenarios:
+        consultas = [(aleatorio.uniform(36.0, 43.8), aleatorio.uniform(-9.3, 3.3)) for _ in range(args.consultas)]
+        tiempos = []
+        for lat, lon in consultas:
+            t = time.perf_counter()
+            indice.cercanas(lat, lon, **opciones)
+            tiempos.append((time.perf_counter() - t) * 1e6)
+
+        tiempos_bruta = []
+        for lat, lon in consultas[:args.comprobar]:
+            t = time.perf_counter()
+            esperado = fuerza_bruta(puntos, lat, lon, opciones["n"], opciones.get("radio_km"), opciones.get("tipo"))
+            tiempos_bruta.append((time.perf_counter() - t) * 1000)
+            obtenido = indice.cercanas(lat, lon, **opciones)
+            if [c for _, c in obtenido] != [c for _, c in esperado]:
+                print(f"ERROR: resultado distinto de la fuerza bruta en ({lat}, {lon}) con {opciones}")
+                sys.exit(1)
+
+        print(f"{nombre:>18} {percentil(tiempos, 50):>9.1f} {percentil(tiempos, 99):>9.1f} "
+              f"{statistics.mean(tiempos):>9.1f} {statistics.mean(tiempos_bruta):>16.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark de los clusters del mapa (/api/clusters).
+
+Genera estaciones sintéticas repartidas por la península (100.000 por
+defecto), construye `IndiceEspacial` y `ClustersPorZoom` y mide, para varios
+niveles de zoom, cuánto tarda y cuántos elementos devuelve una vista del mapa
+de 1280x800 píxeles centrada en un punto aleatorio. Comprueba además que
+cada nivel conserva el total de estaciones.
+
+No necesita base de datos ni servidor.
+
+Uso:
+    python benchmarks/bench_clusters.py
+    python benchmarks/bench_clusters.py --estaciones 500000 --vistas 500
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.almacen.indice_espacial import IndiceEspacial
+from backend.almacen.clusters import ClustersPorZoom
+
+TIPOS = ["Estación_fija", "Estación_móvil", "Otros"]
+
+# Tamaño de la vista del mapa, en píxeles
+ANCHO_PX, ALTO_PX = 1280, 800
+
+def percentil(valores, p):
+    """Percentil p (0-100) por el método del rango más cercano."""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+def generar_puntos(n, semilla):
+    aleatorio = random.Random(semilla)
+    return [
+        (i, aleatorio.choice(TIPOS), aleatorio.uniform(36.0, 43.8), aleatorio.uniform(-9.3, 3.3))
+        for i in range(n)
+    ]
+
+def vista(lat, lon, zoom):
+    """Rectángulo de ANCHO_PX x ALTO_PX píxeles centrado en (lat, lon) en ese zoom."""
+    grados_px = 360.0 / (256 * 2 ** zoom)
+    medio_ancho = ANCHO_PX / 2 * grados_px
+    # En mercator la escala vertical se reduce con cos(latitud)
+    medio_alto = ALTO_PX / 2 * grados_px * math.cos(math.radians(lat))
+    return (max(-85.0, lat - medio_alto), max(-180.0, lon - medio_ancho),
+            min(85.0, lat + medio_alto), min(180.0, lon + medio_ancho))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--estaciones", type=int, default=100000)
+    parser.add_argument("--vistas", type=int, default=200, help="Vistas aleatorias por nivel de zoom")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    puntos = generar_puntos(args.estaciones, args.semilla)
+    indice = IndiceEspacial(puntos)
+    inicio = time.perf_counter()
+    clusters = ClustersPorZoom(indice)
+    print(f"{args.estaciones:,} estaciones, clusters de los zooms 0-{clusters.zoom_max} "
+          f"construidos en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    for zoom, nivel in enumerate(clusters.niveles):
+        if sum(grupo[0] for grupo in nivel.values()) != args.estaciones:
+            print(f"ERROR: el zoom {zoom} no conserva el total de estaciones")
+            sys.exit(1)
+
+    aleatorio = random.Random(args.semilla + 1)
+    print(f"{'zoom':>4} {'p50 µs':>9} {'p99 µs':>9} {'elementos (media)':>18} {'máx':>6}")
+    for zoom in (0, 4, 6, 8, 10, 12, 14, 16):
+        tiempos, elementos = [], []
+        for _ in range(args.vistas):
+            rectangulo = vista(aleatorio.uniform(36.0, 43.8), aleatorio.uniform(-9.3, 3.3), zoom)
+            t = time.perf_counter()
+            resultado, _ = clusters.consultar(zoom, *rectangulo)
+            tiempos.append((time.perf_counter() - t) * 1e6)
+            elementos.append(len(resultado))
+        print(f"{zoom:>4} {percentil(tiempos, 50):>9.1f} {percentil(tiempos, 99):>9.1f} "
+              f"{statistics.mean(elementos):>18.1f} {max(elementos):>6}")
+
+if __name__ == "__main__":
+    main()
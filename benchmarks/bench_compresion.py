@@ -0,0 +1,99 @@
+"""
+Benchmark de la compresión de las respuestas de estaciones.
+
+Serializa como en /api/buscar una página pequeña, una página máxima y el
+catálogo completo (todas las estaciones, completas y con fields=mapa) y, para
+cada codificación disponible en `backend.api.compresion` y varios niveles,
+mide el ratio de compresión y el tiempo de comprimir y descomprimir. Al final
+compara el coste de comprimir la página máxima en cada petición con el de
+servirla desde la caché de cuerpos comprimidos.
+
+Necesita base de datos con estaciones; no necesita servidor.
+
+Uso:
+    python benchmarks/bench_compresion.py
+    python benchmarks/bench_compresion.py --repeticiones 20
+"""
+
+import argparse
+import asyncio
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.almacen import consultas
+from backend.almacen.version import version_datos
+from backend.api import compresion
+from backend.api.api_busqueda import LIMITE_MAXIMO, resolver_campos
+from backend.api.serializacion import filas_a_json
+
+NIVELES = {"gzip": (1, 6, 9), "br": (1, 5, 9), "zstd": (1, 3, 12)}
+
+def descomprimir(datos, codificacion):
+    if codificacion == "zstd":
+        return compresion.zstandard.ZstdDecompressor().decompressobj().decompress(datos)
+    if codificacion == "br":
+        return compresion.brotli.decompress(datos)
+    return gzip.decompress(datos)
+
+def medir(funcion, repeticiones):
+    """Tiempo medio en ms de `funcion()` y su último resultado."""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return (time.perf_counter() - inicio) * 1000 / repeticiones, resultado
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5, help="Repeticiones de cada medida")
+    args = parser.parse_args()
+
+    todas = consultas.buscar_estaciones()
+    if not todas:
+        print("La base de datos no tiene estaciones")
+        sys.exit(1)
+    mapa = resolver_campos("mapa")
+    cuerpos = [
+        ("página 100", filas_a_json(consultas.CAMPOS_ESTACION, todas[:100])),
+        (f"página {LIMITE_MAXIMO}", filas_a_json(consultas.CAMPOS_ESTACION, todas[:LIMITE_MAXIMO])),
+        ("catálogo", filas_a_json(consultas.CAMPOS_ESTACION, todas)),
+        ("catálogo mapa", filas_a_json(mapa, consultas.buscar_estaciones(campos=mapa))),
+    ]
+
+    print(f"Codificaciones disponibles: {', '.join(compresion.CODIFICACIONES)}")
+    print(f"{'respuesta':>14} {'KB':>8} {'codif.':>6} {'nivel':>5} {'KB comp.':>9} {'ratio':>6} "
+          f"{'comp. ms':>9} {'desc. ms':>9}")
+    for nombre, cuerpo in cuerpos:
+        for codificacion in compresion.CODIFICACIONES:
+            for nivel in NIVELES[codificacion]:
+                t_comp, comprimido = medir(lambda: compresion.comprimir(cuerpo, codificacion, nivel), args.repeticiones)
+                t_desc, original = medir(lambda: descomprimir(comprimido, codificacion), args.repeticiones)
+                if original != cuerpo:
+                    print(f"ERROR: {codificacion} nivel {nivel} no recupera el cuerpo original")
+                    sys.exit(1)
+                print(f"{nombre:>14} {len(cuerpo) / 1024:>8.0f} {codificacion:>6} {nivel:>5} "
+                      f"{len(comprimido) / 1024:>9.1f} {len(cuerpo) / len(comprimido):>6.1f} "
+                      f"{t_comp:>9.2f} {t_desc:>9.2f}")
+
+    # Misma respuesta versionada pedida repetidamente: la primera se comprime
+    # y las siguientes salen de la caché
+    _, cuerpo = cuerpos[1]
+    codificacion = compresion.CODIFICACIONES[0]
+    etag = f'"{version_datos()}-bench"'
+
+    async def peticiones(n, con_etag):
+        """Tiempo medio en ms por petición."""
+        inicio = time.perf_counter()
+        for _ in range(n):
+            await compresion.comprimir_con_cache(cuerpo, codificacion, etag if con_etag else None)
+        return (time.perf_counter() - inicio) * 1000 / n
+
+    for descripcion, con_etag in (("sin caché", False), ("con caché", True)):
+        media = asyncio.run(peticiones(args.repeticiones * 10, con_etag))
+        print(f"página {LIMITE_MAXIMO} {codificacion} {descripcion}: {media:.3f} ms por petición")
+
+if __name__ == "__main__":
+    main()
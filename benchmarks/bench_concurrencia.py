@@ -0,0 +1,73 @@
+"""
+Benchmark de latencia de la API de búsqueda bajo clientes concurrentes.
+
+Lanza N clientes HTTP simultáneos contra un servidor ya arrancado y mide la
+latencia de cada petición. Para comparar antes/después basta con ejecutarlo
+contra cada versión del servidor con los mismos parámetros.
+
+Uso:
+    python run_server.py                      # en otra terminal
+    python benchmarks/bench_concurrencia.py --ruta "/api/buscar?provincia=a"
+    python benchmarks/bench_concurrencia.py --clientes 50 100 200 --peticiones 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+def percentil(valores, p):
+    """Percentil p (0-100) por el método del rango más cercano."""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+async def cliente(http, url, peticiones, latencias, errores):
+    for _ in range(peticiones):
+        inicio = time.perf_counter()
+        try:
+            respuesta = await http.get(url)
+            if respuesta.status_code >= 400:
+                errores.append(respuesta.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errores.append(type(e).__name__)
+            continue
+        latencias.append((time.perf_counter() - inicio) * 1000)
+
+async def medir(url, clientes, peticiones):
+    latencias, errores = [], []
+    limites = httpx.Limits(max_connections=clientes, max_keepalive_connections=clientes)
+    async with httpx.AsyncClient(timeout=60.0, limits=limites) as http:
+        # Calentamiento: abre conexiones y llena el pool del servidor
+        await asyncio.gather(*(http.get(url) for _ in range(min(clientes, 20))))
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente(http, url, peticiones, latencias, errores) for _ in range(clientes)))
+        duracion = time.perf_counter() - inicio
+    return latencias, errores, duracion
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--ruta", default="/api/buscar?provincia=a")
+    parser.add_argument("--clientes", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--peticiones", type=int, default=10, help="Peticiones por cliente")
+    args = parser.parse_args()
+
+    url = args.base_url + args.ruta
+    print(f"URL: {url}")
+    print(f"{'clientes':>9} {'peticiones':>11} {'p50 ms':>9} {'p99 ms':>9} {'media ms':>9} {'req/s':>9} {'errores':>8}")
+    for n in args.clientes:
+        latencias, errores, duracion = asyncio.run(medir(url, n, args.peticiones))
+        if not latencias:
+            print(f"{n:>9} {'-':>11} sin respuestas correctas ({len(errores)} errores)")
+            continue
+        print(
+            f"{n:>9} {len(latencias):>11} {percentil(latencias, 50):>9.1f} {percentil(latencias, 99):>9.1f} "
+            f"{statistics.mean(latencias):>9.1f} {len(latencias) / duracion:>9.0f} {len(errores):>8}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark del modo flujo (NDJSON) frente a la respuesta JSON completa.
+
+Serializa todas las estaciones de la base de datos de dos formas: como un
+único array JSON (`buscar_estaciones` sin límite + `filas_a_json`, lo que
+costaría una sola página con el catálogo entero) y lote a lote con
+`iterar_estaciones` + `filas_a_ndjson`, como envía el servidor con
+stream=true. Mide el tiempo total, el tiempo hasta el primer bloque y el pico
+de memoria de Python (tracemalloc) de cada forma, y comprueba que ambas
+producen las mismas estaciones.
+
+Necesita base de datos con estaciones; no necesita servidor.
+
+Uso:
+    python benchmarks/bench_flujo.py
+    python benchmarks/bench_flujo.py --lote 500 --campos mapa
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.almacen import consultas
+from backend.api.api_busqueda import resolver_campos
+from backend.api.serializacion import filas_a_json, filas_a_ndjson
+
+def completo(campos):
+    """Genera el array JSON completo como un único bloque."""
+    yield filas_a_json(campos, consultas.buscar_estaciones(campos=campos))
+
+def por_lotes(campos, lote):
+    """Genera un bloque NDJSON por lote del cursor del servidor."""
+    for filas in consultas.iterar_estaciones(campos=campos, lote=lote):
+        yield filas_a_ndjson(campos, filas)
+
+def medir(bloques):
+    """(segundos totales, segundos hasta el primer bloque, pico MB, bytes, estaciones) de un generador."""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    primero = None
+    total_bytes = 0
+    estaciones = []
+    for bloque in bloques:
+        if primero is None:
+            primero = time.perf_counter() - inicio
+        total_bytes += len(bloque)
+        # Solo el código de cada estación: conservar los bloques falsearía el pico
+        if bloque.startswith(b"["):
+            estaciones.extend(e["cod_estacion"] for e in json.loads(bloque))
+        else:
+            estaciones.extend(json.loads(linea)["cod_estacion"] for linea in bloque.splitlines())
+        del bloque
+    duracion = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracion, primero or duracion, pico / 1024 / 1024, total_bytes, estaciones
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lote", type=int, default=consultas.FILAS_POR_LOTE, help="Filas por lote del cursor")
+    parser.add_argument("--campos", default=None, help="Proyección, como el parámetro fields (p. ej. mapa)")
+    args = parser.parse_args()
+
+    campos = resolver_campos(args.campos) or consultas.CAMPOS_ESTACION
+    if "cod_estacion" not in campos:
+        campos = ("cod_estacion",) + tuple(campos)
+
+    resultados = {}
+    print(f"{'modo':>10} {'total ms':>9} {'1er bloque ms':>14} {'pico MB':>8} {'MB enviados':>12}")
+    for modo, bloques in (("completo", completo(campos)), ("flujo", por_lotes(campos, args.lote))):
+        duracion, primero, pico, total_bytes, estaciones = medir(bloques)
+        resultados[modo] = estaciones
+        print(f"{modo:>10} {duracion * 1000:>9.0f} {primero * 1000:>14.1f} {pico:>8.1f} "
+              f"{total_bytes / 1024 / 1024:>12.1f}")
+
+    if not resultados["completo"]:
+        print("La base de datos no tiene estaciones")
+        sys.exit(1)
+    if resultados["completo"] != resultados["flujo"]:
+        print("ERROR: el flujo no devuelve las mismas estaciones en el mismo orden")
+        sys.exit(1)
+    print(f"{len(resultados['flujo']):,} estaciones, mismas en ambos modos")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark de la instantánea en memoria frente a PostgreSQL para /api/buscar.
+
+Carga la instantánea de la base de datos configurada en config.ini y, para
+cada escenario, resuelve las mismas búsquedas (valores tomados al azar de las
+propias estaciones) con `consultas.buscar_estaciones` y con
+`InstantaneaEstaciones.buscar`, y compara las filas. Mide el rendimiento en
+búsquedas por segundo de una página de `--limite` estaciones con su total,
+como una petición a /api/buscar?total=true sin caché.
+
+Necesita base de datos con estaciones y numpy; no necesita servidor.
+
+Uso:
+    python benchmarks/bench_instantanea.py
+    python benchmarks/bench_instantanea.py --consultas 500 --limite 100
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.almacen import consultas
+from backend.almacen.instantanea import InstantaneaEstaciones
+
+TIPOS = ["Estación_fija", "Estación_móvil", "Otros"]
+
+def percentil(valores, p):
+    """Percentil p (0-100) por el método del rango más cercano."""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+def escenarios(filas, aleatorio):
+    """Generadores de filtros de cada escenario a partir de estaciones reales."""
+    campos = consultas.CAMPOS_ESTACION
+    i_localidad, i_provincia, i_cp = campos.index("localidad"), campos.index("provincia"), campos.index("codigo_postal")
+    i_nombre = campos.index("nombre")
+
+    def trozo(texto):
+        inicio = aleatorio.randrange(max(1, len(texto) - 3))
+        return texto[inicio:inicio + 4]
+
+    return [
+        ("sin filtros", lambda: {}),
+        ("provincia", lambda: {"provincia": aleatorio.choice(filas)[i_provincia]}),
+        ("localidad prefijo", lambda: {"localidad": aleatorio.choice(filas)[i_localidad][:3], "prefijo": True}),
+        ("codigo_postal", lambda: {"codigo_postal": aleatorio.choice(filas)[i_cp]}),
+        ("nombre subcadena", lambda: {"nombre": trozo(aleatorio.choice(filas)[i_nombre])}),
+        ("provincia+tipo", lambda: {"provincia": aleatorio.choice(filas)[i_provincia], "tipo": aleatorio.choice(TIPOS)}),
+    ]
+
+def medir(buscar, contar, filtros, limite):
+    """Tiempos en ms de una página más su total para cada juego de filtros."""
+    tiempos, resultados = [], []
+    for f in filtros:
+        t = time.perf_counter()
+        filas = buscar(limite=limite + 1, **f)
+        total = contar(**f)
+        tiempos.append((time.perf_counter() - t) * 1000)
+        resultados.append((filas, total))
+    return tiempos, resultados
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultas", type=int, default=200, help="Búsquedas por escenario")
+    parser.add_argument("--limite", type=int, default=100, help="Estaciones por página")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    filas = consultas.filas_instantanea()
+    cargada = time.perf_counter()
+    instantanea = InstantaneaEstaciones(filas)
+    construida = time.perf_counter()
+    if not filas:
+        print("La base de datos no tiene estaciones")
+        sys.exit(1)
+    print(f"{len(filas):,} estaciones: carga {(cargada - inicio) * 1000:.0f} ms, "
+          f"construcción {(construida - cargada) * 1000:.0f} ms")
+
+    aleatorio = random.Random(args.semilla)
+    print(f"{'escenario':>18} {'SQL p50 ms':>11} {'SQL b/s':>9} {'mem p50 ms':>11} {'mem b/s':>9} {'x':>6}")
+    for nombre, generar in escenarios(filas, aleatorio):
+        filtros = [generar() for _ in range(args.consultas)]
+        t_sql, r_sql = medir(consultas.buscar_estaciones, consultas.contar_estaciones, filtros, args.limite)
+        t_mem, r_mem = medir(instantanea.buscar, instantanea.contar, filtros, args.limite)
+        if r_sql != r_mem:
+            print(f"ERROR: la instantánea no devuelve lo mismo que SQL en el escenario '{nombre}'")
+            sys.exit(1)
+
+        bps_sql = len(filtros) / (sum(t_sql) / 1000)
+        bps_mem = len(filtros) / (sum(t_mem) / 1000)
+        print(f"{nombre:>18} {percentil(t_sql, 50):>11.2f} {bps_sql:>9.0f} "
+              f"{percentil(t_mem, 50):>11.2f} {bps_mem:>9.0f} {bps_mem / bps_sql:>6.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark de las sentencias preparadas de /api/buscar.
+
+Para cada combinación de los filtros localidad, codigo_postal, provincia y
+tipo (16) resuelve las mismas búsquedas (valores tomados al azar de las
+propias estaciones, primera página más la siguiente por cursor) enviando la
+consulta como texto y como sentencia preparada, comprueba que las filas
+coinciden y compara el tiempo medio por consulta.
+
+Necesita base de datos con estaciones; no necesita servidor.
+
+Uso:
+    python benchmarks/bench_sentencias.py
+    python benchmarks/bench_sentencias.py --consultas 300 --limite 50 --prefijo
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.almacen import consultas, sentencias
+
+FILTROS = ("localidad", "codigo_postal", "provincia", "tipo")
+
+def percentil(valores, p):
+    """Percentil p (0-100) por el método del rango más cercano."""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+def medir(filtros, limite):
+    """Tiempos en ms de cada consulta (página y página siguiente) y sus filas."""
+    tiempos, resultados = [], []
+    for f in filtros:
+        t = time.perf_counter()
+        pagina = consultas.buscar_estaciones(limite=limite, **f)
+        tiempos.append((time.perf_counter() - t) * 1000)
+        siguiente = []
+        if pagina:
+            t = time.perf_counter()
+            siguiente = consultas.buscar_estaciones(limite=limite, despues_de=pagina[-1][-4:], **f)
+            tiempos.append((time.perf_counter() - t) * 1000)
+        resultados.append((pagina, siguiente))
+    return tiempos, resultados
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultas", type=int, default=100, help="Búsquedas por combinación")
+    parser.add_argument("--limite", type=int, default=20, help="Estaciones por página")
+    parser.add_argument("--prefijo", action="store_true", help="Filtros de texto por prefijo en lugar de exactos")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    filas = consultas.filas_instantanea()
+    if not filas:
+        print("La base de datos no tiene estaciones")
+        sys.exit(1)
+    campos = consultas.CAMPOS_ESTACION
+    aleatorio = random.Random(args.semilla)
+
+    def generar(combinacion):
+        # Todos los valores salen de la misma estación, así que la búsqueda no queda vacía
+        fila = aleatorio.choice(filas)
+        return {"prefijo": args.prefijo, **{filtro: fila[campos.index(filtro)] for filtro in combinacion}}
+
+    print(f"{'filtros':>38} {'texto ms':>9} {'prep. ms':>9} {'p95 texto':>10} {'p95 prep.':>10} {'x':>5}")
+    for n in range(len(FILTROS) + 1):
+        for combinacion in itertools.combinations(FILTROS, n):
+            filtros = [generar(combinacion) for _ in range(args.consultas)]
+
+            sentencias._activas = False
+            t_texto, r_texto = medir(filtros, args.limite)
+            sentencias._activas = True
+            medir(filtros[:10], args.limite)  # prepara la sentencia en la conexión
+            t_prep, r_prep = medir(filtros, args.limite)
+            if r_texto != r_prep:
+                print(f"ERROR: la sentencia preparada no devuelve lo mismo para {combinacion}")
+                sys.exit(1)
+
+            media_texto = sum(t_texto) / len(t_texto)
+            media_prep = sum(t_prep) / len(t_prep)
+            print(f"{','.join(combinacion) or 'sin filtros':>38} {media_texto:>9.3f} {media_prep:>9.3f} "
+                  f"{percentil(t_texto, 95):>10.3f} {percentil(t_prep, 95):>10.3f} {media_texto / media_prep:>5.2f}")
+
+if __name__ == "__main__":
+    main()
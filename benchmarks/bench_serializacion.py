@@ -0,0 +1,101 @@
+"""
+Benchmark de serialización de estaciones: Pydantic frente a filas -> bytes.
+
+Genera filas sintéticas con la misma forma que devuelve
+`consultas.buscar_estaciones` y mide filas/segundo de tres caminos:
+
+- pydantic: un EstacionResponse por fila y después la validación y
+  serialización de `response_model=List[EstacionResponse]` (lo que hacía
+  FastAPI antes de la vía rápida)
+- directo: `serializacion.filas_a_json` con orjson
+- directo (json): `serializacion.filas_a_json` con el módulo json estándar
+
+No necesita base de datos ni servidor.
+
+Uso:
+    python benchmarks/bench_serializacion.py
+    python benchmarks/bench_serializacion.py --filas 1000 10000 100000 --repeticiones 5
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pydantic import TypeAdapter
+
+from backend.almacen.consultas import CAMPOS_ESTACION
+from backend.api import serializacion
+from backend.models import EstacionResponse
+
+def generar_filas(n):
+    """Filas con los 13 campos de la estación y la clave de ordenación al final."""
+    filas = []
+    for i in range(n):
+        provincia = f"Provincia {i % 50}"
+        localidad = f"Localidad {i % 5000}"
+        nombre = f"Estación ITV {i}"
+        filas.append((
+            i, nombre, "Estación_fija", f"Calle Mayor {i}, Polígono Industrial", f"{i % 100000:05d}",
+            -3.7 + (i % 1000) / 1000, 40.4 + (i % 997) / 1000, None,
+            "de 8.00 a 21.00 horas (de lunes a viernes)", "Tel: 900 000 000 | Email: itv@example.com",
+            f"https://example.com/itv/{i}", localidad, provincia,
+            provincia, localidad, nombre, i,
+        ))
+    return filas
+
+def via_pydantic(filas, adaptador):
+    n = len(CAMPOS_ESTACION)
+    modelos = [EstacionResponse(**dict(zip(CAMPOS_ESTACION, fila[:n]))) for fila in filas]
+    return adaptador.dump_json(adaptador.validate_python(modelos))
+
+def via_directa(filas):
+    return serializacion.filas_a_json(CAMPOS_ESTACION, filas)
+
+def medir(funcion, repeticiones):
+    """Mejor tiempo de `repeticiones` ejecuciones, en segundos."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    adaptador = TypeAdapter(List[EstacionResponse])
+    orjson = serializacion.orjson
+
+    print(f"orjson: {'sí' if orjson is not None else 'no instalado'}")
+    print(f"{'filas':>8} {'camino':>15} {'filas/s':>12} {'ms':>9} {'bytes':>11} {'x':>6}")
+    for n in args.filas:
+        filas = generar_filas(n)
+        # Ambos caminos deben producir el mismo documento
+        assert adaptador.validate_json(via_directa(filas)) == adaptador.validate_json(via_pydantic(filas, adaptador))
+
+        caminos = [("pydantic", lambda: via_pydantic(filas, adaptador))]
+        if orjson is not None:
+            caminos.append(("directo", lambda: via_directa(filas)))
+        caminos.append(("directo (json)", lambda: via_directa(filas)))
+
+        base = None
+        for nombre, funcion in caminos:
+            if nombre == "directo (json)":
+                serializacion.orjson = None
+            try:
+                segundos = medir(funcion, args.repeticiones)
+                tamano = len(funcion())
+            finally:
+                serializacion.orjson = orjson
+            base = base or segundos
+            print(f"{n:>8} {nombre:>15} {n / segundos:>12,.0f} {segundos * 1000:>9.1f} {tamano:>11,} {base / segundos:>6.1f}")
+
+if __name__ == "__main__":
+    main()
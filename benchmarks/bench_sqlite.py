@@ -0,0 +1,118 @@
+"""
+Benchmark de la instantánea SQLite de solo lectura.
+
+Genera estaciones sintéticas (50.000 por defecto), escribe la instantánea con
+`escribir_instantanea` en un directorio temporal y mide el tiempo de
+construcción, el tamaño del fichero y la latencia de las consultas de
+`consultas_sqlite` que usan los endpoints de búsqueda, con una conexión ya
+abierta como en el servidor.
+
+No necesita base de datos ni servidor.
+
+Uso:
+    python benchmarks/bench_sqlite.py
+    python benchmarks/bench_sqlite.py --estaciones 200000 --consultas 500
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.almacen import consultas_sqlite
+from backend.almacen.instantanea_sqlite import escribir_instantanea, usar_instantanea
+from backend.almacen.normalizacion import normalizar_clave
+
+TIPOS = ["Estación_fija", "Estación_móvil", "Otros"]
+PALABRAS = ["Norte", "Sur", "Polígono", "Centro", "Puerto", "Río", "Alta", "Baja", "Vella", "Nova"]
+
+def percentil(valores, p):
+    """Percentil p (0-100) por el método del rango más cercano."""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+def generar(n, semilla):
+    """Provincias, localidades y estaciones sintéticas con el formato de `escribir_instantanea`."""
+    aleatorio = random.Random(semilla)
+    provincias = [(i, f"Provincia {i}", normalizar_clave(f"Provincia {i}")) for i in range(50)]
+    localidades = []
+    for i in range(max(1, n // 10)):
+        nombre = f"{aleatorio.choice(PALABRAS)} {i}"
+        localidades.append((i, nombre, normalizar_clave(nombre), aleatorio.randrange(len(provincias))))
+    provincia_de = {codigo: provincias[codigo_provincia][1] for codigo, _, _, codigo_provincia in localidades}
+    nombre_localidad = {codigo: nombre for codigo, nombre, _, _ in localidades}
+
+    estaciones = []
+    for cod in range(1, n + 1):
+        localidad = aleatorio.randrange(len(localidades))
+        nombre = f"ITV {aleatorio.choice(PALABRAS)} {cod}"
+        estaciones.append((
+            cod, nombre, normalizar_clave(nombre), aleatorio.choice(TIPOS), f"Calle {aleatorio.choice(PALABRAS)} {cod}",
+            f"{aleatorio.randrange(1000, 52999):05d}", aleatorio.uniform(-9.3, 3.3), aleatorio.uniform(36.0, 43.8),
+            "Estación de inspección", "L-V 8:00-20:00", "contacto@itv.es", "https://itv.es", localidad,
+        ))
+
+    provincias.sort(key=lambda fila: fila[1])
+    localidades.sort(key=lambda fila: fila[1])
+    estaciones.sort(key=lambda fila: (provincia_de[fila[12]], nombre_localidad[fila[12]], fila[1], fila[0]))
+    return provincias, localidades, estaciones
+
+def escenarios(estaciones, aleatorio, limite):
+    """(nombre, función sin argumentos) de cada escenario."""
+    c = consultas_sqlite
+    cursores = [fila[-4:] for fila in c.buscar_estaciones(limite=limite * 50, campos=("cod_estacion",))[limite - 1::limite]]
+
+    def estacion():
+        return aleatorio.choice(estaciones)
+
+    return [
+        ("sin filtros", lambda: c.buscar_estaciones(limite=limite)),
+        ("página por cursor", lambda: c.buscar_estaciones(limite=limite, despues_de=aleatorio.choice(cursores))),
+        ("provincia+total", lambda: (c.buscar_estaciones(provincia=f"Provincia {aleatorio.randrange(50)}", limite=limite),
+                                     c.contar_estaciones(provincia=f"Provincia {aleatorio.randrange(50)}"))),
+        ("codigo_postal", lambda: c.buscar_estaciones(codigo_postal=estacion()[5], limite=limite)),
+        ("nombre subcadena", lambda: c.buscar_estaciones(nombre=str(estacion()[0]), limite=limite)),
+        ("facetas tipo", lambda: c.contar_facetas(tipo=aleatorio.choice(TIPOS))),
+        ("texto", lambda: c.buscar_texto(aleatorio.choice(PALABRAS), limite)),
+        ("por codigo x20", lambda: c.estaciones_por_codigo([estacion()[0] for _ in range(20)])),
+        ("lote 100 cp", lambda: c.buscar_estaciones_lote(
+            [(i, None, estacion()[5], None, None, None) for i in range(100)], "exacta", 5)),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--estaciones", type=int, default=50000)
+    parser.add_argument("--consultas", type=int, default=200, help="Consultas por escenario")
+    parser.add_argument("--limite", type=int, default=100, help="Estaciones por página")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    provincias, localidades, estaciones = generar(args.estaciones, args.semilla)
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "instantanea.sqlite")
+        inicio = time.perf_counter()
+        escribir_instantanea(ruta, provincias, localidades, estaciones, "bench")
+        construccion = time.perf_counter() - inicio
+        print(f"{len(estaciones):,} estaciones: construcción {construccion * 1000:.0f} ms, "
+              f"{os.path.getsize(ruta) / 1024 / 1024:.1f} MB")
+
+        usar_instantanea(ruta)
+        aleatorio = random.Random(args.semilla)
+        print(f"{'escenario':>18} {'p50 ms':>8} {'p95 ms':>8} {'c/s':>8}")
+        for nombre, consulta in escenarios(estaciones, aleatorio, args.limite):
+            tiempos = []
+            for _ in range(args.consultas):
+                t = time.perf_counter()
+                consulta()
+                tiempos.append((time.perf_counter() - t) * 1000)
+            print(f"{nombre:>18} {percentil(tiempos, 50):>8.2f} {percentil(tiempos, 95):>8.2f} "
+                  f"{len(tiempos) / (sum(tiempos) / 1000):>8.0f}")
+        usar_instantanea(None)
+
+if __name__ == "__main__":
+    main()
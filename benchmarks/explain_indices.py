@@ -0,0 +1,187 @@
+"""
+Comprueba con EXPLAIN que las consultas de búsqueda y de carga usan índices.
+
+Crea un esquema temporal (`bench_indices`) en la base de datos de config.ini,
+aplica CREATE_SCHEMA_SQL, lo rellena con datos sintéticos (100.000 estaciones
+por defecto), ejecuta ANALYZE y revisa el plan de cada patrón de acceso.
+El esquema temporal se elimina al terminar; los datos reales no se tocan.
+
+Uso:
+    python benchmarks/explain_indices.py
+    python benchmarks/explain_indices.py --estaciones 200000
+
+Sale con código 1 si alguna consulta no usa el índice esperado.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.almacen.database import CREATE_SCHEMA_SQL, conectar
+
+ESQUEMA = "bench_indices"
+
+# (descripción, consulta, parámetros, índices aceptados, requiere pg_trgm)
+CONSULTAS = [
+    ("Validate.es_duplicado",
+     "SELECT cod_estacion FROM Estacion WHERE nombre = %s LIMIT 1",
+     ("Estacion 4242",), {"idx_estacion_nombre"}, False),
+    ("get_or_create_localidad",
+     "SELECT codigo FROM Localidad WHERE nombre = %s AND codigo_provincia = %s",
+     ("Localidad 77", 28), {"idx_localidad_nombre_provincia"}, False),
+    ("buscar_estaciones codigo_postal",
+     """SELECT e.cod_estacion FROM Estacion e
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE e.codigo_postal = %s ORDER BY e.provincia_nombre, e.localidad_nombre, e.nombre, e.cod_estacion""",
+     ("46001",), {"idx_estacion_codigo_postal"}, False),
+    ("buscar_estaciones tipo",
+     """SELECT e.cod_estacion FROM Estacion e
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE e.tipo = %s ORDER BY e.provincia_nombre, e.localidad_nombre, e.nombre, e.cod_estacion""",
+     ("Otros",), {"idx_estacion_tipo_localidad"}, False),
+    ("buscar_estaciones localidad (subcadena)",
+     """SELECT e.cod_estacion FROM Estacion e
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE l.nombre_normalizado LIKE %s ORDER BY e.provincia_nombre, e.localidad_nombre, e.nombre, e.cod_estacion""",
+     ("%localidad 123%",), {"idx_localidad_normalizado_trgm"}, True),
+    ("buscar_estaciones localidad (prefijo)",
+     """SELECT e.cod_estacion FROM Estacion e
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE l.nombre_normalizado LIKE %s ORDER BY e.provincia_nombre, e.localidad_nombre, e.nombre, e.cod_estacion""",
+     ("localidad 123%",), {"idx_localidad_nombre_normalizado"}, False),
+    ("buscar_estaciones nombre (prefijo)",
+     """SELECT e.cod_estacion FROM Estacion e
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE e.nombre_normalizado LIKE %s ORDER BY e.provincia_nombre, e.localidad_nombre, e.nombre, e.cod_estacion""",
+     ("estacion 4242%",), {"idx_estacion_nombre_normalizado"}, False),
+    ("buscar_estaciones provincia (subcadena)",
+     """SELECT e.cod_estacion FROM Estacion e
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE p.nombre_normalizado LIKE %s ORDER BY e.provincia_nombre, e.localidad_nombre, e.nombre, e.cod_estacion""",
+     ("%provincia 7%",), {"idx_localidad_codigo_provincia", "idx_estacion_codigo_localidad"}, False),
+    ("buscar_estaciones primera página",
+     """SELECT e.cod_estacion FROM Estacion e
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        ORDER BY e.provincia_nombre, e.localidad_nombre, e.nombre, e.cod_estacion LIMIT %s""",
+     (1001,), {"idx_estacion_orden"}, False),
+    ("buscar_estaciones página por cursor",
+     """SELECT e.cod_estacion FROM Estacion e
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE (e.provincia_nombre, e.localidad_nombre, e.nombre, e.cod_estacion) > (%s, %s, %s, %s)
+        ORDER BY e.provincia_nombre, e.localidad_nombre, e.nombre, e.cod_estacion LIMIT %s""",
+     ("Provincia 42", "Localidad 457", "Estacion 456", 456, 1001), {"idx_estacion_orden"}, False),
+    ("buscar_texto",
+     """SELECT e.cod_estacion FROM (SELECT websearch_to_tsquery('spanish', %s) || websearch_to_tsquery('catalan', %s)) AS c(consulta)
+        JOIN Estacion e ON e.busqueda @@ c.consulta
+        JOIN Localidad l ON e.codigo_localidad = l.codigo
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        ORDER BY ts_rank_cd(e.busqueda, c.consulta) DESC, e.cod_estacion LIMIT 50""",
+     ("calle 4242", "calle 4242"), {"idx_estacion_busqueda"}, False),
+    ("obtener_localidades",
+     """SELECT l.codigo, l.nombre, p.nombre FROM Localidad l
+        JOIN Provincia p ON l.codigo_provincia = p.codigo
+        WHERE p.nombre_normalizado = %s ORDER BY l.nombre""",
+     ("provincia 7",), {"idx_localidad_codigo_provincia"}, False),
+]
+
+def poblar(cur, estaciones, localidades, provincias):
+    # Los nombres sintéticos no llevan acentos: basta LOWER() para normalizarlos
+    cur.execute("""
+        INSERT INTO Provincia (nombre, nombre_normalizado)
+        SELECT 'Provincia ' || g, 'provincia ' || g FROM generate_series(1, %s) g
+    """, (provincias,))
+    cur.execute("""
+        INSERT INTO Localidad (nombre, nombre_normalizado, codigo_provincia)
+        SELECT 'Localidad ' || g, 'localidad ' || g, (g %% %s) + 1 FROM generate_series(1, %s) g
+    """, (provincias, localidades))
+    # Distribución realista de tipos: casi todas fijas, pocas móviles y "Otros"
+    cur.execute("""
+        INSERT INTO Estacion (nombre, nombre_normalizado, tipo, direccion, codigo_postal, longitud, latitud,
+                              horario, contacto, url, codigo_localidad)
+        SELECT 'Estacion ' || g, 'estacion ' || g,
+               CASE WHEN g %% 100 = 0 THEN 'Otros'
+                    WHEN g %% 20 = 0 THEN 'Estación_móvil'
+                    ELSE 'Estación_fija' END::tipo_estacion,
+               'Calle ' || g, lpad((g %% 52000)::text, 5, '0'),
+               -9 + random() * 12, 36 + random() * 8,
+               'L-V 8:00-20:00', 'itv' || g || '@example.com', 'https://example.com/' || g,
+               (g %% %s) + 1
+        FROM generate_series(1, %s) g
+    """, (localidades, estaciones))
+    cur.execute("ANALYZE Provincia; ANALYZE Localidad; ANALYZE Estacion;")
+
+def indices_del_plan(nodo):
+    """Recorre el plan JSON y devuelve los nombres de índices usados."""
+    usados = set()
+    if "Index Name" in nodo:
+        usados.add(nodo["Index Name"])
+    for hijo in nodo.get("Plans", []):
+        usados |= indices_del_plan(hijo)
+    return usados
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--estaciones", type=int, default=100_000)
+    parser.add_argument("--localidades", type=int, default=8_000)
+    parser.add_argument("--provincias", type=int, default=52)
+    args = parser.parse_args()
+
+    conn = conectar()
+    if not conn:
+        sys.exit(1)
+
+    fallos = 0
+    try:
+        with conn.cursor() as cur:
+            # pg_trgm se instala antes de cambiar search_path: si no, CREATE_SCHEMA_SQL
+            # lo crearía dentro del esquema temporal y el DROP ... CASCADE se lo llevaría
+            cur.execute("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')")
+            if cur.fetchone()[0]:
+                cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public")
+            cur.execute(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {ESQUEMA}")
+            cur.execute(f"SET search_path TO {ESQUEMA}, public")
+            cur.execute(CREATE_SCHEMA_SQL)
+            print(f"Poblando {args.estaciones} estaciones, {args.localidades} localidades, {args.provincias} provincias...")
+            poblar(cur, args.estaciones, args.localidades, args.provincias)
+
+            cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+            hay_trgm = cur.fetchone()[0]
+
+            for descripcion, consulta, params, esperados, requiere_trgm in CONSULTAS:
+                if requiere_trgm and not hay_trgm:
+                    print(f"[OMITIDA] {descripcion}: pg_trgm no está instalado")
+                    continue
+                cur.execute("EXPLAIN (FORMAT JSON) " + consulta, params)
+                plan = cur.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                usados = indices_del_plan(plan[0]["Plan"])
+                correcto = bool(usados & esperados)
+                fallos += not correcto
+                estado = "OK" if correcto else "FALLO"
+                print(f"[{estado:^7}] {descripcion}: índices usados {sorted(usados) or '-'}")
+    finally:
+        # Si algo ha fallado la transacción está abortada y no admitiría la limpieza
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute("RESET search_path")
+            cur.execute(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE")
+        conn.commit()
+        conn.close()
+
+    sys.exit(1 if fallos else 0)
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,18 @@ para realizar peticiones HTTP asíncronas a la API REST del backend.
 
 Utiliza el patrón de señales y slots de Qt para manejar respuestas asíncronas
 sin bloquear la interfaz de usuario.
+
+Las respuestas llegan comprimidas: QNetworkAccessManager anuncia en
+Accept-Encoding las codificaciones que sabe descomprimir (gzip, deflate y,
+según cómo se compiló Qt, zstd y br) y descomprime de forma transparente,
+también por partes en readyRead. Para no perder eso las peticiones nunca
+fijan Accept-Encoding a mano: con la cabecera puesta, Qt entrega los bytes
+comprimidos.
 """
 
-from PySide6.QtCore import QObject, Signal, QUrl
+from PySide6.QtCore import QObject, Signal, QUrl, QUrlQuery
 from PySide6.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
+from collections import OrderedDict
 import json
 
 class APIClient(QObject):
@@ -26,10 +34,34 @@ class APIClient(QObject):
     
     Signals:
         busqueda_completada(list): Emitida cuando se completa una búsqueda
+        estaciones_recibidas(list): Emitida cuando se completa la descarga del
+            catálogo completo (obtener_todas_estaciones)
         carga_completada(dict): Emitida cuando se completa una carga o borrado
         error_ocurrido(str): Emitida cuando hay un error en cualquier operación
         provincias_recibidas(list): Emitida cuando se recibe la lista de provincias
         estado_recibido(dict): Emitida cuando se recibe el estado del almacén
+        pagina_recibida(list, str, int): Emitida con cada página de una búsqueda
+            paginada: estaciones, cursor de la siguiente página ("" si es la
+            última) y total de resultados (-1 si no se pidió)
+        estaciones_bbox_recibidas(list, dict): Emitida con las estaciones de un
+            rectángulo del mapa y un dict con 'peticion' (los parámetros
+            enviados), 'total' y 'bbox' (rectángulo cubierto por el servidor)
+        clusters_recibidos(list, dict): Emitida con los grupos de estaciones de
+            una vista del mapa, con el mismo dict de información que la anterior
+        sugerencias_recibidas(str, str, list): Emitida con el campo, el prefijo
+            pedido y las sugerencias de autocompletado
+        facetas_recibidas(dict): Emitida con los recuentos por provincia,
+            localidad y tipo de unos filtros (ver /api/facetas)
+        lote_recibido(list): Emitida con los resultados de buscar_lote, uno
+            por búsqueda y en el orden enviado ({indice, total, estaciones})
+        quizas_quiso_decir(dict): Emitida justo antes de busqueda_completada
+            cuando la búsqueda no encuentra nada y el servidor propone nombres
+            parecidos ({campo: [nombres]})
+        estaciones_parciales(list): Emitida varias veces durante
+            obtener_estaciones_flujo con las estaciones llegadas desde la
+            anterior, en orden
+        flujo_completado(int): Emitida al terminar obtener_estaciones_flujo
+            con el número total de estaciones recibidas
     
     Example:
         >>> client = APIClient()
@@ -40,52 +72,290 @@ class APIClient(QObject):
     
     # Señales para manejar respuestas asíncronas
     busqueda_completada = Signal(list)
+    estaciones_recibidas = Signal(list)
     carga_completada = Signal(dict)
     error_ocurrido = Signal(str)
     provincias_recibidas = Signal(list)
     estado_recibido = Signal(dict)
+    pagina_recibida = Signal(list, str, int)
+    estaciones_bbox_recibidas = Signal(list, dict)
+    clusters_recibidos = Signal(list, dict)
+    sugerencias_recibidas = Signal(str, str, list)
+    quizas_quiso_decir = Signal(dict)
+    facetas_recibidas = Signal(dict)
+    lote_recibido = Signal(list)
+    estaciones_parciales = Signal(list)
+    flujo_completado = Signal(int)
+
+    # Tamaño de página usado al descargar listados completos
+    TAMANO_PAGINA = 1000
+
+    # Respuestas guardadas para peticiones condicionales (If-None-Match)
+    MAX_RESPUESTAS_CACHE = 64
+    CABECERAS_CACHEADAS = ("X-Next-Cursor", "X-Total-Count", "X-Bbox", "X-Quizas-Quiso-Decir")
     
     def __init__(self, base_url="http://127.0.0.1:8000"):
         super().__init__()
         self.base_url = base_url
         self.manager = QNetworkAccessManager()
+        # URL -> (etag, cuerpo, cabeceras) de la última respuesta 200 con ETag
+        self._cache_etag = OrderedDict()
+
+    def _url(self, ruta, params=None):
+        """Construye la URL de un endpoint codificando los parámetros no vacíos"""
+        url = QUrl(f"{self.base_url}{ruta}")
+        if params:
+            query = QUrlQuery()
+            for clave, valor in params.items():
+                if valor is not None and valor != "":
+                    query.addQueryItem(clave, str(valor))
+            url.setQuery(query)
+        return url
+
+    def _get(self, url: QUrl) -> QNetworkReply:
+        """
+        Lanza un GET condicional: si hay una respuesta guardada para la URL se
+        envía su ETag en If-None-Match y el servidor contesta 304 si no cambió.
+        """
+        request = QNetworkRequest(url)
+        guardada = self._cache_etag.get(url.toString())
+        if guardada:
+            # El servidor debilita (W/) el ETag de las respuestas comprimidas;
+            # se reenvía tal cual y el servidor lo compara en modo débil
+            request.setRawHeader(b"If-None-Match", guardada[0])
+        return self.manager.get(request)
+
+    def _leer_cuerpo(self, reply: QNetworkReply):
+        """
+        Devuelve (cuerpo, cabeceras) de una respuesta correcta.
+
+        En un 304 reutiliza el cuerpo y las cabeceras guardados; en un 200 con
+        ETag los guarda para la siguiente petición a la misma URL.
+        """
+        clave = reply.url().toString()
+        estado = reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute)
+        if estado == 304 and clave in self._cache_etag:
+            self._cache_etag.move_to_end(clave)
+            _, cuerpo, cabeceras = self._cache_etag[clave]
+            return cuerpo, cabeceras
+
+        cuerpo = reply.readAll().data()
+        cabeceras = {
+            nombre: reply.rawHeader(nombre).data().decode('ascii')
+            for nombre in self.CABECERAS_CACHEADAS
+        }
+        etag = reply.rawHeader("ETag").data()
+        if etag:
+            self._cache_etag[clave] = (etag, cuerpo, cabeceras)
+            self._cache_etag.move_to_end(clave)
+            while len(self._cache_etag) > self.MAX_RESPUESTAS_CACHE:
+                self._cache_etag.popitem(last=False)
+        return cuerpo, cabeceras
     
-    def buscar_estaciones(self, localidad=None, codigo_postal=None, provincia=None, tipo=None):
-        """Busca estaciones según los criterios especificados"""
-        # Construir URL con parámetros
-        params = []
-        if localidad:
-            params.append(f"localidad={localidad}")
-        if codigo_postal:
-            params.append(f"codigo_postal={codigo_postal}")
-        if provincia:
-            params.append(f"provincia={provincia}")
-        if tipo:
-            params.append(f"tipo={tipo}")
+    def buscar_estaciones(self, localidad=None, codigo_postal=None, provincia=None, tipo=None, campos=None,
+                          fuzzy=False):
+        """
+        Busca estaciones según los criterios especificados (recorre todas las páginas).
+
+        campos: proyección opcional ("mapa" o lista separada por comas)
+        fuzzy: si es True los filtros de texto toleran erratas y los resultados
+            llegan ordenados por parecido
+        """
+        params = {
+            "localidad": localidad,
+            "codigo_postal": codigo_postal,
+            "provincia": provincia,
+            "tipo": tipo,
+            "fields": campos,
+            "fuzzy": "true" if fuzzy else None,
+        }
+        self._obtener_paginas("/api/buscar", params, [], self.busqueda_completada)
+
+    def obtener_todas_estaciones(self, campos=None):
+        """Obtiene todas las estaciones sin filtros (recorre todas las páginas)"""
+        self._obtener_paginas("/api/estaciones", {"fields": campos}, [], self.estaciones_recibidas)
+
+    def obtener_estaciones_flujo(self, localidad=None, codigo_postal=None, provincia=None, tipo=None,
+                                 campos=None):
+        """
+        Descarga todas las estaciones de una búsqueda en modo flujo (NDJSON).
+
+        En lugar de encadenar páginas, el servidor envía una estación por línea
+        según las lee, y cada bloque recibido se emite en `estaciones_parciales`
+        sin esperar al final, así que la tabla o el mapa se pueden ir llenando.
+        Al acabar se emite `flujo_completado` con el total recibido.
+        """
+        params = {
+            "localidad": localidad,
+            "codigo_postal": codigo_postal,
+            "provincia": provincia,
+            "tipo": tipo,
+            "fields": campos,
+            "stream": "true",
+        }
+        # Sin If-None-Match: el cuerpo no se guarda para no retener el listado completo
+        request = QNetworkRequest(self._url("/api/buscar", params))
+        request.setRawHeader(b"Accept", b"application/x-ndjson")
+        reply = self.manager.get(request)
+        # Bytes de una línea aún incompleta, estaciones emitidas hasta ahora y
+        # si la descarga se ha abortado por una línea inválida
+        estado = {"pendiente": b"", "recibidas": 0, "fallido": False}
+        reply.readyRead.connect(lambda: self._leer_flujo(reply, estado))
+        reply.finished.connect(lambda: self._handle_flujo_response(reply, estado))
+
+    def _leer_flujo(self, reply: QNetworkReply, estado, final=False):
+        """Decodifica las líneas completas recibidas y las emite en `estaciones_parciales`"""
+        if reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute) != 200:
+            return
+        datos = estado["pendiente"] + reply.readAll().data()
+        lineas = datos.split(b"\n")
+        # La última parte es una línea a medias (o vacía si el bloque acaba en salto de línea)
+        estado["pendiente"] = b"" if final else lineas.pop()
+        try:
+            estaciones = [json.loads(linea) for linea in lineas if linea.strip()]
+        except json.JSONDecodeError as e:
+            estado["fallido"] = True
+            self.error_ocurrido.emit(f"Error al parsear respuesta: {str(e)}")
+            reply.abort()
+            return
+        if estaciones:
+            estado["recibidas"] += len(estaciones)
+            self.estaciones_parciales.emit(estaciones)
+
+    def _handle_flujo_response(self, reply: QNetworkReply, estado):
+        """Termina una descarga en modo flujo"""
+        if estado["fallido"]:
+            pass
+        elif reply.error() == QNetworkReply.NetworkError.NoError:
+            self._leer_flujo(reply, estado, final=True)
+            if not estado["fallido"]:
+                self.flujo_completado.emit(estado["recibidas"])
+        else:
+            # Un corte a mitad deja las estaciones ya emitidas incompletas
+            self.error_ocurrido.emit(f"Error en la búsqueda: {reply.errorString()}")
+
+        reply.deleteLater()
+
+    def buscar_estaciones_pagina(self, localidad=None, codigo_postal=None, provincia=None, tipo=None,
+                                 limit=100, cursor=None, total=False, campos=None):
+        """
+        Pide una sola página de resultados y emite `pagina_recibida`.
+
+        Para la página siguiente se vuelve a llamar con el cursor recibido.
+        """
+        params = {
+            "localidad": localidad,
+            "codigo_postal": codigo_postal,
+            "provincia": provincia,
+            "tipo": tipo,
+            "limit": limit,
+            "cursor": cursor,
+            "total": "true" if total else None,
+            "fields": campos,
+        }
+        reply = self._get(self._url("/api/buscar", params))
+        reply.finished.connect(lambda: self._handle_pagina_response(reply))
+
+    def _handle_pagina_response(self, reply: QNetworkReply):
+        """Maneja la respuesta de una página suelta"""
+        if reply.error() == QNetworkReply.NetworkError.NoError:
+            data, cabeceras = self._leer_cuerpo(reply)
+            try:
+                estaciones = json.loads(data.decode('utf-8'))
+                siguiente = cabeceras["X-Next-Cursor"]
+                total = cabeceras["X-Total-Count"]
+                self.pagina_recibida.emit(estaciones, siguiente, int(total) if total else -1)
+            except json.JSONDecodeError as e:
+                self.error_ocurrido.emit(f"Error al parsear respuesta: {str(e)}")
+        else:
+            self.error_ocurrido.emit(f"Error en la búsqueda: {reply.errorString()}")
         
-        url = f"{self.base_url}/api/buscar"
-        if params:
-            url += "?" + "&".join(params)
+        reply.deleteLater()
+
+    def obtener_estaciones_bbox(self, min_lat, min_lon, max_lat, max_lon, zoom=None, campos=None, limit=None):
+        """
+        Pide las estaciones de un rectángulo del mapa y emite `estaciones_bbox_recibidas`.
+
+        Con `zoom` el servidor amplía el rectángulo a las teselas que lo cubren
+        y lo devuelve en info['bbox'], de modo que el llamante sabe qué zona
+        tiene ya cargada.
+        """
+        params = {
+            "min_lat": f"{min_lat:.6f}",
+            "min_lon": f"{min_lon:.6f}",
+            "max_lat": f"{max_lat:.6f}",
+            "max_lon": f"{max_lon:.6f}",
+            "zoom": zoom,
+            "limit": limit,
+            "fields": campos,
+        }
+        reply = self._get(self._url("/api/estaciones/bbox", params))
+        reply.finished.connect(
+            lambda: self._handle_bbox_response(reply, params, self.estaciones_bbox_recibidas, "estaciones")
+        )
+
+    def obtener_clusters(self, min_lat, min_lon, max_lat, max_lon, zoom, limit=None):
+        """
+        Pide las estaciones de una vista del mapa agrupadas según el zoom y
+        emite `clusters_recibidos`. Cada elemento trae latitud, longitud y
+        cantidad; los de una sola estación traen además cod_estacion, nombre
+        y tipo.
+        """
+        params = {
+            "zoom": zoom,
+            "bbox": f"{min_lat:.6f},{min_lon:.6f},{max_lat:.6f},{max_lon:.6f}",
+            "limit": limit,
+        }
+        reply = self._get(self._url("/api/clusters", params))
+        reply.finished.connect(
+            lambda: self._handle_bbox_response(reply, params, self.clusters_recibidos, "clusters")
+        )
+
+    def _handle_bbox_response(self, reply: QNetworkReply, params, senal, descripcion):
+        """Maneja la respuesta de estaciones o clusters por rectángulo"""
+        if reply.error() == QNetworkReply.NetworkError.NoError:
+            data, cabeceras = self._leer_cuerpo(reply)
+            try:
+                estaciones = json.loads(data.decode('utf-8'))
+                bbox = cabeceras["X-Bbox"]
+                total = cabeceras["X-Total-Count"]
+                info = {
+                    "peticion": params,
+                    "total": int(total) if total else len(estaciones),
+                    "bbox": tuple(float(x) for x in bbox.split(",")) if bbox else None,
+                }
+                senal.emit(estaciones, info)
+            except (json.JSONDecodeError, ValueError) as e:
+                self.error_ocurrido.emit(f"Error al parsear respuesta: {str(e)}")
+        else:
+            self.error_ocurrido.emit(f"Error al obtener {descripcion} del mapa: {reply.errorString()}")
         
-        request = QNetworkRequest(QUrl(url))
-        reply = self.manager.get(request)
-        reply.finished.connect(lambda: self._handle_busqueda_response(reply))
+        reply.deleteLater()
 
-    def obtener_todas_estaciones(self):
-        """Obtiene todas las estaciones sin filtros"""
-        url = f"{self.base_url}/api/estaciones"
-        request = QNetworkRequest(QUrl(url))
-        reply = self.manager.get(request)
-        # Reutilizamos el manejador de respuesta de búsqueda ya que el formato es el mismo
-        reply.finished.connect(lambda: self._handle_busqueda_response(reply))
+    def _obtener_paginas(self, ruta, params, acumuladas, senal, cursor=None):
+        """
+        Pide una página y encadena las siguientes siguiendo la cabecera X-Next-Cursor.
+
+        Cuando llega la última página emite `senal` con la lista completa.
+        """
+        consulta = dict(params, limit=self.TAMANO_PAGINA, cursor=cursor)
+        reply = self._get(self._url(ruta, consulta))
+        reply.finished.connect(lambda: self._handle_busqueda_response(reply, ruta, params, acumuladas, senal))
     
-    def _handle_busqueda_response(self, reply: QNetworkReply):
-        """Maneja la respuesta de búsqueda"""
+    def _handle_busqueda_response(self, reply: QNetworkReply, ruta, params, acumuladas, senal):
+        """Acumula una página de búsqueda; al llegar a la última emite la señal indicada"""
         if reply.error() == QNetworkReply.NetworkError.NoError:
-            data = reply.readAll().data()
+            data, cabeceras = self._leer_cuerpo(reply)
             try:
-                estaciones = json.loads(data.decode('utf-8'))
-                self.busqueda_completada.emit(estaciones)
+                acumuladas.extend(json.loads(data.decode('utf-8')))
+                siguiente = cabeceras["X-Next-Cursor"]
+                if siguiente:
+                    self._obtener_paginas(ruta, params, acumuladas, senal, siguiente)
+                else:
+                    quizas = cabeceras["X-Quizas-Quiso-Decir"]
+                    if quizas and not acumuladas:
+                        self.quizas_quiso_decir.emit(json.loads(quizas))
+                    senal.emit(acumuladas)
             except json.JSONDecodeError as e:
                 self.error_ocurrido.emit(f"Error al parsear respuesta: {str(e)}")
         else:
@@ -93,17 +363,108 @@ class APIClient(QObject):
         
         reply.deleteLater()
     
+    def obtener_facetas(self, localidad=None, codigo_postal=None, provincia=None, tipo=None, fuzzy=False,
+                        limit=None):
+        """
+        Pide los recuentos por provincia, localidad y tipo de unos filtros
+        (los mismos que buscar_estaciones) y emite `facetas_recibidas`.
+        """
+        params = {
+            "localidad": localidad,
+            "codigo_postal": codigo_postal,
+            "provincia": provincia,
+            "tipo": tipo,
+            "fuzzy": "true" if fuzzy else None,
+            "limit": limit,
+        }
+        reply = self._get(self._url("/api/facetas", params))
+        reply.finished.connect(lambda: self._handle_facetas_response(reply))
+
+    def _handle_facetas_response(self, reply: QNetworkReply):
+        """Maneja la respuesta de facetas"""
+        if reply.error() == QNetworkReply.NetworkError.NoError:
+            data, _ = self._leer_cuerpo(reply)
+            try:
+                self.facetas_recibidas.emit(json.loads(data.decode('utf-8')))
+            except json.JSONDecodeError as e:
+                self.error_ocurrido.emit(f"Error al parsear respuesta: {str(e)}")
+        else:
+            self.error_ocurrido.emit(f"Error al obtener las facetas: {reply.errorString()}")
+
+        reply.deleteLater()
+
+    def buscar_lote(self, busquedas, coincidencia="exacta", limite_por_busqueda=None, campos=None):
+        """
+        Resuelve muchas búsquedas en una sola petición (POST /api/buscar/lote)
+        y emite `lote_recibido`.
+
+        Args:
+            busquedas: Lista de dicts con los filtros de cada búsqueda
+                (localidad, codigo_postal, provincia, tipo, nombre)
+        """
+        request = QNetworkRequest(QUrl(f"{self.base_url}/api/buscar/lote"))
+        request.setHeader(QNetworkRequest.KnownHeaders.ContentTypeHeader, "application/json")
+
+        payload = {"busquedas": busquedas, "coincidencia": coincidencia}
+        if limite_por_busqueda is not None:
+            payload["limite_por_busqueda"] = limite_por_busqueda
+        if campos:
+            payload["fields"] = campos
+
+        reply = self.manager.post(request, json.dumps(payload).encode('utf-8'))
+        reply.finished.connect(lambda: self._handle_lote_response(reply))
+
+    def _handle_lote_response(self, reply: QNetworkReply):
+        """Maneja la respuesta de un lote de búsquedas"""
+        if reply.error() == QNetworkReply.NetworkError.NoError:
+            data = reply.readAll().data()
+            try:
+                self.lote_recibido.emit(json.loads(data.decode('utf-8')))
+            except json.JSONDecodeError as e:
+                self.error_ocurrido.emit(f"Error al parsear respuesta: {str(e)}")
+        else:
+            self.error_ocurrido.emit(f"Error en el lote de búsquedas: {reply.errorString()}")
+
+        reply.deleteLater()
+
+    def obtener_sugerencias(self, campo, prefijo, n=10):
+        """
+        Pide sugerencias de autocompletado ('localidad' o 'provincia') y emite
+        `sugerencias_recibidas`.
+
+        No usa la caché de ETags: cada tecla es una URL distinta y expulsaría
+        las respuestas grandes que sí merece la pena revalidar.
+        """
+        url = self._url("/api/sugerencias", {"campo": campo, "prefijo": prefijo, "n": n})
+        reply = self.manager.get(QNetworkRequest(url))
+        reply.finished.connect(lambda: self._handle_sugerencias_response(reply, campo, prefijo))
+
+    def _handle_sugerencias_response(self, reply: QNetworkReply, campo, prefijo):
+        """
+        Maneja la respuesta de sugerencias. Los errores no se emiten en
+        `error_ocurrido`: un fallo al autocompletar no debe interrumpir al
+        usuario con un diálogo en cada pulsación.
+        """
+        if reply.error() == QNetworkReply.NetworkError.NoError:
+            try:
+                sugerencias = json.loads(reply.readAll().data().decode('utf-8'))
+                self.sugerencias_recibidas.emit(campo, prefijo, sugerencias)
+            except json.JSONDecodeError as e:
+                print(f"Error al parsear sugerencias: {e}")
+        else:
+            print(f"Error al obtener sugerencias: {reply.errorString()}")
+
+        reply.deleteLater()
+
     def obtener_provincias(self):
         """Obtiene la lista de provincias"""
-        url = f"{self.base_url}/api/provincias"
-        request = QNetworkRequest(QUrl(url))
-        reply = self.manager.get(request)
+        reply = self._get(self._url("/api/provincias"))
         reply.finished.connect(lambda: self._handle_provincias_response(reply))
     
     def _handle_provincias_response(self, reply: QNetworkReply):
         """Maneja la respuesta de provincias"""
         if reply.error() == QNetworkReply.NetworkError.NoError:
-            data = reply.readAll().data()
+            data, _ = self._leer_cuerpo(reply)
             try:
                 provincias = json.loads(data.decode('utf-8'))
                 self.provincias_recibidas.emit(provincias)
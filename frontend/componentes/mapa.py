@@ -1,7 +1,22 @@
 from PySide6.QtWebEngineWidgets import QWebEngineView
+from PySide6.QtWebChannel import QWebChannel
 from PySide6.QtWidgets import QVBoxLayout, QWidget
-from PySide6.QtCore import Signal
+from PySide6.QtCore import QObject, Signal, Slot
 from frontend.api_client import APIClient
+import json
+
+class PuenteMapa(QObject):
+    """
+    Objeto expuesto al JavaScript del mapa mediante QWebChannel.
+
+    El mapa llama a `notificar_viewport` (con debounce) cada vez que el
+    usuario termina de desplazar o hacer zoom.
+    """
+    viewport_cambiado = Signal(float, float, float, float, int)
+
+    @Slot(float, float, float, float, int)
+    def notificar_viewport(self, min_lat, min_lon, max_lat, max_lon, zoom):
+        self.viewport_cambiado.emit(min_lat, min_lon, max_lat, max_lon, zoom)
 
 class MapaWidget(QWidget):
     estaciones_cargadas = Signal(list)
@@ -10,7 +25,7 @@ class MapaWidget(QWidget):
         super().__init__()
         self.layout = QVBoxLayout(self)
         self.layout.setContentsMargins(0, 0, 0, 0)
-        
+
         self.browser = QWebEngineView()
         self.layout.addWidget(self.browser)
 
@@ -18,10 +33,23 @@ class MapaWidget(QWidget):
         self.map_ready = False
         self.pending_stations = None
         self.should_load_on_ready = False
-        
+
+        # Vista actual del mapa (min_lat, min_lon, max_lat, max_lon, zoom) y
+        # zona ya cargada: (rectángulo cubierto, zoom)
+        self.vista = None
+        self.cobertura = None
+        self.ultima_peticion = None
+
         # Cliente API propio para el mapa
         self.api_client = APIClient()
-        self.api_client.busqueda_completada.connect(self._on_estaciones_recibidas)
+        self.api_client.clusters_recibidos.connect(self._on_clusters_recibidos)
+
+        # Canal JavaScript -> Python para los cambios de vista
+        self.puente = PuenteMapa()
+        self.puente.viewport_cambiado.connect(self._on_viewport_cambiado)
+        self.canal = QWebChannel()
+        self.canal.registerObject("puente", self.puente)
+        self.browser.page().setWebChannel(self.canal)
 
         html_content = """
         <!DOCTYPE html>
@@ -36,9 +64,16 @@ class MapaWidget(QWidget):
             <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"
              integrity="sha256-20nQCchB9co0qIjJZRGuk2/Z9VM+kNiyxNV1lvTlZBo="
              crossorigin=""></script>
+            <script src="qrc:///qtwebchannel/qwebchannel.js"></script>
             <style>
                 body { margin: 0; padding: 0; }
                 #map { width: 100%; height: 100vh; }
+                .cluster {
+                    display: flex; align-items: center; justify-content: center;
+                    border-radius: 50%; background: rgba(49, 120, 198, 0.85);
+                    border: 3px solid rgba(255, 255, 255, 0.8);
+                    color: white; font: bold 12px sans-serif;
+                }
             </style>
         </head>
         <body>
@@ -50,6 +85,87 @@ class MapaWidget(QWidget):
                     maxZoom: 19,
                     attribution: '&copy; <a href="http://www.openstreetmap.org/copyright">OpenStreetMap</a>'
                 }).addTo(map);
+
+                window.markersLayer = L.layerGroup().addTo(map);
+                // clave -> marcador, para no recrear los que siguen visibles
+                var marcadores = {};
+
+                function escapar(texto) {
+                    return String(texto == null ? '' : texto)
+                        .replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+                        .replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+                }
+
+                function popupEstacion(e) {
+                    // Con la proyección "mapa" solo llegan nombre y tipo
+                    var lineas = ['<b>' + escapar(e.nombre || 'Sin nombre') + '</b>', '<i>' + escapar(e.tipo) + '</i>'];
+                    if (e.direccion) { lineas.push(escapar(e.direccion)); }
+                    if (e.localidad || e.provincia) {
+                        lineas.push(escapar([e.localidad, e.provincia].filter(Boolean).join(', ') + ' ' + (e.codigo_postal || '')));
+                    }
+                    return lineas.join('<br>');
+                }
+
+                // Marcador de un grupo: círculo con el número de estaciones que,
+                // al pulsarlo, acerca el mapa para separarlas
+                function marcadorCluster(e) {
+                    var lado = e.cantidad < 10 ? 30 : e.cantidad < 100 ? 36 : e.cantidad < 1000 ? 42 : 50;
+                    var icono = L.divIcon({
+                        html: String(e.cantidad), className: 'cluster',
+                        iconSize: [lado, lado]
+                    });
+                    return L.marker([e.latitud, e.longitud], {icon: icono}).on('click', function () {
+                        map.setView([e.latitud, e.longitud], Math.min(map.getZoom() + 2, map.getMaxZoom()));
+                    });
+                }
+
+                // Sustituye los marcadores por los de `estaciones`, reutilizando los que
+                // ya existen. Los elementos con cantidad > 1 son grupos (/api/clusters)
+                function pintarEstaciones(estaciones, ajustar) {
+                    var nuevos = {};
+                    estaciones.forEach(function (e) {
+                        if (e.latitud == null || e.longitud == null) { return; }
+                        var grupo = e.cantidad > 1;
+                        var clave = !grupo && e.cod_estacion != null
+                            ? 'e' + e.cod_estacion
+                            : 'c' + (e.cantidad || 1) + '@' + e.latitud + ',' + e.longitud;
+                        var marcador = marcadores[clave];
+                        if (!marcador) {
+                            marcador = grupo
+                                ? marcadorCluster(e)
+                                : L.marker([e.latitud, e.longitud]).bindPopup(popupEstacion(e));
+                            window.markersLayer.addLayer(marcador);
+                        }
+                        nuevos[clave] = marcador;
+                    });
+                    for (var clave in marcadores) {
+                        if (!(clave in nuevos)) { window.markersLayer.removeLayer(marcadores[clave]); }
+                    }
+                    marcadores = nuevos;
+
+                    if (ajustar && window.markersLayer.getLayers().length > 0) {
+                        var group = new L.featureGroup(window.markersLayer.getLayers());
+                        map.fitBounds(group.getBounds().pad(0.1));
+                    }
+                }
+
+                // Avisa a Python de la vista actual; se espera a que el usuario
+                // deje de mover el mapa para no lanzar una petición por fotograma
+                var puente = null;
+                var temporizador = null;
+                function notificarViewport() {
+                    if (!puente) { return; }
+                    var b = map.getBounds();
+                    puente.notificar_viewport(b.getSouth(), b.getWest(), b.getNorth(), b.getEast(), map.getZoom());
+                }
+                map.on('moveend', function () {
+                    clearTimeout(temporizador);
+                    temporizador = setTimeout(notificarViewport, 250);
+                });
+                new QWebChannel(qt.webChannelTransport, function (canal) {
+                    puente = canal.objects.puente;
+                    notificarViewport();
+                });
             </script>
         </body>
         </html>
@@ -61,35 +177,83 @@ class MapaWidget(QWidget):
         """Se ejecuta cuando el HTML del mapa ha terminado de cargar"""
         if ok:
             self.map_ready = True
-            
+
             # Si se solicitó carga mientras no estaba listo, cargar ahora
             if self.should_load_on_ready:
-                self.api_client.obtener_todas_estaciones()
+                self.cargar_estaciones()
                 self.should_load_on_ready = False
-            
+
             # Si había actualizaciones pendientes, aplicarlas ahora
             if self.pending_stations is not None:
                 self.actualizar_marcadores(self.pending_stations)
                 self.pending_stations = None
 
     def cargar_estaciones(self):
-        """Dispara la carga de estaciones desde la API"""
-        if self.map_ready:
-            self.api_client.obtener_todas_estaciones()
-        else:
+        """
+        Vuelve a pedir los grupos de estaciones de la vista actual.
+
+        Se olvida la zona ya cargada; si los datos no han cambiado el servidor
+        responde 304 y el cliente reutiliza la respuesta anterior.
+        """
+        if not self.map_ready:
             self.should_load_on_ready = True
+            return
+
+        self.cobertura = None
+        if self.vista is not None:
+            self._pedir_vista()
+        else:
+            # Aún no se conoce la vista: que el mapa la notifique
+            self.browser.page().runJavaScript("notificarViewport();")
+
+    def _on_viewport_cambiado(self, min_lat, min_lon, max_lat, max_lon, zoom):
+        """Recibe la vista del mapa tras un desplazamiento o zoom"""
+        self.vista = (min_lat, min_lon, max_lat, max_lon, zoom)
+        if not self._vista_cubierta():
+            self._pedir_vista()
+
+    def _vista_cubierta(self):
+        """
+        Indica si la vista actual cae dentro de la zona ya cargada. Los grupos
+        dependen del zoom, así que al cambiarlo siempre se vuelve a pedir.
+        """
+        if self.cobertura is None or self.vista is None:
+            return False
+        (c_min_lat, c_min_lon, c_max_lat, c_max_lon), c_zoom = self.cobertura
+        min_lat, min_lon, max_lat, max_lon, zoom = self.vista
+        dentro = (c_min_lat <= min_lat and c_min_lon <= min_lon
+                  and max_lat <= c_max_lat and max_lon <= c_max_lon)
+        return dentro and zoom == c_zoom
+
+    @staticmethod
+    def _clave_peticion(min_lat, min_lon, max_lat, max_lon, zoom):
+        """Identifica una petición de vista tal como la envía APIClient (6 decimales)"""
+        return f"{min_lat:.6f},{min_lon:.6f},{max_lat:.6f},{max_lon:.6f}", zoom
+
+    def _pedir_vista(self):
+        """Pide al servidor los grupos de estaciones de la vista actual"""
+        self.ultima_peticion = self._clave_peticion(*self.vista)
+        self.api_client.obtener_clusters(*self.vista)
+
+    def _on_clusters_recibidos(self, clusters, info):
+        """Callback interno cuando el API devuelve los grupos de una vista"""
+        peticion = info["peticion"]
+        # Descarta respuestas de vistas que el usuario ya ha abandonado
+        if (peticion["bbox"], peticion["zoom"]) != self.ultima_peticion:
+            return
 
-    def _on_estaciones_recibidas(self, estaciones):
-        """Callback interno cuando el API devuelve estaciones"""
-        # Actualizamos nuestros marcadores SIN zoom (para que no se mueva el mapa al inicio)
-        self.actualizar_marcadores(estaciones, zoom=False)
-        # Avisamos al exterior (ventana principal) para que actualice la tabla
-        self.estaciones_cargadas.emit(estaciones)
+        if info["bbox"] is not None:
+            self.cobertura = (info["bbox"], peticion["zoom"])
+        # Actualizamos nuestros marcadores SIN zoom (para que no se mueva el mapa)
+        self.actualizar_marcadores(clusters, zoom=False)
+        self.estaciones_cargadas.emit([c for c in clusters if c.get("cantidad", 1) == 1])
 
     def actualizar_marcadores(self, estaciones, zoom=True):
         """
         Actualiza los marcadores en el mapa con la lista de estaciones.
-        estaciones: lista de diccionarios con los datos de las estaciones
+        estaciones: lista de diccionarios con los datos de las estaciones, o
+                    de grupos de /api/clusters (latitud, longitud, cantidad);
+                    los de cantidad > 1 se pintan como un círculo con el número
         zoom: si es True (default), ajusta la vista para mostrar todos los marcadores.
               si es False, mantiene la vista actual.
         """
@@ -98,61 +262,11 @@ class MapaWidget(QWidget):
             self.pending_stations = estaciones
             return
 
-        if not estaciones:
-            js_code = """
-                if (window.markersLayer) {
-                    window.markersLayer.clearLayers();
-                }
-            """
-            self.browser.page().runJavaScript(js_code)
-            return
-        
-        js_marcadores = []
-        for estacion in estaciones:
-            lat = estacion.get('latitud')
-            lon = estacion.get('longitud')
-            
-            if lat and lon:
-                nombre = estacion.get('nombre', 'Sin nombre').replace("'", "\\'")
-                tipo = estacion.get('tipo', '').replace("'", "\\'")
-                direccion = estacion.get('direccion', '').replace("'", "\\'")
-                localidad = estacion.get('localidad', '').replace("'", "\\'")
-                provincia = estacion.get('provincia', '').replace("'", "\\'")
-                cp = estacion.get('codigo_postal', '')
-                
-                popup_html = f"""
-                    <b>{nombre}</b><br>
-                    <i>{tipo}</i><br>
-                    {direccion}<br>
-                    {localidad}, {provincia} {cp}
-                """.replace('\n', ' ').strip()
-                
-                js_marcadores.append(
-                    f"L.marker([{lat}, {lon}]).addTo(window.markersLayer).bindPopup('{popup_html}');"
-                )
-        
-        js_code = f"""
-            // Limpiar marcadores anteriores
-            if (window.markersLayer) {{
-                window.markersLayer.clearLayers();
-            }} else {{
-                window.markersLayer = L.layerGroup().addTo(map);
-            }}
-            
-            // Agregar nuevos marcadores
-            {chr(10).join(js_marcadores)}
-        """
-
-        if zoom:
-            js_code += """
-            // Ajustar vista del mapa a los marcadores
-            if (window.markersLayer.getLayers().length > 0) {
-                var group = new L.featureGroup(window.markersLayer.getLayers());
-                map.fitBounds(group.getBounds().pad(0.1));
-            }
-            """
-        
-        self.browser.page().runJavaScript(js_code)
+        # Los datos viajan como JSON y el HTML de los popups se escapa en JavaScript
+        datos = json.dumps(estaciones, ensure_ascii=False)
+        self.browser.page().runJavaScript(
+            f"pintarEstaciones({datos}, {'true' if zoom else 'false'});"
+        )
 
     def enfocar_estaciones(self, estaciones):
         """
@@ -168,10 +282,10 @@ class MapaWidget(QWidget):
             lon = estacion.get('longitud')
             if lat and lon:
                 marcadores_coords.append(f"[{lat}, {lon}]")
-        
+
         if not marcadores_coords:
             return
-            
+
         js_code = f"""
             var bounds = L.latLngBounds([{', '.join(marcadores_coords)}]);
             map.fitBounds(bounds.pad(0.1));
@@ -1,21 +1,40 @@
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
     QComboBox, QPushButton, QTableWidget, QTableWidgetItem, QHeaderView,
-    QFrame, QGridLayout, QSpacerItem, QSizePolicy, QMessageBox, QScrollArea
+    QFrame, QGridLayout, QSpacerItem, QSizePolicy, QMessageBox, QScrollArea, QCompleter
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer, QModelIndex
+from PySide6.QtGui import QStandardItem, QStandardItemModel
 from frontend.componentes.mapa import MapaWidget
 from frontend.api_client import APIClient
 
 
 class VentanaBusqueda(QWidget):
+    # Espera tras la última tecla antes de pedir sugerencias
+    RETARDO_SUGERENCIAS_MS = 250
+
+    # Roles del modelo de sugerencias: texto que se escribe en el campo y
+    # provincia de la localidad sugerida
+    ROL_TEXTO = Qt.UserRole
+    ROL_PROVINCIA = Qt.UserRole + 1
+
+    # Valores de cada faceta que se muestran en el resumen de resultados
+    MAX_FACETAS_VISIBLES = 5
+
     def __init__(self):
         super().__init__()
 
         # Inicializar cliente API
         self.api_client = APIClient()
         self.api_client.busqueda_completada.connect(self.mostrar_resultados)
+        self.api_client.estaciones_recibidas.connect(self.mostrar_resultados_inicio)
         self.api_client.error_ocurrido.connect(self.mostrar_error)
+        self.api_client.sugerencias_recibidas.connect(self._mostrar_sugerencias)
+        self.api_client.quizas_quiso_decir.connect(self._guardar_quizas)
+        self.api_client.facetas_recibidas.connect(self.mostrar_facetas)
+
+        # Nombres parecidos propuestos por el servidor para la última búsqueda vacía
+        self.quizas = {}
 
         # Main Scroll Area
         scroll_layout = QVBoxLayout(self)
@@ -243,6 +262,12 @@ class VentanaBusqueda(QWidget):
         """)
         main_layout.addWidget(results_label)
 
+        # Resumen de los resultados por provincia y tipo (/api/facetas)
+        self.lbl_facetas = QLabel("")
+        self.lbl_facetas.setWordWrap(True)
+        self.lbl_facetas.setStyleSheet("font-size: 13px; color: #f1faee;")
+        main_layout.addWidget(self.lbl_facetas)
+
         self.table_results = QTableWidget()
         self.table_results.setColumnCount(7)
         self.table_results.setHorizontalHeaderLabels([
@@ -305,11 +330,78 @@ class VentanaBusqueda(QWidget):
         self.btn_buscar.clicked.connect(self.realizar_busqueda)
         self.btn_cancelar.clicked.connect(self.limpiar_formulario)
 
-        # Conectar señal del mapa para cuando cargue estaciones
-        self.mapa.estaciones_cargadas.connect(self.mostrar_resultados_inicio)
+        # Autocompletado de localidad y provincia: campo -> (entrada, completer, temporizador)
+        self.autocompletado = {}
+        self._configurar_autocompletado("localidad", self.input_localidad)
+        self._configurar_autocompletado("provincia", self.input_provincia)
+
+    def _configurar_autocompletado(self, campo, entrada):
+        """
+        Asocia a un campo de texto un desplegable con las sugerencias de
+        /api/sugerencias. La petición se lanza cuando el usuario deja de
+        escribir durante RETARDO_SUGERENCIAS_MS.
+        """
+        completer = QCompleter(QStandardItemModel(self), self)
+        # El servidor ya filtra ignorando acentos: se muestra todo lo recibido
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        completer.setCompletionRole(self.ROL_TEXTO)
+        completer.activated[QModelIndex].connect(
+            lambda indice: self._sugerencia_elegida(campo, indice)
+        )
+        entrada.setCompleter(completer)
+
+        temporizador = QTimer(self)
+        temporizador.setSingleShot(True)
+        temporizador.setInterval(self.RETARDO_SUGERENCIAS_MS)
+        temporizador.timeout.connect(lambda: self._pedir_sugerencias(campo))
+        # textEdited solo salta al teclear, no al rellenar el campo desde código
+        entrada.textEdited.connect(lambda _: temporizador.start())
+
+        self.autocompletado[campo] = (entrada, completer, temporizador)
+
+    def _pedir_sugerencias(self, campo):
+        """Pide las sugerencias del texto actual del campo"""
+        entrada, completer, _ = self.autocompletado[campo]
+        texto = entrada.text().strip()
+        if texto:
+            self.api_client.obtener_sugerencias(campo, texto)
+        else:
+            completer.model().clear()
+
+    def _mostrar_sugerencias(self, campo, prefijo, sugerencias):
+        """Rellena el desplegable con las sugerencias recibidas del servidor"""
+        entrada, completer, _ = self.autocompletado[campo]
+        # Descarta respuestas de un texto que el usuario ya ha cambiado
+        if prefijo != entrada.text().strip():
+            return
+
+        modelo = completer.model()
+        modelo.clear()
+        for sugerencia in sugerencias:
+            nombre = sugerencia['nombre']
+            provincia = sugerencia.get('provincia')
+            texto = f"{nombre} — {provincia}" if provincia else nombre
+            item = QStandardItem(f"{texto} ({sugerencia['estaciones']})")
+            item.setData(nombre, self.ROL_TEXTO)
+            item.setData(provincia, self.ROL_PROVINCIA)
+            modelo.appendRow(item)
+
+        if modelo.rowCount() > 0 and entrada.hasFocus():
+            completer.complete()
+
+    def _sugerencia_elegida(self, campo, indice):
+        """Al elegir una localidad, completa también su provincia si estaba vacía"""
+        provincia = indice.data(self.ROL_PROVINCIA)
+        if campo == "localidad" and provincia and not self.input_provincia.text().strip():
+            self.input_provincia.setText(provincia)
     
-    def realizar_busqueda(self):
-        """Ejecuta la búsqueda usando los filtros del formulario"""
+    def realizar_busqueda(self, fuzzy=False):
+        """
+        Ejecuta la búsqueda usando los filtros del formulario.
+
+        Con fuzzy=True los filtros de texto toleran erratas.
+        """
+        self.quizas = {}
         localidad = self.input_localidad.text().strip() or None
         codigo_postal = self.input_cp.text().strip() or None
         provincia = self.input_provincia.text().strip() or None
@@ -319,13 +411,16 @@ class VentanaBusqueda(QWidget):
         if tipo == "":
             tipo = None
         
-        # Realizar la búsqueda
-        self.api_client.buscar_estaciones(
+        # Realizar la búsqueda y pedir su resumen por provincia y tipo
+        filtros = dict(
             localidad=localidad,
             codigo_postal=codigo_postal,
             provincia=provincia,
-            tipo=tipo
+            tipo=tipo,
+            fuzzy=bool(fuzzy)
         )
+        self.api_client.buscar_estaciones(**filtros)
+        self.api_client.obtener_facetas(**filtros, limit=self.MAX_FACETAS_VISIBLES)
     
     def limpiar_formulario(self):
         """Limpia todos los campos del formulario y recarga todas las estaciones"""
@@ -333,8 +428,11 @@ class VentanaBusqueda(QWidget):
         self.input_cp.clear()
         self.input_provincia.clear()
         self.combo_tipo.setCurrentIndex(0)
-        # Recargar todas las estaciones (rellena tabla y actualiza mapa sin cambiar zoom)
+        # Recargar todas las estaciones: el mapa pide solo los campos que pinta
+        # y la tabla el catálogo completo
         self.mapa.cargar_estaciones()
+        self.api_client.obtener_todas_estaciones()
+        self.api_client.obtener_facetas(limit=self.MAX_FACETAS_VISIBLES)
     
     def _llenar_tabla(self, estaciones):
         """Helper para rellenar la tabla con estaciones"""
@@ -351,7 +449,7 @@ class VentanaBusqueda(QWidget):
 
     def mostrar_resultados_inicio(self, estaciones):
         """Muestra resultados de carga inicial (sin actualizar mapa ni zoom)"""
-        # Solo rellenamos la tabla, el mapa ya se actualizó internamente
+        # Solo rellenamos la tabla, el mapa carga sus propios marcadores
         self._llenar_tabla(estaciones)
 
     def mostrar_resultados(self, estaciones):
@@ -363,7 +461,40 @@ class VentanaBusqueda(QWidget):
         
         # Mostrar mensaje si no hay resultados
         if len(estaciones) == 0:
-            QMessageBox.information(self, "Búsqueda", "No se encontraron estaciones con los criterios especificados.")
+            if self.quizas:
+                self._ofrecer_busqueda_aproximada()
+            else:
+                QMessageBox.information(self, "Búsqueda", "No se encontraron estaciones con los criterios especificados.")
+
+    def mostrar_facetas(self, facetas):
+        """Muestra el total de resultados y su reparto por provincia y tipo"""
+        def resumen(valores):
+            return ", ".join(f"{f['valor'] or 'Sin tipo'} ({f['cantidad']})" for f in valores)
+
+        partes = [f"{facetas['total']} estaciones"]
+        if facetas['provincias']:
+            partes.append(f"Provincias: {resumen(facetas['provincias'])}")
+        if facetas['tipos']:
+            partes.append(f"Tipos: {resumen(facetas['tipos'])}")
+        self.lbl_facetas.setText("  ·  ".join(partes))
+
+    def _guardar_quizas(self, propuestas):
+        """Guarda los nombres parecidos que propone el servidor para la búsqueda vacía"""
+        self.quizas = propuestas
+
+    def _ofrecer_busqueda_aproximada(self):
+        """Muestra los nombres parecidos y ofrece repetir la búsqueda tolerando erratas"""
+        lineas = "\n".join(
+            f"- {campo.capitalize()}: {', '.join(nombres)}" for campo, nombres in self.quizas.items()
+        )
+        respuesta = QMessageBox.question(
+            self, "Búsqueda",
+            "No se encontraron estaciones con los criterios especificados.\n\n"
+            f"¿Quizás quiso decir?\n{lineas}\n\n"
+            "¿Buscar de nuevo tolerando erratas?"
+        )
+        if respuesta == QMessageBox.Yes:
+            self.realizar_busqueda(fuzzy=True)
     
     def mostrar_error(self, mensaje):
         """Muestra un mensaje de error"""
@@ -374,4 +505,6 @@ class VentanaBusqueda(QWidget):
         super().showEvent(event)
         # Recargar estaciones cada vez que se muestra la ventana
         self.mapa.cargar_estaciones()
+        self.api_client.obtener_todas_estaciones()
+        self.api_client.obtener_facetas(limit=self.MAX_FACETAS_VISIBLES)
 